@@ -1,23 +1,47 @@
 # gpu_doctor/api.py
 from __future__ import annotations
 
-import os, json
-from fastapi import FastAPI, HTTPException
+import asyncio, os, json, logging, queue, threading, time
+from collections import deque
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-import openai
+from fastapi.concurrency import run_in_threadpool
 
-from gpu_doctor.collector import retriever
+from gpu_doctor import instrument, llm
+from gpu_doctor.cache import TTLCache
+from gpu_doctor.collector import db, detect, retriever, shipper
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-MODEL = os.getenv("GPU_DOC_MODEL", "openai:o3")
 K = int(os.getenv("GPU_DOC_TOPK", 8))
+WARMUP = os.getenv("GPU_DOC_WARMUP", "1") == "1"
+INGEST_WAIT_SEC = float(os.getenv("GPU_DOC_INGEST_WAIT_SEC", 2))   # writer queue full this long → 503
+EVENTS_K = int(os.getenv("GPU_DOC_EVENTS_K", 10))                  # gpu_event rows per answer
+
+# Answers are keyed on (normalized question, retrieved row ids, event ids): new
+# telemetry changes the ids, so stale diagnoses fall out without explicit
+# invalidation.
+_ANSWERS = TTLCache(maxsize=int(os.getenv("GPU_DOC_ANSWER_CACHE", 256)),
+                    ttl=float(os.getenv("GPU_DOC_ANSWER_TTL", 300)))
 
 # ---------- I/O schema -------------------------------------------------
 class AskRequest(BaseModel):
     query: str | None = None
     run_id: str | None = None
+    # optional scope for the vector search (since / until: ISO-8601 UTC)
+    host: str | None = None
+    gpu_id: int | None = None
+    since: str | None = None
+    until: str | None = None
+    # numeric match instead of text search: "oom", {feature: value} or a row id
+    signature: str | int | Dict[str, float] | None = None
+    # False: list the detector events (gpu_event) for this scope – no LLM call
+    explain: bool = True
+
+    def filters(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.model_dump(include={"host", "gpu_id", "since", "until"}).items()
+                if v is not None}
 
 class AskResponse(BaseModel):
     answer: str
@@ -29,6 +53,9 @@ class AskResponse(BaseModel):
 SYSTEM = """You are GPU Doctor, an expert on NVIDIA GPU telemetry.
 Given recent log lines, explain the issue and recommend resources."""
 TEMPLATE = """\
+EVENTS (flagged by the collector's detectors):
+{events}
+
 LOGS:
 {logs}
 
@@ -48,41 +75,320 @@ INSTRUCTIONS:
 # ---------- FastAPI ----------------------------------------------------
 app = FastAPI(title="GPU Doctor RAG API")
 
-def _retrieve_ctx(q: str, run_id: str | None) -> List[str]:
-    if run_id:
+@app.on_event("startup")
+def _warm_up() -> None:
+    """Load model + index before the first request instead of during it."""
+    if not WARMUP:
+        return
+    try:
+        retriever.warm_up()
+    except Exception as exc:       # API stays up; first request retries lazily
+        logging.warning("Warm-up failed: %s", exc)
+
+@app.on_event("shutdown")
+async def _close_llm_clients() -> None:
+    await llm.close()
+
+def _retrieve_ctx(q: str, run_id: str | None, signature: Any = None,
+                  **filters: Any) -> List[Tuple[int, str]]:
+    """(row id, log line) pairs to ground the prompt."""
+    if run_id and not q and signature is None:
         q = f"Why did run {run_id} fail?"
         # force recall logs by tag
-        return retriever.search_by_tag(run_id, k=K)
-    return retriever.search(q, k=K)            # vector similarity
-
-def _llm_chat(prompt: str) -> str:
-    if MODEL == "dummy": # quick offline answer
-        return ('{ "answer": "Dummy model - no LLM call.",'
-                 '  "recommended_gpu_mem_mb": null,'
-                 '  "recommended_cpu_cores": null,'
-                 '  "flagged_anomalies": [] }')
-    if MODEL.startswith("openai:"):
-        model = MODEL.split(":", 1)[1]
-        resp = openai.chat.completions.create(
-            model = model,
-            messages = [{"role": "system", "content": SYSTEM},
-                        {"role": "user", "content": prompt}],
-            max_completion_tokens = 512,  # ← new param
-        )
-        return resp.choices[0].message.content
-    raise ValueError("Unsupported MODEL")
+        return retriever.search_by_tag_hits(run_id, k=K)
+    if run_id:
+        filters["run_tag"] = run_id                 # question about one run → search only its rows
+    if signature is not None:                       # numeric features – no text model involved
+        return [(i, text) for i, _, text in retriever.similar_rows(signature, k=K, **filters)]
+    return [(i, text) for i, _, text in retriever.search_scored(q, k=K, **filters)]  # vector similarity
+
+def _question(req: AskRequest) -> str:
+    if req.query:
+        return req.query
+    return f"run {req.run_id}" if req.run_id else f"rows like {json.dumps(req.signature)}"
+
+async def _hits(req: AskRequest) -> List[Tuple[int, str]]:
+    filters = req.filters()
+    if req.signature is not None:
+        filters["signature"] = req.signature
+    try:
+        return await run_in_threadpool(_retrieve_ctx, req.query or "", req.run_id, **filters)
+    except KeyError as exc:                         # unknown signature / feature / row
+        raise HTTPException(400, exc.args[0])
+    except ValueError as exc:                       # unparsable since / until
+        raise HTTPException(400, str(exc))
+
+async def _events(req: AskRequest) -> List[Dict[str, Any]]:
+    """Detector events in the request's scope, newest first (indexed gpu_event read)."""
+    try:
+        return await run_in_threadpool(retriever.events, EVENTS_K, run_tag=req.run_id, **req.filters())
+    except ValueError as exc:                       # unparsable since / until
+        raise HTTPException(400, str(exc))
+
+def _flagged(events: List[Dict[str, Any]], extra: List[str] | None = None) -> List[str]:
+    """Event details first, then whatever else the model flagged."""
+    out = [e["detail"] for e in events]
+    return out + [a for a in extra or () if a not in out]
+
+def _from_events(events: List[Dict[str, Any]]) -> AskResponse:
+    """explain=False: the answer is the events table itself."""
+    if not events:
+        return AskResponse(answer="No anomalies detected by the collector in this scope.", flagged_anomalies=[])
+    crit = sum(e["severity"] == "crit" for e in events)
+    return AskResponse(answer=f"{len(events)} event(s), {crit} critical; latest: {events[0]['detail']}",
+                       flagged_anomalies=_flagged(events))
+
+async def _prompt(req: AskRequest, question: str, hits: List[Tuple[int, str]],
+                  events: List[Dict[str, Any]]) -> Tuple[str, Any]:
+    """Prompt with per-GPU summaries of the series behind <hits> (collector.context)."""
+    ctx = await run_in_threadpool(retriever.context_for, hits, run_tag=req.run_id, **req.filters())
+    listed = "\n".join(f"{e['ts']} [{e['severity']}] {e['detail']}" for e in reversed(events)) or "(none)"
+    return TEMPLATE.format(events=listed, logs=ctx.text, question=question), ctx
+
+# last requests with their stage split, for "was that slow answer retrieval or the LLM?"
+_RECENT: deque = deque(maxlen=int(os.getenv("GPU_DOC_RECENT_REQUESTS", 200)))
+
+def _log_request(route: str, started: float, ctx: Any = None, llm_start: float | None = None) -> None:
+    done = time.perf_counter()
+    instrument.observe(f"{route}.total", done - started)
+    if ctx is None:
+        logging.info("%s: answer cache hit, %.0f ms", route, (done - started) * 1000)
+        return
+    instrument.observe(f"{route}.retrieve", llm_start - started, ctx.rows)
+    instrument.observe(f"{route}.llm", done - llm_start)
+    _RECENT.append({"route": route, "at": time.time(), "total_ms": (done - started) * 1000,
+                    "retrieve_ms": (llm_start - started) * 1000, "llm_ms": (done - llm_start) * 1000,
+                    "tokens": ctx.tokens, "rows": ctx.rows})
+    logging.info("%s: context %d chars (~%d tokens) from %d rows / %d GPUs; "
+                 "retrieve+context %.0f ms, llm %.0f ms, total %.0f ms",
+                 route, len(ctx.text), ctx.tokens, ctx.rows, ctx.gpus,
+                 (llm_start - started) * 1000, (done - llm_start) * 1000, (done - started) * 1000)
+
+def _cache_key(question: str, hits: List[Tuple[int, str]],
+               events: List[Dict[str, Any]] = ()) -> Tuple[str, frozenset, frozenset]:
+    return (" ".join(question.lower().split()), frozenset(i for i, _ in hits),
+            frozenset(e["id"] for e in events))
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _parse_answer(raw: str) -> AskResponse:
+    data = json.loads(raw) if raw.strip().startswith("{") else {"answer": raw}
+    return AskResponse(**data)
+
+def _check(req: AskRequest) -> None:
+    if req.explain and not (req.query or req.run_id or req.signature is not None):
+        raise HTTPException(400, "query, run_id or signature required")
 
 @app.post("/ask_gpu", response_model=AskResponse)
-def ask_gpu(req: AskRequest):
-    if not (req.query or req.run_id):
-        raise HTTPException(400, "query or run_id required")
+async def ask_gpu(req: AskRequest):
+    _check(req)
+    started = time.perf_counter()
+    events = await _events(req)
+    if not req.explain:                             # "what went wrong?" straight from gpu_event
+        instrument.observe("ask_gpu.events_only", time.perf_counter() - started, len(events))
+        return _from_events(events)
+
+    question = _question(req)
+    # SQLite + FAISS + MiniLM are blocking → keep them off the event loop
+    hits = await _hits(req)
+    key = _cache_key(question, hits, events)
+    if (cached := _ANSWERS.get(key)) is not None:
+        _log_request("ask_gpu", started)
+        return cached
 
-    logs = _retrieve_ctx(req.query or "", req.run_id)
-    prompt = TEMPLATE.format(logs="\n".join(logs), question=req.query or f"run {req.run_id}")
+    prompt, ctx = await _prompt(req, question, hits, events)
+    llm_start = time.perf_counter()
     try:
-        raw = _llm_chat(prompt)
-        data = json.loads(raw) if raw.strip().startswith("{") else {"answer": raw}
+        resp = _parse_answer(await llm.chat(prompt, SYSTEM))
     except Exception as exc:
         raise HTTPException(500, f"LLM failure: {exc}")
+    resp.flagged_anomalies = _flagged(events, resp.flagged_anomalies)
 
-    return AskResponse(**data)
+    _ANSWERS.put(key, resp)
+    _log_request("ask_gpu", started, ctx, llm_start)
+    return resp
+
+@app.post("/ask_gpu/stream")
+async def ask_gpu_stream(req: AskRequest):
+    """Server-sent events: `context` (row ids) right after retrieval, `anomalies`
+    (detector events), `token` pieces while the model writes, then `done`
+    with the AskResponse fields."""
+    _check(req)
+    started = time.perf_counter()
+    found = await _events(req)
+    if not req.explain:
+        async def listed() -> AsyncIterator[str]:
+            yield _sse("anomalies", {"events": found})
+            yield _sse("done", _from_events(found).model_dump())
+        return StreamingResponse(listed(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+
+    question = _question(req)
+    hits = await _hits(req)
+    key = _cache_key(question, hits, found)
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse("context", {"ids": [i for i, _ in hits]})
+        yield _sse("anomalies", {"events": found})     # from the table: before any LLM latency
+        if (cached := _ANSWERS.get(key)) is not None:
+            _log_request("ask_gpu/stream", started)
+            yield _sse("done", cached.model_dump())
+            return
+        prompt, ctx = await _prompt(req, question, hits, found)
+        llm_start = time.perf_counter()
+        parts: List[str] = []
+        try:
+            async for tok in llm.chat_stream(prompt, SYSTEM):
+                parts.append(tok)
+                yield _sse("token", {"text": tok})
+            resp = _parse_answer("".join(parts))
+            resp.flagged_anomalies = _flagged(found, resp.flagged_anomalies)
+        except Exception as exc:
+            yield _sse("error", {"detail": f"LLM failure: {exc}"})
+            return
+        _ANSWERS.put(key, resp)
+        _log_request("ask_gpu/stream", started, ctx, llm_start)
+        yield _sse("done", resp.model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/events")
+async def event_list(host: str | None = None, gpu_id: int | None = None, run_id: str | None = None,
+                     since: str | None = None, until: str | None = None, severity: str | None = None,
+                     k: int = 50):
+    """Detector events (gpu_event), newest first."""
+    return await run_in_threadpool(retriever.events, k, host=host, gpu_id=gpu_id, run_tag=run_id,
+                                   since=since, until=until, severity=severity)
+
+@app.get("/rollups")
+async def rollups(host: str | None = None, gpu_id: int | None = None, run_tag: str | None = None,
+                  since: str | None = None, until: str | None = None, tier: str | None = None):
+    """Dashboard series from the 1m / 1h rollup tables (tier auto-picked)."""
+    try:
+        return await run_in_threadpool(retriever.history, host, gpu_id, run_tag, since, until, tier)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+@app.get("/similar")
+async def similar(signature: str | None = None, row_id: int | None = None, k: int = 10,
+                  host: str | None = None, gpu_id: int | None = None, run_tag: str | None = None,
+                  since: str | None = None, until: str | None = None):
+    """Rows closest to a named signature (features.SIGNATURES) or to a stored row."""
+    if (signature is None) == (row_id is None):
+        raise HTTPException(400, "exactly one of signature or row_id required")
+    try:
+        hits = await run_in_threadpool(retriever.similar_rows, signature if row_id is None else row_id, k,
+                                       host=host, gpu_id=gpu_id, run_tag=run_tag, since=since, until=until)
+    except KeyError as exc:
+        raise HTTPException(400, exc.args[0])
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    return [{"id": i, "distance": d, "text": t} for i, d, t in hits]
+
+@app.get("/spikes")
+async def spikes(metric: str = "mem_frac", k: int = 10, host: str | None = None, gpu_id: int | None = None,
+                 run_tag: str | None = None, since: str | None = None, until: str | None = None):
+    """Largest snapshot-to-snapshot rises of util_gpu / mem_frac / temperature / power."""
+    try:
+        hits = await run_in_threadpool(retriever.top_spikes, metric, k, host=host, gpu_id=gpu_id,
+                                       run_tag=run_tag, since=since, until=until)
+    except KeyError as exc:
+        raise HTTPException(400, exc.args[0])
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    return [{"id": i, "jump": d, "text": t} for i, d, t in hits]
+
+_INGEST = {"rows": 0, "batches": 0, "bytes": 0, "rejected": 0, "busy": 0, "events": 0}
+
+# remote pollers ship raw rows only; their detectors run here (one state per GPU)
+_DETECTOR = detect.Detector() if detect.DETECT else None
+_DETECT_LOCK = threading.Lock()
+
+def _ingest_batch(body: bytes) -> int:
+    records = shipper.decode(body)
+    writer = db.get_writer()
+    writer.put(records, timeout=INGEST_WAIT_SEC)    # the one group-committing writer
+    if _DETECTOR is not None:                       # only once accepted: a refused batch comes back
+        with _DETECT_LOCK:
+            events = _DETECTOR.feed(records)
+        writer.put(events)
+        _INGEST["events"] += len(events)
+    return len(records)
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """Bulk gpu_log rows from remote pollers (collector.shipper wire format)."""
+    if shipper.TOKEN and request.headers.get("authorization") != f"Bearer {shipper.TOKEN}":
+        raise HTTPException(401, "bad ingest token")
+    if request.headers.get("content-encoding", "gzip") != "gzip":
+        raise HTTPException(415, "batches must be gzip-encoded")
+    body = await request.body()
+    try:
+        rows = await run_in_threadpool(_ingest_batch, body)
+    except ValueError as exc:
+        _INGEST["rejected"] += 1
+        raise HTTPException(400, str(exc))
+    except queue.Full:                              # writer behind: shipper keeps the batch and retries
+        _INGEST["busy"] += 1
+        raise HTTPException(503, "writer busy", headers={"Retry-After": "1"})
+    _INGEST["rows"] += rows
+    _INGEST["batches"] += 1
+    _INGEST["bytes"] += len(body)
+    return {"rows": rows}
+
+@app.get("/ingest")
+def ingest_stats():
+    """Rows / batches / compressed bytes accepted, rejected and busy-refused batches,
+    and the writer's written / spilled / skipped-as-bad row counts."""
+    writer = db.get_writer()
+    return {**_INGEST, "rows_written": writer.rows_written, "rows_spilled": writer.rows_spilled,
+            "rows_bad": writer.rows_bad}
+
+@app.get("/stats")
+def stats(slowest: int = 5, reset: bool = False):
+    """Per-stage latency histograms (p50/p95/p99 ms, calls, rows) and the
+    slowest recent /ask_gpu requests split into retrieval vs LLM time."""
+    recent = sorted(_RECENT, key=lambda r: -r["total_ms"])[:slowest]
+    out = {"enabled": instrument.ENABLED, "profiling": instrument.profiling(),
+           "stages": instrument.snapshot(),
+           "slowest": [{**r, "bottleneck": "llm" if r["llm_ms"] >= r["retrieve_ms"] else "retrieval"}
+                       for r in recent]}
+    if reset:
+        instrument.reset()
+        _RECENT.clear()
+    return out
+
+@app.post("/stats/profile")
+async def profile(seconds: float = 10, mode: str = "sample", top: int = 25):
+    """Profile this worker for <seconds> while it serves traffic; returns the report.
+
+    mode "sample" covers every thread (retrieval runs in the threadpool);
+    "cprofile" sees only the event-loop thread."""
+    if instrument.profiling():
+        raise HTTPException(409, "profiler already running")
+    try:
+        instrument.profile_start(mode)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    try:
+        await asyncio.sleep(min(seconds, 300))
+    finally:
+        report = instrument.profile_stop(top)
+    return PlainTextResponse(report)
+
+@app.get("/index")
+def index_info():
+    """Index generation, reload latency and memory of *this* worker."""
+    return retriever.index_info()
+
+@app.get("/cache")
+def cache_stats():
+    """Hit/miss counters for the answer cache and the retriever caches."""
+    return {"answers": _ANSWERS.stats(), **retriever.cache_stats()}
+
+@app.get("/llm")
+def llm_stats():
+    """Upstream calls, coalesced requests and in-flight high-water mark."""
+    return llm.stats()
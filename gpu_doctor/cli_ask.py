@@ -3,9 +3,39 @@ API = "http://127.0.0.1:8000/ask_gpu"
 
 app = typer.Typer(add_completion=False)
 
+def _iter_sse(lines):
+    """Yield (event, data) pairs from a text/event-stream line iterator."""
+    event, data = "message", []
+    for ln in lines:
+        if not ln:                                  # blank line ends an event
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif ln.startswith("event:"):
+            event = ln[6:].strip()
+        elif ln.startswith("data:"):
+            data.append(ln[5:].strip())
+
+def _ask_stream(payload: dict) -> None:
+    with requests.post(API + "/stream", json=payload, stream=True, timeout=(5, 120)) as r:
+        if r.status_code != 200:
+            print("Error:", r.text, file=sys.stderr); sys.exit(1)
+        for event, data in _iter_sse(r.iter_lines(decode_unicode=True)):
+            if event == "context":
+                print(f"[context: {len(data['ids'])} log rows]", file=sys.stderr)
+            elif event == "token":
+                sys.stdout.write(data["text"]); sys.stdout.flush()
+            elif event == "done":
+                print("\n" + json.dumps(data, indent=2, ensure_ascii=False))
+            elif event == "error":
+                print("\nError:", data["detail"], file=sys.stderr); sys.exit(1)
+
 @app.command()
-def ask(text: str = typer.Argument(..., help="query or run-id")):
+def ask(text: str = typer.Argument(..., help="query or run-id"),
+        stream: bool = typer.Option(False, "--stream", help="print the answer as it is generated")):
     payload = {"query": text} if not text.startswith("run-") else {"run_id": text}
+    if stream:
+        return _ask_stream(payload)
     r = requests.post(API, json=payload, timeout=30)
     try:
         ans = r.json()
@@ -14,4 +44,4 @@ def ask(text: str = typer.Argument(..., help="query or run-id")):
         print("Error:", r.text, file=sys.stderr); sys.exit(1)
 
 if __name__ == "__main__":
-    app()          # `python -m gpu_doctor.cli_ask ask "Why high VRAM?"`
+    app()          # `python -m gpu_doctor.cli_ask ask "Why high VRAM?"`  (add --stream for SSE)
@@ -4,8 +4,18 @@ Lightweight GPU metrics collector.
 Modules
 -------
 poller : core loop that calls `nvidia-smi`, parses XML, and writes to SQLite
-parsers: helpers to turn `nvidia-smi -q -x` XML into Python dicts
+parsers: the one `nvidia-smi -q -x` XML parser → gpu_log rows (parse_xml)
 db     : tiny SQLite helpers (schema + inserts + simple queries)
+detect : streaming per-GPU anomaly detectors → gpu_event rows
+synthetic / fake_smi: generated nvidia-smi output and seeded DBs (tests, benchmarks)
 """
 
-__all__ = ["poller", "parsers", "db"]
+__all__ = ["poller", "parsers", "db", "parse_xml"]
+
+
+def __getattr__(name: str):
+    # lazy so `import gpu_doctor.collector.db` does not drag in lxml
+    if name == "parse_xml":
+        from .parsers import parse_nvidia_smi_xml
+        return parse_nvidia_smi_xml
+    raise AttributeError(name)
@@ -0,0 +1,255 @@
+# collector/context.py
+"""
+Prompt context: per-GPU statistics over the whole relevant series plus a
+few exemplar rows, instead of K raw log lines.
+
+The series is the run (run_tag), the requested host / gpu / time window,
+or, for a plain question, the GPUs of the retrieved rows over
+[first hit - WINDOW_SEC, last hit + WINDOW_SEC/4].  Each GPU becomes one
+line: min / p95 / max, least-squares trend, time of peak memory and the
+largest step changes.  Lines are added most-loaded GPU first until
+CONTEXT_TOKENS (estimated at 4 chars per token) is used up, then exemplar
+rows fill what is left.  Hours of telemetry therefore cost a fixed number
+of tokens.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import partitions
+
+MODE = os.getenv("GPU_DOC_CONTEXT", "summary")            # summary | rows (raw K lines)
+CONTEXT_TOKENS = int(os.getenv("GPU_DOC_CONTEXT_TOKENS", 1200))
+WINDOW_SEC = float(os.getenv("GPU_DOC_CONTEXT_WINDOW_SEC", 3600))
+MAX_ROWS = int(os.getenv("GPU_DOC_CONTEXT_MAX_ROWS", 200_000))
+EXEMPLARS = int(os.getenv("GPU_DOC_CONTEXT_EXEMPLARS", 4))
+IDLE_UTIL = 5        # GPUs below this util, with no process and no steps, share one line
+
+# smallest jump reported as a step change, per metric (MB / % / °C / W)
+STEP_MIN = {"mem_used_mb": 2048, "util_gpu": 40, "temperature": 10, "power_w": 100}
+
+_COLS = ("(julianday(ts) - 2440587.5) * 86400.0 AS t, hostname, gpu_id, pid, run_tag, "
+         "util_gpu, mem_used_mb, mem_total_mb, temperature, power_w")
+
+
+@dataclass
+class Context:
+    text: str
+    rows: int            # raw rows summarised
+    gpus: int            # GPUs with a summary line in the text
+    tokens: int          # estimated prompt tokens of text
+
+
+def tokens(text: str) -> int:
+    """Rough token count (≈4 chars per token for English + numbers)."""
+    return (len(text) + 3) // 4
+
+
+def _iso(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).isoformat()
+
+
+def _hhmm(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%H:%M")
+
+
+# ---------- series --------------------------------------------------------
+def _scope(conn: sqlite3.Connection, hit_ids: Sequence[int], run_tag: Optional[str], host: Optional[str],
+           gpu_id: Optional[int], since: Optional[str], until: Optional[str]):
+    """(WHERE clause, params, since, until, wanted "host:gpu" keys or None) of the series."""
+    clauses, params, keys = [], [], None
+    if run_tag is None and host is None and gpu_id is None and since is None:
+        rows = partitions.rows_by_id(conn, hit_ids)
+        if not rows:
+            return "", [], None, None, None
+        keys = {f"{r['hostname']}:{r['gpu_id']}" for r in rows}
+        times = [partitions.epoch(r["ts"]) for r in rows]
+        since, until = _iso(min(times) - WINDOW_SEC), until or _iso(max(times) + WINDOW_SEC / 4)
+        hosts = sorted({r["hostname"] for r in rows})
+        clauses.append(f"hostname IN ({','.join('?' * len(hosts))})")
+        params += hosts
+        clauses.append(f"gpu_id IN ({','.join('?' * len({r['gpu_id'] for r in rows}))})")
+        params += sorted({r["gpu_id"] for r in rows})
+    for clause, value in (("run_tag = ?", run_tag), ("hostname = ?", host), ("gpu_id = ?", gpu_id),
+                          ("ts >= ?", since), ("ts < ?", until)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    return " AND ".join(clauses), params, since, until, keys
+
+
+def _fetch(conn: sqlite3.Connection, where: str, params: List[Any], since: Any, until: Any) -> Dict[str, np.ndarray]:
+    """The newest MAX_ROWS rows of the series, oldest first (a long window loses its start, not "now")."""
+    rows: List[Any] = []
+    for table in reversed(partitions.covering(conn, since, until)):   # newest partition first
+        rows += conn.execute(f"SELECT {_COLS} FROM {table} WHERE {where} ORDER BY ts DESC LIMIT ?",
+                             [*params, MAX_ROWS - len(rows)]).fetchall()
+        if len(rows) >= MAX_ROWS:
+            break
+    rows.reverse()
+    if not rows:
+        return {}
+    cols = list(zip(*rows))
+    out = {"t": np.array(cols[0], dtype="float64"), "host": np.array(cols[1], dtype=object),
+           "gpu": np.array(cols[2], dtype="int64"), "pid": np.array(cols[3], dtype=object),
+           "run_tag": np.array(cols[4], dtype=object)}
+    for name, col in zip(("util_gpu", "mem_used_mb", "mem_total_mb", "temperature", "power_w"), cols[5:]):
+        out[name] = np.array(col, dtype="float64")              # None → nan
+    return out
+
+
+# ---------- per-GPU statistics ---------------------------------------------
+def _slope_per_min(t: np.ndarray, x: np.ndarray) -> float:
+    ok = ~np.isnan(x)
+    if ok.sum() < 2:
+        return 0.0
+    tt, xx = t[ok] - t[ok].mean(), x[ok]
+    var = (tt * tt).sum()
+    return float((tt * (xx - xx.mean())).sum() / var * 60) if var else 0.0
+
+
+def _steps(t: np.ndarray, x: np.ndarray, floor: float, top: int = 2) -> List[Tuple[float, float]]:
+    """(time, jump) of the largest changes between consecutive snapshots."""
+    d = np.diff(x)
+    if not d.size:
+        return []
+    d = np.nan_to_num(d)
+    mad = np.median(np.abs(d - np.median(d)))
+    big = np.flatnonzero(np.abs(d) >= max(floor, 6 * mad))
+    big = big[np.argsort(-np.abs(d[big]))][:top]
+    return [(float(t[i + 1]), float(d[i])) for i in sorted(big)]
+
+
+def _stats(x: np.ndarray) -> Optional[Tuple[float, float, float]]:
+    x = x[~np.isnan(x)]
+    if not x.size:
+        return None
+    return float(x.min()), float(np.percentile(x, 95)), float(x.max())
+
+
+def _keys(s: Dict[str, np.ndarray]) -> np.ndarray:
+    return np.char.add(s["host"].astype(str), np.char.add(":", s["gpu"].astype(str)))
+
+
+def _summaries(s: Dict[str, np.ndarray], key: np.ndarray) -> List[Tuple[float, str, bool]]:
+    """(load score, line, idle) per GPU; <key> = "host:gpu" of every row."""
+    order = np.lexsort((s["t"], key))
+    key = key[order]
+    bounds = np.flatnonzero(np.r_[True, key[1:] != key[:-1], True])
+    out = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        idx = order[lo:hi]
+        t = s["t"][idx]
+        snap = np.r_[True, t[1:] != t[:-1]]                  # one row per snapshot for GPU metrics
+        g, t = idx[snap], t[snap]
+        parts = [f"{key[lo]} {_hhmm(t[0])}–{_hhmm(t[-1])} ({len(t)} pts)"]
+
+        util = _stats(s["util_gpu"][g])
+        if util:
+            parts.append("util %.0f/%.0f/%.0f%% %+.2f%%/min"
+                         % (*util, _slope_per_min(t, s["util_gpu"][g])))
+        mem = s["mem_used_mb"][g]
+        mstats = _stats(mem)
+        total = np.nanmax(s["mem_total_mb"][g]) if not np.isnan(s["mem_total_mb"][g]).all() else None
+        if mstats:
+            peak = t[int(np.nanargmax(mem))]
+            parts.append("mem %.1f/%.1f/%.1f GB%s %+.0f MB/min, peak %s"
+                         % (*(v / 1024 for v in mstats), f" of {total / 1024:.0f}" if total else "",
+                            _slope_per_min(t, mem), _hhmm(peak)))
+        for col, label, unit in (("temperature", "temp", "°C"), ("power_w", "power", "W")):
+            st = _stats(s[col][g])
+            if st:
+                parts.append(f"{label} %.0f/%.0f/%.0f{unit}" % st)
+
+        steps = []
+        for col, label, scale, unit in (("mem_used_mb", "mem", 1 / 1024, "GB"), ("util_gpu", "util", 1, "%"),
+                                        ("temperature", "temp", 1, "°C"), ("power_w", "power", 1, "W")):
+            steps += [(when, f"{_hhmm(when)} {label} {jump * scale:+.1f}{unit}")
+                      for when, jump in _steps(t, s[col][g], STEP_MIN[col])]
+        if steps:
+            parts.append("steps " + ", ".join(txt for _, txt in sorted(steps)))
+
+        tags = [x for x in dict.fromkeys(s["run_tag"][idx]) if x]
+        pids = [str(x) for x in dict.fromkeys(s["pid"][idx]) if x is not None]
+        if tags or pids:
+            parts.append("runs " + ",".join(tags[:3]) + (f" pids {','.join(pids[:4])}" if pids else ""))
+
+        frac = (mstats[2] / total) if mstats and total else 0.0
+        idle = (util is None or util[2] < IDLE_UTIL) and not steps and not pids
+        out.append((frac + (util[1] / 100 if util else 0) + len(steps), " | ".join(parts), idle))
+    return out
+
+
+# ---------- prompt text ----------------------------------------------------
+def _raw(hits: Sequence[Tuple[int, str]]) -> Context:
+    text = "\n".join(line for _, line in hits)
+    return Context(text, len(hits), 0, tokens(text))
+
+
+def build(conn: Optional[sqlite3.Connection], hits: Sequence[Tuple[int, str]], *,
+          run_tag: Optional[str] = None, host: Optional[str] = None, gpu_id: Optional[int] = None,
+          since: Optional[str] = None, until: Optional[str] = None,
+          budget: int = CONTEXT_TOKENS) -> Context:
+    """Summaries of the series behind <hits> (or the given scope) + exemplar rows.
+
+    Falls back to the raw hit lines in "rows" mode, without a DB, or when
+    no series can be found.
+    """
+    if MODE != "summary" or conn is None:
+        return _raw(hits)
+    try:
+        where, params, lo, hi, wanted = _scope(conn, [i for i, _ in hits], run_tag, host, gpu_id, since, until)
+        series = _fetch(conn, where, params, lo, hi) if where else {}
+    except sqlite3.Error as exc:
+        logging.warning("Context summary failed, sending raw rows: %s", exc)
+        return _raw(hits)
+    if not series:
+        return _raw(hits)
+    key = _keys(series)
+    if wanted is not None:                       # IN × IN may pull in other host/gpu pairs
+        keep = np.isin(key, list(wanted))
+        series, key = {c: v[keep] for c, v in series.items()}, key[keep]
+
+    n = len(series["t"])
+    head = (f"SUMMARY of {n} rows, {_iso(series['t'].min())[:16]} – {_iso(series['t'].max())[:16]} UTC"
+            f"{' (truncated)' if n >= MAX_ROWS else ''}; per GPU min/p95/max, trend per minute:")
+    lines, used = [head], tokens(head)
+    summaries = _summaries(series, key)
+    ranked = sorted((x for x in summaries if not x[2]), key=lambda x: -x[0])
+    idle: Dict[str, List[str]] = {}
+    for _, line, is_idle in summaries:
+        if is_idle:
+            h, g = line.split(" ", 1)[0].rsplit(":", 1)
+            idle.setdefault(h, []).append(g)
+    idle_line = (f"idle (util < {IDLE_UTIL}%, no process, no steps): "
+                 + "; ".join(f"{h}:{','.join(sorted(g, key=int))}" for h, g in idle.items())) if idle else ""
+    used += tokens(idle_line)
+    gpus = 0
+    for i, (_, line, _) in enumerate(ranked):
+        if used + tokens(line) > budget * 3 // 4 and i:       # keep room for exemplars
+            lines.append(f"… {len(ranked) - i} more busy GPUs omitted")
+            break
+        lines.append(line)
+        used += tokens(line)
+        gpus += 1
+    if idle_line:
+        lines.append(idle_line)
+
+    examples = [line for _, line in hits[:EXEMPLARS]]
+    if examples:
+        lines.append("EXEMPLAR ROWS:")
+        used += tokens(lines[-1])
+        for line in examples:
+            if used + tokens(line) > budget:
+                break
+            lines.append(line)
+            used += tokens(line)
+    text = "\n".join(lines)
+    return Context(text, n, gpus, tokens(text))
@@ -1,13 +1,31 @@
 from __future__ import annotations
 
+import atexit
+import json
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterator, List
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-_DB_PATH = Path(__file__).parents[1] / "gpu_logs.db"
+from .. import instrument
+from . import partitions, rollup
+
+_DB_PATH = Path(os.getenv("GPU_DOC_DB", Path(__file__).parents[1] / "gpu_logs.db"))
 _SCHEMA_FILE = Path(__file__).with_name("schema.sql")
 
+# Group-commit knobs for the shared writer (see LogWriter)
+FLUSH_ROWS = int(os.getenv("GPU_DOC_FLUSH_ROWS", 512))
+FLUSH_SEC = float(os.getenv("GPU_DOC_FLUSH_SEC", 2.0))
+QUEUE_MAX = int(os.getenv("GPU_DOC_QUEUE_MAX", 1024))
+BUSY_SEC = float(os.getenv("GPU_DOC_BUSY_SEC", 5.0))
+ROLLUPS = os.getenv("GPU_DOC_ROLLUPS", "1") == "1"
+ROLLUP_SEC = float(os.getenv("GPU_DOC_ROLLUP_SEC", 10.0))
+
 
 def _apply_schema(conn: sqlite3.Connection) -> None:
     """Run schema.sql the first time the DB is created."""
@@ -16,21 +34,41 @@ def _apply_schema(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def _open_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(_DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+def _open_conn(path: Path | None = None, timeout: float = 5.0) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path or _DB_PATH,
+        timeout=timeout,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     return conn
 
 
+# Columns added after the first release → ALTERed into pre-partition DBs
+_ADDED_COLUMNS = {"mem_total_mb": "INTEGER", "proc_mem_mb": "INTEGER"}
+
+
+_TABLES = {"gpu_rollup_1m", "gpu_rollup_1h", "gpu_event"}
+
+
 def _ensure_schema(conn: sqlite3.Connection) -> None:
-    """Apply schema if gpu_log table is absent."""
-    row = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='gpu_log';"
-    ).fetchone()
-    if row is None:
-        _apply_schema(conn)
+    """Apply schema if any table is absent; move a flat gpu_log into a partition."""
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+    if not _TABLES <= tables:
+        _apply_schema(conn)                       # idempotent (IF NOT EXISTS)
+    if "gpu_log" in tables:                       # pre-partitioning DB
+        have = {r[1] for r in conn.execute("PRAGMA table_info(gpu_log)")}
+        for col, decl in _ADDED_COLUMNS.items():
+            if col not in have:
+                conn.execute(f"ALTER TABLE gpu_log ADD COLUMN {col} {decl}")
+        partitions.migrate_legacy(conn)
+    if not partitions.list_partitions(conn):
+        partitions.ensure(conn, partitions.today())   # the gpu_log view needs one
+    partitions.ensure_indexes(conn)
+    conn.commit()
 
 
 @contextmanager
@@ -43,27 +81,296 @@ def get_conn() -> Iterator[sqlite3.Connection]:
         conn.close()
 
 
+# ---------- long-lived writer -------------------------------------------
+_FLUSH = object()
+_STOP = object()
+
+
+class LogWriter:
+    """One connection, one thread, group commits.
+
+    Producers call :meth:`put` with a list of gpu_log records; a background
+    thread drains the bounded queue and commits once ``flush_rows`` rows are
+    pending or ``flush_sec`` seconds have passed.  If SQLite stays locked past
+    the busy timeout, the batch is appended to ``spill_path`` (JSON lines) and
+    replayed before the next successful commit, so samples are never dropped.
+    A record that cannot be stored (no / unparsable ts, a value SQLite
+    rejects) is skipped and counted in ``rows_bad``; the rest of its batch
+    is still written.
+    Rollup buckets touched by the batches are recomputed in a commit at most
+    every ``rollup_sec`` seconds and on flush/close (see rollup.py).
+    """
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        flush_rows: int = FLUSH_ROWS,
+        flush_sec: float = FLUSH_SEC,
+        max_queue: int = QUEUE_MAX,
+        busy_sec: float = BUSY_SEC,
+        spill_path: Path | None = None,
+        rollups: bool = ROLLUPS,
+        rollup_sec: float = ROLLUP_SEC,
+    ) -> None:
+        self.db_path = Path(db_path or _DB_PATH)
+        self.spill_path = Path(spill_path or self.db_path.with_suffix(".spill"))
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        self.busy_sec = busy_sec
+        self.rollups = rollups
+        self.rollup_sec = rollup_sec
+        self._dirty: Set[rollup.Key] = set()      # minute buckets awaiting refresh
+        self._rollup_due = time.monotonic() + rollup_sec
+        self.rows_written = 0
+        self.rows_spilled = 0
+        self.rows_bad = 0
+        self._q: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._conn: sqlite3.Connection | None = None
+        self._sql: Dict[Tuple[str, ...], str] = {}   # (table, *columns) → INSERT text
+        self._thread = threading.Thread(target=self._run, name="gpu-doc-writer", daemon=True)
+        self._thread.start()
+
+    # -- producer side ---------------------------------------------------
+    def put(self, records: List[Dict[str, Any]], timeout: float | None = None) -> None:
+        """Queue records for the next group commit.
+
+        Blocks while the queue is full; with a timeout, raises queue.Full
+        once it expires (the /ingest endpoint answers 503 then).
+        """
+        if records:
+            self._q.put(list(records), timeout=timeout)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Commit everything queued so far; return False on timeout."""
+        done = threading.Event()
+        self._q.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        if self._thread.is_alive():
+            self._q.put((_STOP, None))
+            self._thread.join(timeout)
+
+    # -- writer thread ---------------------------------------------------
+    def _run(self) -> None:
+        pending: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_sec
+        while True:
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):          # control message
+                tag, done = item
+                self._commit(pending, force=True)
+                pending = []
+                deadline = time.monotonic() + self.flush_sec
+                if done is not None:
+                    done.set()
+                if tag is _STOP:
+                    break
+                continue
+
+            if item:
+                pending.extend(item)
+            if len(pending) >= self.flush_rows or time.monotonic() >= deadline:
+                self._commit(pending)
+                pending = []
+                deadline = time.monotonic() + self.flush_sec
+
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_conn(self.db_path, timeout=self.busy_sec)
+            _ensure_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    def _statement(self, table: str, cols: Tuple[str, ...]) -> str:
+        # Same SQL text → sqlite3's per-connection prepared-statement cache hit
+        sql = self._sql.get((table, *cols))
+        if sql is None:
+            placeholders = ", ".join("?" for _ in cols)
+            sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})"
+            self._sql[(table, *cols)] = sql
+        return sql
+
+    def _write(self, conn: sqlite3.Connection, records: List[Dict[str, Any]],
+               one_by_one: bool = False) -> int:
+        """Insert <records>; return rows written.  one_by_one: skip rows SQLite refuses."""
+        # rows go to the partition of their UTC day (usually one per batch);
+        # detector events (an "event" key, see insert_events) to gpu_event.
+        # ts with a non-UTC offset is stored as UTC so string ranges hold
+        groups: Dict[Tuple[int, Tuple[str, ...]], List[Tuple[tuple, Dict[str, Any]]]] = {}
+        days: Dict[str, Tuple[int, str]] = {}
+        bad: List[str] = []
+        for r in records:
+            try:
+                seen = days.get(r["ts"])
+                if seen is None:
+                    ts = partitions.utc_ts(r["ts"])
+                    seen = days[r["ts"]] = (partitions.day_of(ts), ts)
+            except (KeyError, ValueError, TypeError) as exc:     # no / unparsable ts → no partition
+                bad.append(f"ts {exc}")
+                continue
+            if seen[1] != r["ts"]:
+                r = {**r, "ts": seen[1]}
+            day = -1 if "event" in r else seen[0]
+            groups.setdefault((day, tuple(r)), []).append((tuple(r.values()), r))
+        logs = []
+        for (day, cols), rows in groups.items():
+            table = "gpu_event" if day == -1 else partitions.ensure(conn, day)
+            sql = self._statement(table, cols)
+            if not one_by_one:
+                conn.executemany(sql, [p for p, _ in rows])
+                kept = rows
+            else:
+                kept = []
+                for p, r in rows:
+                    try:
+                        conn.execute(sql, p)
+                        kept.append((p, r))
+                    except sqlite3.Error as exc:
+                        if _retryable(exc):
+                            raise
+                        bad.append(str(exc))
+            if day != -1:
+                logs += [r for _, r in kept]
+        if bad:
+            self.rows_bad += len(bad)
+            logging.error("Writer: skipped %d bad record(s) of %d (%s)", len(bad), len(records), bad[0])
+        if self.rollups and logs:
+            try:
+                self._dirty |= rollup.touched(logs)
+            except (ValueError, KeyError, TypeError) as exc:
+                logging.warning("Rollup skipped for batch: %s", exc)
+        return len(records) - len(bad)
+
+    def _rollups_due(self, force: bool) -> bool:
+        return bool(self._dirty) and (force or time.monotonic() >= self._rollup_due)
+
+    @instrument.timed("db.commit", rows=1)
+    def _commit(self, records: List[Dict[str, Any]], force: bool = False) -> None:
+        if not records and not self.spill_path.exists() and not self._rollups_due(force):
+            return
+        try:
+            conn = self._connection()
+            self._replay_spill(conn)
+            try:
+                self.rows_written += self._transaction(conn, records, force)
+            except sqlite3.Error as exc:
+                if _retryable(exc):
+                    raise
+                # one bad row fails the whole executemany (rolled back): redo
+                # the group row by row so only that row is lost
+                self.rows_written += self._transaction(conn, records, force, one_by_one=True)
+        except sqlite3.Error as exc:
+            if not _retryable(exc):
+                # malformed rows: retrying would only fail again
+                logging.error("Writer error: %s; dropping %d rows", exc, len(records))
+                return
+            logging.warning("DB unavailable (%s); spilling %d rows", exc, len(records))
+            self._spill(records)
+
+    def _transaction(self, conn: sqlite3.Connection, records: List[Dict[str, Any]], force: bool,
+                     one_by_one: bool = False) -> int:
+        with conn:                                # one transaction per group
+            written = self._write(conn, records, one_by_one)
+            refresh = self._rollups_due(force)
+            if refresh:
+                rollup.refresh(conn, self._dirty)
+        if refresh:
+            self._dirty.clear()
+            self._rollup_due = time.monotonic() + self.rollup_sec
+        return written
+
+    def _replay_spill(self, conn: sqlite3.Connection) -> None:
+        if not self.spill_path.exists():
+            return
+        with self.spill_path.open(encoding="utf-8") as f:
+            replay = [json.loads(ln) for ln in f if ln.strip()]
+        try:
+            with conn:
+                written = self._write(conn, replay, one_by_one=True)
+        except sqlite3.Error as exc:
+            if _retryable(exc):
+                raise
+            logging.error("Spill replay failed (%s); moved aside", exc)
+            self.spill_path.replace(self.spill_path.with_suffix(".spill.bad"))
+            return
+        self.spill_path.unlink()
+        self.rows_written += written
+        logging.info("Replayed %d spilled rows", len(replay))
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        with self.spill_path.open("a", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, default=str) + "\n")
+        self.rows_spilled += len(records)
+
+
+def _retryable(exc: sqlite3.Error) -> bool:
+    """Locked/busy/unopenable DB → spill and retry later; anything else is bad data."""
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and any(
+        s in msg for s in ("locked", "busy", "unable to open", "disk i/o")
+    )
+
+
+_WRITER: Optional[LogWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer() -> LogWriter:
+    """Process-wide writer shared by the poller and other producers."""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = LogWriter()
+            atexit.register(_WRITER.close)
+        return _WRITER
+
+
+def flush(timeout: float | None = None) -> bool:
+    """Block until everything handed to insert_log() is committed (or spilled)."""
+    return _WRITER.flush(timeout) if _WRITER is not None else True
+
+
+@instrument.timed("db.insert_log", rows=0)
 def insert_log(records: List[Dict[str, Any]]) -> None:
-    """Bulk-insert GPU log rows.
+    """Queue GPU log rows for the shared group-committing writer.
 
     Each record is a flat dict whose keys exactly match gpu_log columns.
+    Rows become visible after the next group commit; call flush() to force it.
     """
     if not records:
         return
+    get_writer().put(records)
 
-    cols = list(records[0].keys())
-    placeholders = ", ".join("?" for _ in cols)
-    sql = f"INSERT INTO gpu_log ({', '.join(cols)}) VALUES ({placeholders})"
+def insert_events(events: List[Dict[str, Any]]) -> None:
+    """Queue detector events (collector.detect) for the same writer and commits."""
+    if not events:
+        return
+    get_writer().put(events)
 
-    with get_conn() as conn:
-        conn.executemany(sql, [tuple(r[c] for c in cols) for r in records])
-        conn.commit()
+def prune_older_than(days: int = 7) -> List[str]:
+    """Drop day partitions older than <days>; return the tables dropped.
 
-def prune_older_than(days: int = 7) -> None:
-    """Delete rows older than <days> to keep the DB size bounded."""
+    Whole partitions go at once (no row-by-row DELETE holding the write
+    lock), so retention works in whole UTC days.  Rollup tiers keep their
+    own, longer retention (GPU_DOC_KEEP_DAYS_1M/_1H); events follow the
+    raw rows.
+    """
     with get_conn() as conn:
-        conn.execute(
-            "DELETE FROM gpu_log WHERE ts < datetime('now', ?)",
-            (f"-{days} days",),
-        )
+        cutoff = partitions.today() - days
+        dropped = partitions.drop_before(conn, cutoff)
+        conn.execute("DELETE FROM gpu_event WHERE ts < ?", (partitions.day_start(cutoff),))
+        rollup.prune(conn)
         conn.commit()
+    return dropped
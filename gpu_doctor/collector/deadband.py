@@ -0,0 +1,120 @@
+# collector/deadband.py
+"""
+Change-only (deadband) recording.
+
+A GPU's snapshot (its idle row or one row per process) is written only if
+  • the set of processes / run tags on it changed,
+  • any metric moved more than its threshold since the last *written* row, or
+  • HEARTBEAT_SEC passed since the last write (so readers can tell
+    "unchanged" from "poller down").
+Snapshots are kept or dropped per GPU as a whole, so the stored series is a
+step function: the state at time t is the last written snapshot at or
+before t, for at most max_hold seconds.  reconstruct() expands it back to a
+regular grid.
+
+Thresholds come from GPU_DOC_DEADBAND_THRESHOLDS, e.g. "util_gpu=10,temperature=3".
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .partitions import epoch
+
+DEADBAND = os.getenv("GPU_DOC_DEADBAND", "0") == "1"
+HEARTBEAT_SEC = float(os.getenv("GPU_DOC_HEARTBEAT_SEC", 300))
+
+# gpu_log column → largest change that still counts as "same" (0 = any change)
+THRESHOLDS: Dict[str, float] = {
+    "util_gpu": 5, "util_mem": 5, "mem_used_mb": 256, "proc_mem_mb": 256,
+    "temperature": 2, "power_w": 10, "ecc_errors": 0, "mem_total_mb": 0,
+}
+for _item in filter(None, os.getenv("GPU_DOC_DEADBAND_THRESHOLDS", "").split(",")):
+    _col, _, _val = _item.partition("=")
+    THRESHOLDS[_col.strip()] = float(_val)
+
+_IDENTITY = ("pid", "process_name", "user", "run_tag")
+Gpu = Tuple[str, int]                    # hostname, gpu_id
+
+
+def _moved(old: Any, new: Any, threshold: float) -> bool:
+    if old is None or new is None:
+        return old is not new
+    return abs(new - old) > threshold
+
+
+class Deadband:
+    """Per-GPU filter; keeps the last written snapshot of every GPU in memory."""
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None,
+                 heartbeat_sec: float = HEARTBEAT_SEC) -> None:
+        self.thresholds = dict(THRESHOLDS if thresholds is None else thresholds)
+        self.heartbeat_sec = heartbeat_sec
+        self.rows_seen = 0
+        self.rows_written = 0
+        self._last: Dict[Gpu, Tuple[float, Dict[tuple, Dict[str, Any]]]] = {}
+
+    def _changed(self, gpu: Gpu, when: float, rows: Dict[tuple, Dict[str, Any]]) -> bool:
+        last = self._last.get(gpu)
+        if last is None or when - last[0] >= self.heartbeat_sec:
+            return True
+        prev = last[1]
+        if prev.keys() != rows.keys():
+            return True
+        return any(
+            _moved(prev[k].get(col), row.get(col), thr)
+            for k, row in rows.items()
+            for col, thr in self.thresholds.items()
+        )
+
+    def filter(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rows of the GPUs whose snapshot is worth writing, in input order."""
+        records = list(records)
+        by_gpu: Dict[Gpu, Dict[tuple, Dict[str, Any]]] = {}
+        for r in records:
+            ident = tuple(r.get(c) for c in _IDENTITY)
+            by_gpu.setdefault((r["hostname"], r["gpu_id"]), {})[ident] = r
+        keep = set()
+        for gpu, rows in by_gpu.items():
+            when = epoch(next(iter(rows.values()))["ts"])
+            if self._changed(gpu, when, rows):
+                self._last[gpu] = (when, rows)
+                keep.add(gpu)
+        out = [r for r in records if (r["hostname"], r["gpu_id"]) in keep]
+        self.rows_seen += len(records)
+        self.rows_written += len(out)
+        return out
+
+
+# ---------- readers ---------------------------------------------------------
+def reconstruct(rows: Iterable[Dict[str, Any]], step_sec: float, start: Optional[str] = None,
+                end: Optional[str] = None, max_hold: float = 2 * HEARTBEAT_SEC) -> List[Dict[str, Any]]:
+    """Expand one GPU's deadband rows (sorted by ts) onto a regular <step_sec> grid.
+
+    Each grid point repeats the last written snapshot (ts replaced by the grid
+    time); points more than <max_hold> seconds after it are left out, since
+    a healthy poller would have written a heartbeat by then (the heartbeat
+    lands on the first poll after HEARTBEAT_SEC, hence the 2× default).
+    """
+    snaps: List[Tuple[float, List[Dict[str, Any]]]] = []
+    for r in rows:
+        t = epoch(r["ts"])
+        if snaps and snaps[-1][0] == t:
+            snaps[-1][1].append(r)
+        else:
+            snaps.append((t, [r]))
+    if not snaps:
+        return []
+    t = epoch(start) if start else snaps[0][0]
+    stop = epoch(end) if end else snaps[-1][0]
+    out: List[Dict[str, Any]] = []
+    i = -1
+    while t <= stop:
+        while i + 1 < len(snaps) and snaps[i + 1][0] <= t:
+            i += 1
+        if i >= 0 and t - snaps[i][0] <= max_hold:
+            stamp = datetime.fromtimestamp(t, timezone.utc).isoformat()
+            out += [{**r, "ts": stamp} for r in snaps[i][1]]
+        t += step_sec
+    return out
@@ -0,0 +1,161 @@
+# collector/detect.py
+"""
+Streaming per-GPU anomaly detectors, run by the poller on every sample.
+
+Each GPU keeps a fixed handful of numbers (no history), so a sample costs
+O(GPUs) whatever the fleet's age:
+
+  <metric>_zscore  EWMA mean / variance of util, memory, temperature and
+                   power; fires when a reading is Z_THRESHOLD standard
+                   deviations off after WARMUP samples (and moved by more
+                   than MIN_DELTA, so a flat series does not fire on noise)
+  mem_capacity     EWMA of the memory slope; fires when the GPU would be
+                   full within CAPACITY_SEC at that rate (crit: TTF_CRIT_SEC)
+  oom_kill         processes vanished while memory was ≥ OOM_FRAC of capacity
+                   and memory dropped with them
+  thermal / power  temperature ≥ TEMP_WARN_C (crit TEMP_CRIT_C), power ≥
+                   POWER_MAX_W
+
+An event type fires at most once per COOLDOWN_SEC per GPU unless it got
+more severe.  Events are gpu_event rows (schema.sql), written through the
+shared LogWriter; the API reads them back via retriever.events().
+"""
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .partitions import epoch
+
+DETECT = os.getenv("GPU_DOC_DETECT", "1") == "1"
+ALPHA = float(os.getenv("GPU_DOC_EWMA_ALPHA", 0.05))           # EWMA weight of the newest sample
+Z_THRESHOLD = float(os.getenv("GPU_DOC_Z_THRESHOLD", 4))
+WARMUP = int(os.getenv("GPU_DOC_DETECT_WARMUP", 20))           # samples before z-scores count
+CAPACITY_SEC = float(os.getenv("GPU_DOC_CAPACITY_SEC", 600))   # memory full within → warn
+TTF_CRIT_SEC = float(os.getenv("GPU_DOC_TTF_CRIT_SEC", 60))    # … → crit
+OOM_FRAC = float(os.getenv("GPU_DOC_OOM_FRAC", 0.9))
+TEMP_WARN_C = float(os.getenv("GPU_DOC_TEMP_WARN_C", 83))
+TEMP_CRIT_C = float(os.getenv("GPU_DOC_TEMP_CRIT_C", 90))
+POWER_MAX_W = float(os.getenv("GPU_DOC_POWER_MAX_W", 700))     # H100 SXM board limit
+COOLDOWN_SEC = float(os.getenv("GPU_DOC_EVENT_COOLDOWN_SEC", 300))
+
+# gpu_log column → smallest move worth a z-score event
+MIN_DELTA = {"util_gpu": 20, "mem_used_mb": 2048, "temperature": 5, "power_w": 50}
+_SHORT = {"util_gpu": "util", "mem_used_mb": "mem", "temperature": "temp", "power_w": "power"}
+_UNIT = {"util_gpu": "%", "mem_used_mb": " MiB", "temperature": " C", "power_w": " W"}
+_RANK = {"warn": 1, "crit": 2}
+
+Gpu = Tuple[str, int]                    # hostname, gpu_id
+
+
+@dataclass
+class _State:
+    """Everything a GPU's detectors remember between samples."""
+    n: int = 0
+    mean: Dict[str, float] = field(default_factory=dict)
+    var: Dict[str, float] = field(default_factory=dict)
+    t: float = 0.0                       # epoch of the previous sample
+    used: Optional[float] = None
+    slope: float = 0.0                   # EWMA of d(mem_used_mb)/dt, MiB/s
+    procs: int = 0
+    frac: float = 0.0
+    tag: Optional[str] = None            # run_tag of the previous sample (the job an OOM killed)
+    fired: Dict[str, Tuple[float, int]] = field(default_factory=dict)   # event → (epoch, severity rank)
+
+
+class Detector:
+    """Per-GPU streaming detectors; update() turns one sample into gpu_event rows."""
+
+    def __init__(self) -> None:
+        self._gpus: Dict[Gpu, _State] = {}
+        self.events = 0
+
+    def update(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Feed one poll (rows of one or more GPUs); return the events it fired."""
+        gpus: Dict[Gpu, Tuple[Dict[str, Any], int]] = {}
+        for r in records:                               # GPU metrics repeat on every process row
+            key = (r.get("hostname"), r.get("gpu_id"))
+            first, procs = gpus.get(key, (r, 0))
+            gpus[key] = (first, procs + (r.get("pid") is not None))
+        out: List[Dict[str, Any]] = []
+        for key, (row, procs) in gpus.items():
+            state = self._gpus.get(key)
+            if state is None:
+                state = self._gpus[key] = _State()
+            out += self._check(state, row, procs)
+        self.events += len(out)
+        return out
+
+    def feed(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """update() per poll of a time-ordered batch (consecutive rows sharing a ts)."""
+        out: List[Dict[str, Any]] = []
+        start = 0
+        for i in range(1, len(records) + 1):
+            if i == len(records) or records[i].get("ts") != records[start].get("ts"):
+                out += self.update(records[start:i])
+                start = i
+        return out
+
+    # ---------- detectors -------------------------------------------------
+    def _check(self, s: _State, row: Dict[str, Any], procs: int) -> List[Dict[str, Any]]:
+        now, tag = epoch(row["ts"]), s.tag
+        found: List[Tuple[str, str, str, float, float, float, str]] = []   # event, severity, metric, value, baseline, score, detail
+
+        for col in MIN_DELTA:                           # EWMA z-score
+            x = row.get(col)
+            if x is None:
+                continue
+            mean, var = s.mean.get(col), s.var.get(col, 0.0)
+            if mean is None:
+                s.mean[col] = float(x)
+                continue
+            diff = x - mean
+            z = diff / math.sqrt(var) if var > 0 else 0.0
+            if s.n >= WARMUP and abs(z) >= Z_THRESHOLD and abs(diff) >= MIN_DELTA[col]:
+                found.append((f"{_SHORT[col]}_zscore", "warn", col, x, mean, z,
+                              f"{_SHORT[col]} {x:g}{_UNIT[col]} vs usual {mean:.0f}{_UNIT[col]} (z={z:+.1f})"))
+            incr = ALPHA * diff
+            s.mean[col] = mean + incr
+            s.var[col] = (1 - ALPHA) * (var + diff * incr)
+
+        used, total = row.get("mem_used_mb"), row.get("mem_total_mb")
+        if used is not None and total:
+            frac = used / total
+            if s.used is not None and now > s.t:        # memory slope → time to capacity
+                s.slope += ALPHA * 4 * ((used - s.used) / (now - s.t) - s.slope)   # faster than the z EWMAs
+                ttf = (total - used) / s.slope if s.slope > 0 else math.inf
+                if ttf <= CAPACITY_SEC:
+                    found.append(("mem_capacity", "crit" if ttf <= TTF_CRIT_SEC else "warn", "mem_used_mb",
+                                  used, total, ttf, f"memory {frac:.0%} of {total:g} MiB, full in ~{ttf:.0f} s "
+                                                    f"at +{s.slope:.0f} MiB/s"))
+            if s.procs and procs < s.procs and s.frac >= OOM_FRAC and frac < s.frac - 0.2:
+                found.append(("oom_kill", "crit", "mem_used_mb", used, s.used, s.frac,
+                              f"{s.procs - procs} process(es) gone after memory reached {s.frac:.0%} "
+                              f"(likely OOM)"))
+            s.used, s.frac = used, frac
+        s.t, s.procs, s.tag = now, procs, row.get("run_tag")
+
+        temp = row.get("temperature")
+        if temp is not None and temp >= TEMP_WARN_C:
+            found.append(("thermal", "crit" if temp >= TEMP_CRIT_C else "warn", "temperature", temp,
+                          TEMP_WARN_C, temp - TEMP_WARN_C, f"temperature {temp:g} C (limit {TEMP_WARN_C:g} C)"))
+        power = row.get("power_w")
+        if power is not None and POWER_MAX_W and power >= POWER_MAX_W:
+            found.append(("power", "warn", "power_w", power, POWER_MAX_W, power - POWER_MAX_W,
+                          f"power {power:g} W (limit {POWER_MAX_W:g} W)"))
+        s.n += 1
+
+        out = []
+        for event, severity, metric, value, baseline, score, detail in found:
+            last = s.fired.get(event)
+            if last and now - last[0] < COOLDOWN_SEC and _RANK[severity] <= last[1]:
+                continue
+            s.fired[event] = (now, _RANK[severity])
+            out.append({"event": event, "ts": row["ts"], "hostname": row.get("hostname"),
+                        "gpu_id": row.get("gpu_id"), "severity": severity, "metric": metric,
+                        "value": float(value), "baseline": float(baseline), "score": float(score),
+                        "run_tag": tag if event == "oom_kill" else row.get("run_tag"),
+                        "detail": f"{row.get('hostname')} GPU {row.get('gpu_id')}: {detail}"})
+        return out
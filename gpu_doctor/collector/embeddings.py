@@ -1,12 +1,31 @@
 # collector/embeddings.py
 from __future__ import annotations
-import json, sqlite3, numpy as np
-from sentence_transformers import SentenceTransformer, util
-from pathlib import Path
+import json, logging, os, sqlite3, threading, numpy as np
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
-_MODEL = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-_DB = Path(__file__).parents[1] / "gpu_logs.db"
-_FAISS_IDX = Path(__file__).parents[1] / "gpu_logs.faiss"
+from .. import instrument
+from . import partitions
+from .db import _DB_PATH as _DB
+
+if TYPE_CHECKING:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = os.getenv("GPU_DOC_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+_MODEL: Optional["SentenceTransformer"] = None
+_MODEL_LOCK = threading.Lock()
+
+
+def model() -> "SentenceTransformer":
+    """The MiniLM encoder, loaded on first use (importing torch takes seconds)."""
+    global _MODEL
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                from sentence_transformers import SentenceTransformer
+                _MODEL = SentenceTransformer(MODEL_NAME)
+    return _MODEL
 
 
 def to_text(row: sqlite3.Row) -> str:
@@ -18,33 +37,209 @@ def to_text(row: sqlite3.Row) -> str:
     )
 
 
+@instrument.timed("embed.encode")
 def encode(text: str) -> np.ndarray:
-    return _MODEL.encode(text, normalize_embeddings=True)
+    return model().encode(text, normalize_embeddings=True)
+
+
+# ---- batch encoding ---------------------------------------------------
+CHUNK_ROWS = int(os.getenv("GPU_DOC_EMBED_CHUNK", 4096))     # rows pulled from SQLite at once
+BATCH_SIZE = int(os.getenv("GPU_DOC_EMBED_BATCH", 256))      # rows per model forward pass
+WORKERS = int(os.getenv("GPU_DOC_EMBED_WORKERS", -1))        # -1 → auto, 0/1 → in-process
+POOL_MIN_ROWS = int(os.getenv("GPU_DOC_EMBED_POOL_MIN", 20000))  # smaller jobs stay in-process
+
+
+@instrument.timed("embed.encode_batch", rows=0)
+def encode_batch(texts: List[str], pool: Optional[dict] = None,
+                 batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """Encode many texts at once → float32 array of unit vectors, shape (n, d)."""
+    if pool is None:
+        vecs = model().encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                             convert_to_numpy=True)
+    else:
+        vecs = model().encode_multi_process(texts, pool, batch_size=batch_size)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return np.asarray(vecs, dtype="float32")
+
+
+@contextmanager
+def encoder_pool(workers: int = WORKERS) -> Iterator[Optional[dict]]:
+    """Multi-process encode pool on CPU-only hosts; None means encode in-process.
+
+    workers=-1 picks one process per core when no CUDA device is present
+    (a GPU already parallelises each batch, so it stays in-process there).
+    """
+    if workers < 0:
+        import torch
+        workers = 1 if torch.cuda.is_available() else (os.cpu_count() or 1)
+    if workers <= 1:
+        yield None
+        return
+    pool = model().start_multi_process_pool(["cpu"] * workers)
+    try:
+        yield pool
+    finally:
+        model().stop_multi_process_pool(pool)
+
+
+def _iter_chunks(conn: sqlite3.Connection, sql: str, params: tuple = (),
+                 size: int = CHUNK_ROWS) -> Iterator[List[sqlite3.Row]]:
+    """Stream a query in fetchmany() chunks instead of fetchall()."""
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
 
 
 # ---- Option A  pgvector-sqlite ---------------------------------------
-def migrate_pgvector() -> None:
-    """Add a VECTOR(384) column once, then back-fill."""
-    with sqlite3.connect(_DB) as conn:
+def migrate_pgvector(workers: int = WORKERS, batch_size: int = BATCH_SIZE) -> int:
+    """Add a VECTOR(384) column once, then back-fill; return rows encoded."""
+    done = 0
+    with sqlite3.connect(_DB) as conn, encoder_pool(workers) as pool:
+        conn.row_factory = sqlite3.Row
         conn.enable_load_extension(True)
         conn.load_extension("vector0")  # pip install pgvector-sqlite
-        conn.execute("ALTER TABLE gpu_log ADD COLUMN embedding VECTOR")  # idempotent
-        rows = conn.execute("SELECT id, * FROM gpu_log WHERE embedding IS NULL").fetchall()
-        for r in rows:
-            conn.execute(
-                "UPDATE gpu_log SET embedding = ? WHERE id = ?",
-                (json.dumps(encode(to_text(r)).tolist()), r["id"]),
-            )
+        for _, table in partitions.list_partitions(conn):
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN embedding VECTOR")
+                partitions.rebuild_view(conn)
+            except sqlite3.OperationalError:
+                pass                     # column already there (day partitions have it)
+            done += _backfill(conn, table, pool, batch_size)
+    return done
+
+
+def _backfill(conn: sqlite3.Connection, table: str, pool: Optional[dict], batch_size: int,
+              page: int = CHUNK_ROWS) -> int:
+    """Encode the rows of <table> without an embedding, <page> ids at a time."""
+    done = last_id = 0
+    while True:
+        # page by id so UPDATEs never race an open cursor on the same table
+        rows = conn.execute(
+            f"SELECT * FROM {table} WHERE embedding IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (last_id, page),
+        ).fetchall()
+        if not rows:
+            return done
+        vecs = encode_batch([to_text(r) for r in rows], pool, batch_size)
+        conn.executemany(
+            f"UPDATE {table} SET embedding = ? WHERE id = ?",
+            [(json.dumps(v.tolist()), r["id"]) for v, r in zip(vecs, rows)],
+        )
         conn.commit()
+        last_id = rows[-1]["id"]
+        done += len(rows)
 
 # # ---- Option B  FAISS -------------------------------------------------
-import faiss, pickle
-def build_faiss() -> None:
+# Generations are written through index_store.  Row ids encode their day
+# partition (partitions.day_of_id), so the indexed ids themselves tell,
+# per partition, what is already embedded and what was dropped.
+from . import index_store
+
+
+def _high_water(ids: "np.ndarray") -> Dict[int, int]:
+    """Largest indexed id per partition day."""
+    if not ids.size:
+        return {}
+    days, inv = np.unique(ids >> partitions.DAY_BITS, return_inverse=True)
+    top = np.full(len(days), -1, dtype="int64")
+    np.maximum.at(top, inv, ids)
+    return dict(zip(days.tolist(), top.tolist()))
+
+
+RETRAIN_FACTOR = float(os.getenv("GPU_DOC_RETRAIN_FACTOR", 4))  # rebuild once rows > this × sample
+MIN_TRAIN_ROWS = 1000
+
+
+def _fresh_index(conn: sqlite3.Connection, dim: int, n: int, spec: str, pool: Optional[Any],
+                 batch_size: int) -> Tuple["faiss.IndexIDMap", str, int]:
+    """Empty IndexIDMap of type <spec>, trained on a random row sample if it needs it.
+
+    Returns (index, spec actually used, training-sample size).
+    """
+    import faiss
+    index = index_store.new_index(dim, n, spec)
+    if index.is_trained:
+        return faiss.IndexIDMap(index), spec, 0
+    rows = conn.execute("SELECT * FROM gpu_log ORDER BY random() LIMIT ?", (index_store.TRAIN_ROWS,)).fetchall()
+    if len(rows) < MIN_TRAIN_ROWS:
+        logging.warning("%d rows are too few to train %s; using a flat index for now", len(rows), spec)
+        return faiss.IndexIDMap(index_store.new_index(dim, n, "flat")), "flat", 0
+    index = index_store.new_index(dim, n, spec, train=len(rows))
+    index.train(encode_batch([to_text(r) for r in rows], pool, batch_size))
+    return faiss.IndexIDMap(index), spec, len(rows)
+
+
+def build_faiss(incremental: bool = False, workers: int = WORKERS,
+                batch_size: int = BATCH_SIZE, spec: str = index_store.INDEX) -> int:
+    """Build or update the FAISS index; return the number of rows encoded.
+
+    incremental=True loads the published generation, drops the vectors of
+    partitions that were pruned (one id range per day) and appends, per
+    partition, only rows above the highest id already indexed – late rows
+    for an older day are picked up too.
+
+    <spec> (GPU_DOC_INDEX) picks flat / ivf_flat / ivf_pq / hnsw; IVF and PQ
+    are trained on a random sample of up to GPU_DOC_TRAIN_ROWS rows.  An
+    incremental run becomes a full rebuild when nothing is published yet,
+    the type changed, rows outgrew RETRAIN_FACTOR × the training sample, or
+    an HNSW or IVF index (see index_store.can_remove) would have to drop
+    rows.
+    """
+    import faiss
+    dim = model().get_sentence_embedding_dimension()
+    idx, meta = index_store.load_for_update(dim) if incremental else (None, {})
+    if not meta or meta.get("spec", "flat") != spec:
+        idx, meta = None, {}
+    indexed = faiss.vector_to_array(idx.id_map) if idx is not None and idx.ntotal else np.empty(0, dtype="int64")
+    marks = _high_water(indexed)
+    last_id = meta.get("last_id", 0)
+    used, trained_on = meta.get("spec", spec), meta.get("trained_on", 0)
+
+    added = removed = 0
     with sqlite3.connect(_DB) as conn:
         conn.row_factory = sqlite3.Row  # <-- add this line
-        rows = conn.execute("SELECT id, * FROM gpu_log").fetchall()
-    vectors = np.stack([encode(to_text(r)) for r in rows])
-    idx = faiss.IndexFlatIP(vectors.shape[1])
-    idx.add(vectors.astype("float32"))
-    faiss.write_index(idx, str(_FAISS_IDX))
-    pickle.dump([r["id"] for r in rows], open(_FAISS_IDX.with_suffix(".ids"), "wb"))
+        live = partitions.list_partitions(conn)
+        live_days = {d for d, _ in live}
+        gone = [day for day in marks if day not in live_days]   # dropped by prune_older_than
+        trim = 0
+        if 0 in marks and 0 in live_days:   # legacy table is still trimmed by DELETE
+            trim = conn.execute(f"SELECT MIN(id) FROM {partitions.LEGACY}").fetchone()[0] or 0
+        stale = gone or (trim and int(indexed.min()) < trim)
+        if idx is not None and stale and not index_store.can_remove(idx.index):
+            idx, marks = None, {}
+        if idx is not None:
+            for day in gone:
+                removed += idx.remove_ids(faiss.IDSelectorRange(*partitions.id_range(day)))
+            if trim:
+                removed += idx.remove_ids(faiss.IDSelectorRange(0, trim))
+
+        def plan(marks: Dict[int, int]) -> Tuple[List[Tuple[str, int]], int]:
+            todo = [(t, marks.get(d, partitions.id_range(d)[0])) for d, t in live]
+            return todo, sum(
+                conn.execute(f"SELECT COUNT(*) FROM {t} WHERE id > ?", (mark,)).fetchone()[0]
+                for t, mark in todo
+            )
+
+        todo, pending = plan(marks)
+        if idx is not None and trained_on and idx.ntotal + pending > RETRAIN_FACTOR * trained_on:
+            logging.info("Index outgrew its %d-row training sample; retraining", trained_on)
+            idx, marks = None, {}
+            todo, pending = plan(marks)
+        # spinning up worker processes costs more than a small increment
+        with encoder_pool(workers if pending >= POOL_MIN_ROWS else 1) as pool:
+            if idx is None:
+                idx, used, trained_on = _fresh_index(conn, dim, pending, spec, pool, batch_size)
+                meta, last_id = {}, 0
+            for table, mark in todo:
+                for rows in _iter_chunks(conn, f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (mark,)):
+                    vectors = encode_batch([to_text(r) for r in rows], pool, batch_size)
+                    idx.add_with_ids(vectors, np.fromiter((r["id"] for r in rows), dtype="int64", count=len(rows)))
+                    last_id = max(last_id, rows[-1]["id"])
+                    added += len(rows)
+
+    if added or removed or not meta:
+        index_store.publish(idx, last_id, spec=used, trained_on=trained_on)
+    return added
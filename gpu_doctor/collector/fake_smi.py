@@ -0,0 +1,55 @@
+# collector/fake_smi.py
+"""
+Stand-in `nvidia-smi` driven by collector.synthetic, for GPU-less boxes:
+
+    GPU_DOC_NVSMI="python -m gpu_doctor.collector.fake_smi" gpu_poll --once
+
+Supports `-q -x`, `--help-query-gpu` and `--query-gpu=…
+--format=csv,noheader,nounits [-lms N]`.  Environment:
+  FAKE_SMI_GPUS / FAKE_SMI_PROCS    fleet size (default 8 / 16)
+  FAKE_SMI_PATTERN                  steady | ramp | oom | mixed (default mixed)
+  FAKE_SMI_STEP_SEC                 one-shot calls use cycle = now // step (default 1)
+  FAKE_SMI_CYCLES                   loop mode exits after that many cycles
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+from typing import List
+
+from .synthetic import CSV_FIELDS, synthetic_csv, synthetic_xml
+
+
+def main(argv: List[str]) -> int:
+    gpus = int(os.getenv("FAKE_SMI_GPUS", 8))
+    procs = int(os.getenv("FAKE_SMI_PROCS", 16))
+    pattern = os.getenv("FAKE_SMI_PATTERN", "mixed")
+    cycle = int(time.time() // float(os.getenv("FAKE_SMI_STEP_SEC", 1)))
+    out = sys.stdout
+
+    if "--help-query-gpu" in argv:
+        out.write('List of valid properties to query for the switch "--query-gpu":\n')
+        out.writelines(f"    {f:<25} : fake\n" for f in [*CSV_FIELDS, "count"])
+        return 0
+    if "-q" in argv and "-x" in argv:
+        out.write(synthetic_xml(gpus, procs, cycle, pattern).decode() + "\n")
+        return 0
+    query = next((a.split("=", 1)[1] for a in argv if a.startswith("--query-gpu=")), None)
+    if query is None or "--format=csv,noheader,nounits" not in argv:
+        sys.stderr.write("Invalid combination of input arguments.\n")
+        return 2
+    loop_ms = int(argv[argv.index("-lms") + 1]) if "-lms" in argv else None
+    cycles = int(os.getenv("FAKE_SMI_CYCLES", 0)) or None
+    done = 0
+    while True:
+        out.write(synthetic_csv(gpus, query.split(","), cycle + done, pattern, procs))
+        out.flush()
+        done += 1
+        if loop_ms is None or (cycles and done >= cycles):
+            return 0
+        time.sleep(loop_ms / 1000)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,258 @@
+# collector/features.py
+"""
+Numeric-feature retrieval: no text, no model.
+
+Every gpu_log row maps to a fixed-width float32 vector built with NumPy
+straight from its columns (FEATURES): utilisation, memory fraction,
+temperature and power scaled to ~[0, 1], plus their change since the same
+GPU's previous snapshot.  That makes "rows like this OOM" or "biggest
+memory jumps" a vectorised scan instead of a MiniLM forward pass per row;
+the text index is only needed for free-text questions.
+
+Vectors are cached per partition and validated by its MIN/MAX id (both
+O(1) lookups): new rows are appended incrementally, a partition trimmed or
+dropped by retention is recomputed or evicted.  Cost is ~56 bytes per
+cached row (id + 12 float32).  Deltas chain across day partitions when the
+previous day is cached; rows that arrive out of order are compared with
+the latest snapshot seen.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from . import partitions
+
+TEMP_SCALE = float(os.getenv("GPU_DOC_TEMP_SCALE", 100))      # °C mapped to 1.0
+POWER_SCALE = float(os.getenv("GPU_DOC_POWER_SCALE", 400))    # W mapped to 1.0
+
+_BASE = ("util_gpu", "util_mem", "mem_frac", "proc_mem_frac", "temperature", "power", "ecc", "busy")
+_DELTA = ("util_gpu", "mem_frac", "temperature", "power")
+FEATURES = _BASE + tuple(f"d_{f}" for f in _DELTA)
+_DELTA_SRC = [_BASE.index(f) for f in _DELTA]
+
+# Named query signatures: feature → target value; unnamed features are ignored
+SIGNATURES: Dict[str, Dict[str, float]] = {
+    "oom": {"mem_frac": 1.0, "d_mem_frac": 0.15, "busy": 1},
+    "mem_leak": {"mem_frac": 0.8, "d_mem_frac": 0.05, "d_util_gpu": 0.0, "busy": 1},
+    "thermal": {"temperature": 0.9, "d_temperature": 0.05},
+    "power_cap": {"power": 1.0, "util_gpu": 1.0},
+    "idle_hog": {"util_gpu": 0.0, "mem_frac": 0.6, "busy": 1},
+    "stall": {"util_gpu": 0.0, "d_util_gpu": -0.8, "busy": 1},
+    "ecc": {"ecc": 1},
+}
+
+Signature = Union[str, int, Mapping[str, float]]
+
+_SQL = (
+    "SELECT id, hostname, gpu_id, (julianday(ts) - 2440587.5) * 86400.0, util_gpu, util_mem, "
+    "mem_used_mb, mem_total_mb, proc_mem_mb, temperature, power_w, ecc_errors, pid IS NOT NULL "
+    "FROM {table} WHERE id > ? ORDER BY id"
+)
+
+
+@dataclass
+class Block:
+    """Feature vectors of one partition; ids ascending, lead = first row of a snapshot."""
+
+    ids: np.ndarray
+    X: np.ndarray
+    lead: np.ndarray
+    tail: Dict[int, np.ndarray]             # gpu key → delta-source features of its last snapshot
+    lo: int
+    hi: int
+
+    def extend(self, new: "Block") -> "Block":
+        return Block(np.concatenate([self.ids, new.ids]), np.concatenate([self.X, new.X]),
+                     np.concatenate([self.lead, new.lead]), new.tail, self.lo, new.hi)
+
+
+# ---------- vectorised feature build ------------------------------------
+_GPUS: Dict[Tuple[str, int], int] = {}
+
+
+def compute(rows: List[tuple], seed: Optional[Dict[int, np.ndarray]] = None) -> Optional[Block]:
+    """Feature block for rows shaped like _SQL; <seed> = previous block's tail."""
+    if not rows:
+        return None
+    seed = seed or {}
+    cols = list(zip(*rows))
+    n = len(rows)
+    ids = np.array(cols[0], dtype="int64")
+    gpu = np.fromiter((_GPUS.setdefault(k, len(_GPUS)) for k in zip(cols[1], cols[2])), "int64", n)
+    ts = np.array(cols[3], dtype="float64")
+    util, umem, used, total, proc, temp, power, ecc, busy = np.array(cols[4:], dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base = np.stack([util / 100, umem / 100, used / total, proc / total, temp / TEMP_SCALE,
+                         power / POWER_SCALE, ecc > 0, busy], axis=1)
+    base = np.nan_to_num(base, nan=0.0, posinf=0.0, neginf=0.0)
+
+    order = np.lexsort((ids, ts, gpu))                 # by gpu, then time
+    g, t, cur = gpu[order], ts[order], base[order][:, _DELTA_SRC]
+    new_gpu = np.r_[True, g[1:] != g[:-1]]
+    lead = new_gpu | np.r_[True, t[1:] != t[:-1]]
+    start = np.maximum.accumulate(np.where(lead, np.arange(n), 0))
+    prev = cur[np.maximum(start - 1, 0)]               # a row of the previous snapshot
+    for i in np.flatnonzero(new_gpu[start]):           # gpu's first snapshot in this batch
+        prev[i] = seed.get(int(g[i]), cur[i])
+
+    X = np.empty((n, len(FEATURES)), dtype="float32")
+    X[order] = np.hstack([base[order], cur - prev])
+    first = np.empty(n, dtype=bool)
+    first[order] = lead
+    last = np.r_[g[1:] != g[:-1], True]
+    tail = {**seed, **{int(g[i]): cur[i] for i in np.flatnonzero(last)}}
+    return Block(ids, X, first, tail, int(ids[0]), int(ids[-1]))
+
+
+# ---------- per-partition cache ------------------------------------------
+_BLOCKS: Dict[str, Block] = {}
+_LOCK = threading.Lock()
+
+
+def _refresh(conn: sqlite3.Connection, table: str, seed: Dict[int, np.ndarray]) -> Optional[Block]:
+    lo, hi = conn.execute(
+        f"SELECT (SELECT MIN(id) FROM {table}), (SELECT MAX(id) FROM {table})"
+    ).fetchone()
+    blk = _BLOCKS.get(table)
+    if lo is None:
+        blk = None
+    elif blk is None or blk.lo != lo:                  # new, or trimmed by retention
+        blk = compute(conn.execute(_SQL.format(table=table), (lo - 1,)).fetchall(), seed)
+    elif hi > blk.hi:
+        new = compute(conn.execute(_SQL.format(table=table), (blk.hi,)).fetchall(), blk.tail)
+        blk = blk.extend(new) if new else blk
+    if blk is None:
+        _BLOCKS.pop(table, None)
+    else:
+        _BLOCKS[table] = blk
+    return blk
+
+
+def blocks(conn: sqlite3.Connection, since: Optional[str] = None,
+           until: Optional[str] = None) -> List[Block]:
+    """Up-to-date feature blocks of the partitions covering [since, until]."""
+    wanted = set(partitions.covering(conn, since, until))
+    out = []
+    with _LOCK:
+        live = partitions.list_partitions(conn)
+        for name in set(_BLOCKS) - {t for _, t in live}:
+            del _BLOCKS[name]                          # dropped by prune_older_than
+        seed: Dict[int, np.ndarray] = {}
+        for _, table in live:
+            if table not in wanted:
+                seed = _BLOCKS[table].tail if table in _BLOCKS else {}
+                continue
+            blk = _refresh(conn, table, seed)
+            seed = blk.tail if blk else {}
+            if blk:
+                out.append(blk)
+    return out
+
+
+def clear() -> None:
+    with _LOCK:
+        _BLOCKS.clear()
+
+
+# ---------- queries -------------------------------------------------------
+def _rows(blk: Block, ids: Optional[np.ndarray]) -> np.ndarray:
+    """Positions in <blk> of the wanted ids (all rows when ids is None)."""
+    if ids is None:
+        return np.arange(len(blk.ids))
+    pos = np.searchsorted(blk.ids, ids)
+    ok = pos < len(blk.ids)
+    pos = pos[ok]
+    return pos[blk.ids[pos] == ids[ok]]
+
+
+def _top(parts: List[Tuple[np.ndarray, np.ndarray]], k: int, largest: bool) -> List[Tuple[int, float]]:
+    """Merge per-block scores; each block contributes at most its own top k."""
+    if not parts or k <= 0:
+        return []
+    keep = []
+    for ids, vals in parts:
+        if len(vals) > k:
+            cut = np.argpartition(-vals if largest else vals, k - 1)[:k]
+            ids, vals = ids[cut], vals[cut]
+        keep.append((ids, vals))
+    ids = np.concatenate([p[0] for p in keep])
+    vals = np.concatenate([p[1] for p in keep])
+    best = np.argsort(-vals if largest else vals, kind="stable")[:k]
+    return [(int(ids[i]), float(vals[i])) for i in best]
+
+
+def row_vector(conn: sqlite3.Connection, row_id: int) -> Optional[np.ndarray]:
+    """Feature vector of one stored row (None if it was pruned)."""
+    day = partitions.day_of_id(row_id)
+    at = None if day == 0 else (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).isoformat()
+    for blk in blocks(conn, at, at):                   # that day's partition (+ legacy)
+        pos = np.searchsorted(blk.ids, row_id)
+        if pos < len(blk.ids) and blk.ids[pos] == row_id:
+            return blk.X[pos]
+    return None
+
+
+def signature(conn: sqlite3.Connection, sig: Signature) -> Tuple[np.ndarray, np.ndarray]:
+    """(target vector, weights) for a SIGNATURES name, a {feature: value} map or a row id."""
+    if isinstance(sig, (int, np.integer)):
+        vec = row_vector(conn, int(sig))
+        if vec is None:
+            raise KeyError(f"row {sig} not found")
+        return vec, np.ones(len(FEATURES), dtype="float32")
+    if isinstance(sig, str):
+        if sig not in SIGNATURES:
+            raise KeyError(f"unknown signature {sig!r} (known: {', '.join(SIGNATURES)})")
+        sig = SIGNATURES[sig]
+    unknown = set(sig) - set(FEATURES)
+    if unknown:
+        raise KeyError(f"unknown feature(s) {sorted(unknown)} (known: {', '.join(FEATURES)})")
+    target = np.zeros(len(FEATURES), dtype="float32")
+    weight = np.zeros(len(FEATURES), dtype="float32")
+    for name, value in sig.items():
+        target[FEATURES.index(name)] = value
+        weight[FEATURES.index(name)] = 1
+    return target, weight
+
+
+def similar(conn: sqlite3.Connection, sig: Signature, k: int = 5, ids: Optional[np.ndarray] = None,
+            since: Optional[str] = None, until: Optional[str] = None) -> List[Tuple[int, float]]:
+    """(row id, weighted distance) of the <k> rows closest to <sig>, nearest first.
+
+    ids (e.g. retriever.candidate_ids) restricts the candidates.
+    """
+    target, weight = signature(conn, sig)
+    cols = np.flatnonzero(weight)                    # only the features the signature names
+    parts = []
+    for blk in blocks(conn, since, until):
+        if ids is None:
+            rid, X = blk.ids, blk.X[:, cols]
+        else:
+            pos = _rows(blk, ids)
+            rid, X = blk.ids[pos], blk.X[pos][:, cols]
+        if rid.size:
+            diff = X - target[cols]
+            parts.append((rid, (diff * diff) @ weight[cols]))
+    return _top(parts, k, largest=False)
+
+
+def spikes(conn: sqlite3.Connection, metric: str = "mem_frac", k: int = 5, ids: Optional[np.ndarray] = None,
+           since: Optional[str] = None, until: Optional[str] = None) -> List[Tuple[int, float]]:
+    """(row id, jump) of the <k> largest increases of <metric>, one row per snapshot."""
+    name = metric if metric.startswith("d_") else f"d_{metric}"
+    if name not in FEATURES:
+        raise KeyError(f"no delta for {metric!r} (known: {', '.join(_DELTA)})")
+    col = FEATURES.index(name)
+    parts = []
+    for blk in blocks(conn, since, until):
+        pos = np.flatnonzero(blk.lead) if ids is None else _rows(blk, ids)
+        pos = pos[blk.lead[pos]]
+        if pos.size:
+            parts.append((blk.ids[pos], blk.X[pos, col]))
+    return _top(parts, k, largest=True)
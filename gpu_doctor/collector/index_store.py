@@ -0,0 +1,227 @@
+# collector/index_store.py
+"""
+On-disk FAISS generations shared by the backfill (writer) and the API (readers).
+
+    gpu_logs.index.json      manifest → {"generation", "last_id", "index", "ids",
+                                         "spec", "trained_on"}
+    gpu_logs.g<N>.faiss      bare vector index (flat / IVF / HNSW); row i ↔ ids[i]
+    gpu_logs.g<N>.ids.npy    flat int64 gpu_log ids
+
+Readers open a generation memory-mapped, so every API worker shares the same
+page-cache pages.  The writer publishes a new generation by writing fresh
+files and then atomically replacing the manifest; readers notice the new
+manifest and swap generations without blocking searches already in flight.
+"""
+
+from __future__ import annotations
+import json, logging, os, time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .db import _DB_PATH
+
+MANIFEST = _DB_PATH.with_suffix(".index.json")
+KEEP_GENERATIONS = int(os.getenv("GPU_DOC_KEEP_GENERATIONS", 2))
+
+# Index type: flat | ivf_flat | ivf_pq | hnsw, or any faiss index_factory string
+INDEX = os.getenv("GPU_DOC_INDEX", "flat")
+IVF_NLIST = int(os.getenv("GPU_DOC_IVF_NLIST", 0))        # 0 = 4·√N, capped by the sample
+PQ_M = int(os.getenv("GPU_DOC_PQ_M", 0))                  # 0 = dim / 8 sub-quantizers
+HNSW_M = int(os.getenv("GPU_DOC_HNSW_M", 32))
+NPROBE = int(os.getenv("GPU_DOC_NPROBE", 16))             # IVF lists scanned per query
+EF_SEARCH = int(os.getenv("GPU_DOC_HNSW_EF", 64))         # HNSW candidate list per query
+TRAIN_ROWS = int(os.getenv("GPU_DOC_TRAIN_ROWS", 100_000))
+EXACT_MAX = int(os.getenv("GPU_DOC_EXACT_MAX", 50_000))   # filtered HNSW: score ≤ this many exactly
+
+if TYPE_CHECKING:
+    import faiss
+
+
+def _faiss():
+    import faiss            # deferred: only index users pay for it
+    return faiss
+
+
+# ---------- index types ------------------------------------------------
+def factory_string(dim: int, n: int, spec: str = INDEX, train: int = TRAIN_ROWS) -> str:
+    """faiss index_factory string for <spec> sized for about <n> vectors.
+
+    The auto nlist keeps ≥ 39 training points per IVF list (faiss' minimum).
+    """
+    nlist = IVF_NLIST or max(1, min(int(4 * n ** 0.5), train // 39))
+    m = PQ_M or next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+    presets = {
+        "flat": "Flat",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_pq": f"IVF{nlist},PQ{m}x8",
+        "hnsw": f"HNSW{HNSW_M},Flat",
+    }
+    return presets.get(spec, spec)
+
+
+def new_index(dim: int, n: int, spec: str = INDEX, train: int = TRAIN_ROWS) -> "faiss.Index":
+    """Empty (possibly untrained) inner-product index of the configured type."""
+    faiss = _faiss()
+    return faiss.index_factory(dim, factory_string(dim, n, spec, train), faiss.METRIC_INNER_PRODUCT)
+
+
+def can_remove(index: "faiss.Index") -> bool:
+    """Only flat stores drop vectors cleanly; HNSW and IVF indexes are rebuilt instead.
+
+    HNSW graphs cannot remove at all, and an IVF under IndexIDMap keeps the
+    old positions as list labels while ``id_map`` is compacted around them.
+    """
+    faiss = _faiss()
+    return (faiss.try_extract_index_ivf(index) is None
+            and not isinstance(faiss.downcast_index(index), faiss.IndexHNSW))
+
+
+def _search_params(index: "faiss.Index", sel: Any = None, selectivity: float = 1.0) -> Any:
+    """Per-type query knobs; a filter widens the IVF probe so k matches survive it."""
+    faiss = _faiss()
+    kw = {} if sel is None else {"sel": sel}
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        nprobe = min(ivf.nlist, max(NPROBE, int(NPROBE / max(selectivity, 1e-9))))
+        return faiss.SearchParametersIVF(nprobe=nprobe, **kw)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=EF_SEARCH, **kw)
+    return faiss.SearchParameters(**kw) if kw else None
+
+
+@dataclass
+class Generation:
+    """One immutable, memory-mapped index generation."""
+    number: int
+    index: "faiss.Index"
+    ids: np.ndarray           # int64, possibly a read-only memmap
+    last_id: int
+    load_ms: float
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    _sorted: Optional[Tuple[np.ndarray, Optional[np.ndarray]]] = field(default=None, repr=False)
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Index positions of the given gpu_log ids; ids not indexed are skipped."""
+        if self._sorted is None:
+            if np.all(self.ids[1:] > self.ids[:-1]):    # the usual case: append-only
+                self._sorted = (self.ids, None)
+            else:                                        # late rows appended out of order
+                order = np.argsort(self.ids, kind="stable")
+                self._sorted = (self.ids[order], order)
+        keys, order = self._sorted
+        if not len(keys):
+            return np.empty(0, dtype="int64")
+        ids = np.asarray(ids, dtype="int64")
+        at = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+        at = at[keys[at] == ids]
+        return at if order is None else order[at]
+
+    def search(self, vec: np.ndarray, k: int,
+               ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, gpu_log ids) of the top-k hits, FAISS -1 padding removed.
+
+        ids restricts the search to those rows (an IDSelector over their
+        positions), so filtered queries still get k hits when k exist.
+        """
+        x = np.asarray(vec, dtype="float32").reshape(1, -1)
+        if ids is None:
+            D, P = self.index.search(x, k, params=_search_params(self.index))
+        else:
+            pos = self.positions(ids)
+            if not pos.size:
+                return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+            faiss = _faiss()
+            if isinstance(self.index, faiss.IndexHNSW) and pos.size <= EXACT_MAX:
+                # a narrow filter starves the graph walk; score its rows directly
+                scores = faiss.downcast_index(self.index.storage).reconstruct_batch(pos) @ x[0]
+                top = np.argsort(-scores)[:k]
+                return scores[top], self.ids[pos[top]]
+            params = _search_params(self.index, faiss.IDSelectorBatch(pos), pos.size / max(self.ntotal, 1))
+            D, P = self.index.search(x, k, params=params)
+        keep = P[0] >= 0
+        return D[0][keep], self.ids[P[0][keep]]
+
+
+def read_manifest() -> Dict[str, Any]:
+    try:
+        return json.loads(MANIFEST.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest_stamp() -> Optional[int]:
+    """Cheap change detector (mtime in ns) for hot reload; None if unpublished."""
+    try:
+        return MANIFEST.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def open_generation(mmap: bool = True) -> Optional[Generation]:
+    """Open the currently published generation, or None if there is none."""
+    man = read_manifest()
+    if not man:
+        return None
+    faiss = _faiss()
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    t0 = time.perf_counter()
+    folder = MANIFEST.parent
+    index = faiss.read_index(str(folder / man["index"]), flags if mmap else 0)
+    ids = np.load(folder / man["ids"], mmap_mode="r" if mmap else None)
+    return Generation(man["generation"], index, ids, man.get("last_id", 0),
+                      (time.perf_counter() - t0) * 1000)
+
+
+def load_for_update(dim: int) -> Tuple["faiss.IndexIDMap", Dict[str, Any]]:
+    """Writable IndexIDMap (labels = gpu_log ids) built from the current generation."""
+    faiss = _faiss()
+    man = read_manifest()
+    gen = open_generation(mmap=False) if man else None
+    if gen is None:
+        return faiss.IndexIDMap(faiss.IndexFlatIP(dim)), {}
+    # IndexIDMap() insists on an empty sub-index, so graft the loaded one in
+    idx = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    idx.index, idx.ntotal = gen.index, gen.index.ntotal
+    idx.referenced_objects = [gen.index]        # keep it alive for SWIG
+    faiss.copy_array_to_vector(np.ascontiguousarray(gen.ids, dtype="int64"), idx.id_map)
+    return idx, man
+
+
+def publish(idx: "faiss.IndexIDMap", last_id: int, **meta: Any) -> int:
+    """Write idx as the next generation, flip the manifest, drop stale files.
+
+    meta (index spec, training-sample size, ...) is stored in the manifest.
+    """
+    faiss = _faiss()
+    number = read_manifest().get("generation", 0) + 1
+    stem = MANIFEST.name.split(".")[0]
+    files = {"index": f"{stem}.g{number}.faiss", "ids": f"{stem}.g{number}.ids.npy"}
+    folder = MANIFEST.parent
+    faiss.write_index(faiss.downcast_index(idx.index), str(folder / files["index"]))
+    np.save(folder / files["ids"], faiss.vector_to_array(idx.id_map).astype("int64"))
+
+    tmp = MANIFEST.with_suffix(".tmp")
+    tmp.write_text(json.dumps({**meta, "generation": number, "last_id": last_id, **files}))
+    os.replace(tmp, MANIFEST)                  # the atomic "publish"
+    _gc(folder, stem, number)
+    return number
+
+
+def _gc(folder: Path, stem: str, current: int) -> None:
+    for path in folder.glob(f"{stem}.g*.*"):
+        try:
+            number = int(path.name[len(stem) + 2:].split(".")[0])
+        except ValueError:
+            continue
+        if number <= current - KEEP_GENERATIONS:
+            try:
+                path.unlink()       # POSIX readers keep their mapping alive
+            except OSError as exc:  # Windows: still mapped by a worker
+                logging.debug("Keeping %s: %s", path, exc)
@@ -1,59 +1,91 @@
 from __future__ import annotations
 
-import os
-import platform
+import re
 import shlex
+import socket
 import subprocess
-import time
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from lxml import etree  # type: ignore
 
+from .smi_stream import NVSMI
+
 # -----------------------------
 # Helpers
 # -----------------------------
 
+_NUM = re.compile(r"\s*([+-]?\d+(?:\.\d+)?)")
+
 def _strip_units(value: Optional[str]) -> Optional[float]:
     """Extract the leading numeric portion of a string like '45 C' or '120 W'.
-    Returns None if parsing fails or value is falsy.
+    Returns None if parsing fails or value is falsy ('N/A', '[Not Supported]').
+    """
+    m = _NUM.match(value) if value else None
+    return float(m.group(1)) if m else None
+
+def _int(value: Optional[str]) -> Optional[int]:
+    num = _strip_units(value)
+    return None if num is None else int(num)
+
+def _x(path: str) -> etree.XPath:
+    return etree.XPath(f"string({path})")
+
+# Compiled once; each maps a gpu_log column to candidate paths under <gpu>
+# (first non-empty wins – element names moved between driver versions).
+_GPU_FIELDS: List[Tuple[str, Tuple[etree.XPath, ...]]] = [
+    ("util_gpu",     (_x("utilization/gpu_util"),)),
+    ("util_mem",     (_x("utilization/memory_util"),)),
+    ("mem_used_mb",  (_x("fb_memory_usage/used"),)),
+    ("mem_total_mb", (_x("fb_memory_usage/total"),)),
+    ("temperature",  (_x("temperature/gpu_temp"),)),
+    ("power_w",      (_x("power_readings/power_draw"), _x("gpu_power_readings/power_draw"))),
+    ("ecc_errors",   (_x("ecc_errors/volatile/dram_uncorrectable"),
+                      _x("ecc_errors/volatile/double_bit/total"))),
+]
+_MINOR = _x("minor_number")
+_PROCS = etree.XPath("processes/process_info")
+_PID, _PNAME, _PMEM = _x("pid"), _x("process_name"), _x("used_memory")
+
+_PARSER = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False,
+                          remove_comments=True)
+
+_OWNERS: Dict[Tuple[int, float], Tuple[Optional[str], Optional[str]]] = {}
+
+def _owner(pid: int) -> Tuple[Optional[str], Optional[str]]:
+    """(user, GPU_DOC_RUN_TAG) of a local process, best effort and cached.
+
+    Keyed on (pid, start time) so a reused pid is looked up afresh.
     """
-    if not value:
-        return None
-    s = value.strip()
-    # Keep leading sign and digits/decimal point
-    num = []
-    dot_seen = False
-    sign_seen = False
-    for ch in s:
-        if ch in "+-" and not sign_seen and not num:
-            num.append(ch); sign_seen = True
-        elif ch.isdigit():
-            num.append(ch)
-        elif ch == "." and not dot_seen:
-            num.append(ch); dot_seen = True
-        else:
-            break
     try:
-        return float("".join(num)) if num else None
-    except ValueError:
-        return None
-
-def _txt(node: etree._Element, path: str) -> Optional[str]:
-    found = node.find(path)
-    return found.text.strip() if found is not None and found.text else None
+        import psutil
+        proc = psutil.Process(pid)
+        key = (pid, proc.create_time())
+    except Exception:
+        return None, None           # gone, other container, or no psutil
+    if key not in _OWNERS:
+        user = tag = None
+        try:
+            user = proc.username()
+            tag = proc.environ().get("GPU_DOC_RUN_TAG")    # set by `gpu_doc run`
+        except Exception:
+            pass                    # exited meanwhile, or no permission
+        if len(_OWNERS) > 4096:
+            _OWNERS.clear()
+        _OWNERS[key] = (user, tag)
+    return _OWNERS[key]
 
 # -----------------------------
 # Public API
 # -----------------------------
 
-def call_nvidia_smi_xml(cmd: str = "nvidia-smi -q -x", timeout: int = 10) -> Optional[str]:
-    """Run `nvidia-smi` and return the XML output as text, or None on failure."""
+def call_nvidia_smi_xml(cmd: str = f"{NVSMI} -q -x", timeout: int = 10) -> Optional[bytes]:
+    """Run `nvidia-smi -q -x` and return the XML output, or None on failure."""
     try:
         proc = subprocess.run(
             shlex.split(cmd),
             check=False,
             capture_output=True,
-            text=True,
             timeout=timeout,
         )
     except FileNotFoundError:
@@ -66,74 +98,48 @@ def call_nvidia_smi_xml(cmd: str = "nvidia-smi -q -x", timeout: int = 10) -> Opt
     out = proc.stdout.strip()
     return out if out else None
 
-def parse_nvidia_smi_xml(xml_text: str) -> List[Dict[str, Any]]:
-    """Parse `nvidia-smi -q -x` XML into a list of per-GPU dicts.
+def parse_nvidia_smi_xml(xml: Union[str, bytes], host: Optional[str] = None,
+                         ts: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Parse a full `nvidia-smi -q -x` document into gpu_log rows.
 
-    Each dict contains normalized, unit-less fields where possible.
-    Missing values are represented as None.
+    One row per process in <processes> (pid, name, its VRAM in proc_mem_mb),
+    or a single GPU-level row when nothing is running.  Units are stripped;
+    missing / 'N/A' values become None.
     """
-    ts_ms = int(time.time() * 1000)
-    host = platform.node()
-
-    root = etree.fromstring(xml_text.encode("utf-8"))
-    # These are usually at the root
-    driver_version = _txt(root, "driver_version") or _txt(root, "cuda_driver_version")  # compat
-    cuda_version = _txt(root, "cuda_version")  # may be missing on some systems
-
-    result: List[Dict[str, Any]] = []
-    for idx, gpu in enumerate(root.findall("gpu")):
-        # Commonly present fields
-        name = _txt(gpu, "product_name") or _txt(gpu, "product_brand")
-        uuid = _txt(gpu, "uuid") or _txt(gpu, "gpu_uuid")  # field name varies by version
-        pstate = _txt(gpu, "pstate")
-
-        # Utilization block
-        util_gpu = _strip_units(_txt(gpu, "utilization/gpu_util"))
-        util_mem = _strip_units(_txt(gpu, "utilization/memory_util"))
-
-        # Memory block (framebuffer)
-        mem_total = _strip_units(_txt(gpu, "fb_memory_usage/total"))
-        mem_used = _strip_units(_txt(gpu, "fb_memory_usage/used"))
-        mem_free = _strip_units(_txt(gpu, "fb_memory_usage/free"))
-
-        # Temperature & fan
-        temp = _strip_units(_txt(gpu, "temperature/gpu_temp"))
-        fan = _strip_units(_txt(gpu, "fan_speed"))
-
-        # Power
-        power_draw = _strip_units(_txt(gpu, "power_readings/power_draw"))
-
-        # Clocks
-        graphics_clock = _strip_units(_txt(gpu, "clocks/graphics_clock"))
-        sm_clock = _strip_units(_txt(gpu, "clocks/sm_clock"))
-        mem_clock = _strip_units(_txt(gpu, "clocks/memory_clock"))
-
-        sample = {
-            "ts_ms": ts_ms,
-            "host": host,
-            "driver_version": driver_version,
-            "cuda_version": cuda_version,
-            "gpu_index": idx,
-            "uuid": uuid,
-            "name": name,
-            "temperature_c": temp,
-            "fan_speed_pct": fan,
-            "utilization_gpu_pct": util_gpu,
-            "utilization_mem_pct": util_mem,
-            "mem_total_mib": mem_total,
-            "mem_used_mib": mem_used,
-            "mem_free_mib": mem_free,
-            "power_draw_w": power_draw,
-            "graphics_clock_mhz": graphics_clock,
-            "sm_clock_mhz": sm_clock,
-            "mem_clock_mhz": mem_clock,
-            "pstate": pstate,
-        }
-        result.append(sample)
-
-    return result
-
-def collect_once(cmd: str = "nvidia-smi -q -x") -> List[Dict[str, Any]]:
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    root = etree.fromstring(xml, _PARSER)
+    host = host or socket.gethostname()
+    ts = ts or datetime.now(timezone.utc).isoformat()
+
+    rows: List[Dict[str, Any]] = []
+    for idx, gpu in enumerate(root.iterchildren("gpu")):
+        minor = _int(_MINOR(gpu))
+        base: Dict[str, Any] = {"ts": ts, "hostname": host,
+                                "gpu_id": idx if minor is None else minor}
+        for col, paths in _GPU_FIELDS:
+            val = None
+            for path in paths:
+                val = _int(path(gpu))
+                if val is not None:
+                    break
+            base[col] = val
+        if base["ecc_errors"] is None:
+            base["ecc_errors"] = 0
+
+        procs = _PROCS(gpu)
+        if not procs:
+            rows.append({**base, "pid": None, "process_name": None, "user": None,
+                         "run_tag": None, "proc_mem_mb": None})
+            continue
+        for p in procs:
+            pid = _int(_PID(p))
+            user, tag = _owner(pid) if pid is not None else (None, None)
+            rows.append({**base, "pid": pid, "process_name": _PNAME(p).strip() or None,
+                         "user": user, "run_tag": tag, "proc_mem_mb": _int(_PMEM(p))})
+    return rows
+
+def collect_once(cmd: str = f"{NVSMI} -q -x") -> List[Dict[str, Any]]:
     """Convenience: call `nvidia-smi` and parse into samples.
     Returns an empty list if `nvidia-smi` is unavailable.
     """
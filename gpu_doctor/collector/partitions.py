@@ -0,0 +1,235 @@
+# collector/partitions.py
+"""
+Day partitions of gpu_log.
+
+Raw rows live in one table per UTC day (gpu_log_YYYYMMDD) inside the same
+SQLite file; `gpu_log` is a UNION ALL view over all of them, rebuilt
+whenever a partition is created or dropped, so existing readers keep
+working.  Retention drops whole partitions instead of running a DELETE
+over millions of rows.
+
+Ids stay globally unique and ordered by day: each partition's AUTOINCREMENT
+sequence is seeded at day << DAY_BITS, so a row id also tells which
+partition holds it (see day_of_id).  A pre-partitioning `gpu_log` table is
+renamed to gpu_log_legacy, kept in the view and pruned by DELETE until it
+is empty.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DAY_BITS = 32
+LEGACY = "gpu_log_legacy"
+_PREFIX = "gpu_log_"
+_EPOCH = date(1970, 1, 1)
+_OFFSET = re.compile(r"[+-]\d\d:?\d\d$")
+
+# Canonical gpu_log columns, in view order (embedding: pgvector option)
+COLUMNS = [
+    ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    ("ts", "DATETIME NOT NULL"),
+    ("hostname", "TEXT NOT NULL"),
+    ("gpu_id", "INTEGER NOT NULL"),
+    ("pid", "INTEGER"),
+    ("process_name", "TEXT"),
+    ("user", "TEXT"),
+    ("util_gpu", "INTEGER"),
+    ("util_mem", "INTEGER"),
+    ("mem_used_mb", "INTEGER"),
+    ("mem_total_mb", "INTEGER"),
+    ("ecc_errors", "INTEGER"),
+    ("temperature", "INTEGER"),
+    ("power_w", "INTEGER"),
+    ("run_tag", "TEXT"),
+    ("proc_mem_mb", "INTEGER"),
+    ("embedding", "VECTOR"),
+]
+# Columns every partition, the legacy table included, is guaranteed to have
+FIELDS = ", ".join(c for c, _ in COLUMNS if c != "embedding")
+
+# Per-partition indexes: idx_<table>_<suffix>.  ts/host/run_tag back the
+# filtered searches in retriever; (run_tag, ts) serves "latest rows of a run".
+INDEXES = {"ts_gpu": "ts, gpu_id", "host_ts": "hostname, ts", "run_tag_ts": "run_tag, ts"}
+
+
+# ---------- days and ids ---------------------------------------------------
+def epoch(ts: str) -> float:
+    """Seconds since the epoch of an ISO-8601 timestamp (naive = UTC)."""
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def utc_ts(ts: str) -> str:
+    """<ts> in a form that compares as a string with the others: UTC ("Z",
+    "+00:00" or naive) ISO-8601 with a "T" is kept as is, anything else
+    (other offsets, a space separator) is rewritten as UTC isoformat."""
+    if len(ts) >= 19 and ts[10] == "T" and (ts.endswith(("Z", "+00:00")) or not _OFFSET.search(ts, 19)):
+        return ts
+    return datetime.fromtimestamp(epoch(ts), timezone.utc).isoformat()
+
+
+def day_of(ts: str) -> int:
+    """UTC day number (days since 1970-01-01) of a timestamp."""
+    return int(epoch(ts) // 86400)
+
+
+def today() -> int:
+    return (datetime.now(timezone.utc).date() - _EPOCH).days
+
+
+def day_of_id(row_id: int) -> int:
+    """Day whose partition holds <row_id> (0 = legacy table)."""
+    return row_id >> DAY_BITS
+
+
+def id_range(day: int) -> Tuple[int, int]:
+    """[lo, hi) of the ids handed out by <day>'s partition."""
+    return day << DAY_BITS, (day + 1) << DAY_BITS
+
+
+def day_start(day: int) -> str:
+    """ISO date of <day> – sorts before every timestamp of that day."""
+    return (_EPOCH + timedelta(days=day)).isoformat()
+
+
+def table(day: int) -> str:
+    return LEGACY if day == 0 else _PREFIX + (_EPOCH + timedelta(days=day)).strftime("%Y%m%d")
+
+
+# ---------- catalog ---------------------------------------------------------
+def list_partitions(conn: sqlite3.Connection) -> List[Tuple[int, str]]:
+    """(day, table) of every partition, oldest first; the legacy table is day 0."""
+    out = []
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'gpu_log_*'"
+    ):
+        if name == LEGACY:
+            out.append((0, name))
+        elif name[len(_PREFIX):].isdigit():
+            d = datetime.strptime(name[len(_PREFIX):], "%Y%m%d").date()
+            out.append(((d - _EPOCH).days, name))
+    return sorted(out)
+
+
+def covering(conn: sqlite3.Connection, since: Optional[str] = None,
+             until: Optional[str] = None) -> List[str]:
+    """Tables that can hold rows with since <= ts < until (legacy always included)."""
+    lo = day_of(since) if since else None
+    hi = day_of(until) if until else None
+    return [
+        name for day, name in list_partitions(conn)
+        if day == 0 or ((lo is None or day >= lo) and (hi is None or day <= hi))
+    ]
+
+
+def rebuild_view(conn: sqlite3.Connection) -> None:
+    """(Re)create the gpu_log view over the current partitions."""
+    parts = []
+    for _, name in list_partitions(conn):
+        have = {r[1] for r in conn.execute(f"PRAGMA table_info({name})")}
+        cols = ", ".join(c if c in have else f"NULL AS {c}" for c, _ in COLUMNS)
+        parts.append(f"SELECT {cols} FROM {name}")
+    conn.execute("DROP VIEW IF EXISTS gpu_log")
+    if parts:
+        conn.execute("CREATE VIEW gpu_log AS " + " UNION ALL ".join(parts))
+
+
+def ensure(conn: sqlite3.Connection, day: int) -> str:
+    """Create <day>'s partition (and refresh the view) unless it exists."""
+    name = table(day)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone():
+        return name
+    cols = ",\n  ".join(f"{c} {decl}" for c, decl in COLUMNS)
+    conn.execute("SAVEPOINT partition")           # table + id seed + view, or nothing
+    try:
+        # IF NOT EXISTS: another connection may have created it since the check
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (\n  {cols}\n)")
+        _create_indexes(conn, name)
+        # next AUTOINCREMENT id = seq + 1 → first row of the day gets lo + 1
+        if conn.execute("SELECT 1 FROM sqlite_sequence WHERE name=?", (name,)).fetchone() is None:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, id_range(day)[0]))
+        rebuild_view(conn)
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO partition")
+        raise
+    finally:
+        conn.execute("RELEASE partition")
+    return name
+
+
+def _create_indexes(conn: sqlite3.Connection, name: str) -> None:
+    for suffix, cols in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_{suffix} ON {name}({cols})")
+
+
+def ensure_indexes(conn: sqlite3.Connection) -> None:
+    """Bring the indexes of partitions made by older versions up to INDEXES."""
+    have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    for _, name in list_partitions(conn):
+        if any(f"idx_{name}_{s}" not in have for s in INDEXES):
+            _create_indexes(conn, name)
+
+
+def migrate_legacy(conn: sqlite3.Connection) -> bool:
+    """Rename a pre-partitioning gpu_log table to gpu_log_legacy; True if renamed."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name='gpu_log'").fetchone()
+    if row is None or row[0] != "table":
+        return False
+    conn.execute(f"ALTER TABLE gpu_log RENAME TO {LEGACY}")
+    for old in ("idx_ts_gpu", "idx_run_tag"):    # first-release names → idx_<table>_*
+        conn.execute(f"DROP INDEX IF EXISTS {old}")
+    _create_indexes(conn, LEGACY)
+    rebuild_view(conn)
+    return True
+
+
+# ---------- retention + reads ---------------------------------------------
+def drop_before(conn: sqlite3.Connection, day: int) -> List[str]:
+    """Drop every partition older than <day>; trim the legacy table by ts."""
+    # FAST: freed pages go to the freelist without being zeroed first (some
+    # distro builds default secure_delete=ON, which rewrites the whole day)
+    conn.execute("PRAGMA secure_delete=FAST")
+    dropped = []
+    for d, name in list_partitions(conn):
+        if d == 0:
+            cutoff = day_start(day)
+            conn.execute(f"DELETE FROM {LEGACY} WHERE ts < ?", (cutoff,))
+            if conn.execute(f"SELECT 1 FROM {LEGACY} LIMIT 1").fetchone() is None:
+                conn.execute(f"DROP TABLE {LEGACY}")
+                dropped.append(name)
+        elif d < day:
+            conn.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+    if dropped:
+        rebuild_view(conn)
+    return dropped
+
+
+def scan(conn: sqlite3.Connection, cols: str, where: str, params: Sequence,
+         since: Optional[str] = None, until: Optional[str] = None) -> Iterator[sqlite3.Row]:
+    """SELECT <cols> ... WHERE <where> over only the partitions covering [since, until]."""
+    tables = covering(conn, since, until)
+    if not tables:
+        return iter(())
+    sql = " UNION ALL ".join(f"SELECT {cols} FROM {t} WHERE {where}" for t in tables)
+    return conn.execute(sql, list(params) * len(tables))
+
+
+def rows_by_id(conn: sqlite3.Connection, ids: Iterable[int]) -> List[sqlite3.Row]:
+    """Fetch rows by id, probing only the partitions the ids belong to."""
+    by_day: dict = {}
+    for i in ids:
+        by_day.setdefault(day_of_id(i), []).append(i)
+    live = {d: name for d, name in list_partitions(conn)}
+    out: List[sqlite3.Row] = []
+    for d, chunk in by_day.items():
+        if d in live:
+            out += conn.execute(
+                f"SELECT * FROM {live[d]} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+    return out
@@ -1,16 +1,18 @@
 # collector/poller.py
 from __future__ import annotations
 
+import logging
 import os
-import socket
+import re
+import shlex
+import signal
 import subprocess
 import time
-from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterator
 
-from lxml import etree  # pip install lxml
-
-from . import db
-import re, subprocess, logging
+from .. import instrument
+from . import db, deadband, detect, parsers, ring, scheduler, shipper, smi_stream
 
 # *** How to override at runtime:
 # *** Faster polling, keep 14 days, prune every hour (120 loops at 30 s)
@@ -19,31 +21,40 @@ import re, subprocess, logging
 # export GPU_DOC_PRUNE_EVERY=360   # 10 s × 360 ≈ 1 h
 # python -m collector.poller
 
-POLL_INTERVAL = int(os.getenv("GPU_DOC_POLL_SEC", 30))
+POLL_INTERVAL = float(os.getenv("GPU_DOC_POLL_SEC", 30))
 PRUNE_EVERY_N = int(os.getenv("GPU_DOC_PRUNE_EVERY", 100))
 RETENTION_DAYS = int(os.getenv("GPU_DOC_KEEP_DAYS", 7))
+STREAM = os.getenv("GPU_DOC_STREAM", "0") == "1"
+STATS_EVERY = int(os.getenv("GPU_DOC_STATS_EVERY", 20))     # cycles between timing summaries (0 = off)
 logging.basicConfig(
     level=os.getenv("GPU_DOC_LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s  %(levelname)s %(message)s",
 )
 
-POLL_INTERVAL = 30  # seconds
+
+def _nvsmi() -> list[str]:
+    """nvidia-smi argv prefix (GPU_DOC_NVSMI can point at a wrapper or fake)."""
+    return shlex.split(smi_stream.NVSMI)
 
 
-def _supported_fields() -> set[str]:
+@lru_cache(maxsize=1)
+def _supported_fields() -> frozenset[str]:
     """
     Parse `nvidia-smi --help-query-gpu` once and cache the set of valid fields.
-    Works on old (Colab) and new driver versions.
+    Works on old (Colab) and new driver versions; empty if nvidia-smi is missing.
     """
-    out = subprocess.check_output(["nvidia-smi", "--help-query-gpu"], text=True, stderr=subprocess.DEVNULL)
+    try:
+        out = subprocess.check_output([*_nvsmi(), "--help-query-gpu"], text=True, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError) as exc:
+        logging.warning("nvidia-smi field discovery failed: %s", exc)
+        return frozenset()
     # lines look like "    memory.used               : GPU memory in MiB"
-    return {re.split(r"\s+", ln.strip())[0] for ln in out.splitlines() if ln.startswith("    ")}
-
-SUPPORTED = _supported_fields()
+    return frozenset(re.split(r"\s+", ln.strip())[0] for ln in out.splitlines() if ln.startswith("    "))
 
 # Preferred → Legacy  (add more pairs if you hit new errors)
 FIELD_MAP = {
     "fb_memory_usage/used": "memory.used",
+    "fb_memory_usage/total": "memory.total",
     "utilization/gpu_util": "utilization.gpu",
     "utilization/memory_util": "utilization.memory",
     "temperature/gpu_temp": "temperature.gpu",
@@ -52,112 +63,146 @@ FIELD_MAP = {
 
 def _choose(f: str) -> str | None:
     """Return first field that exists in driver; else None."""
-    return f if f in SUPPORTED else FIELD_MAP.get(f) if FIELD_MAP.get(f) in SUPPORTED else None
+    supported = _supported_fields()
+    return f if f in supported else FIELD_MAP.get(f) if FIELD_MAP.get(f) in supported else None
 
 # ----------------------------------------------------------------------
-# Replace the old constant list with:
-NVSMI_FIELDS = list(filter(None, map(_choose, [
-    "minor_number",
-    "fb_memory_usage/used",
-    "utilization/gpu_util",
-    "utilization/memory_util",
-    "temperature/gpu_temp",
-    "power_readings/power_draw",
-])))
-NSMI_QUERY = ",".join(NVSMI_FIELDS or ["index"])   # always at least one field
-logging.info("nvidia-smi query fields: %s", NSMI_QUERY)
-
-
+# Field discovery shells out to nvidia-smi, so it runs on first poll, not at import.
+@lru_cache(maxsize=1)
+def _nsmi_query() -> str:
+    fields = list(filter(None, map(_choose, [
+        "minor_number",
+        "fb_memory_usage/used",
+        "fb_memory_usage/total",
+        "utilization/gpu_util",
+        "utilization/memory_util",
+        "temperature/gpu_temp",
+        "power_readings/power_draw",
+    ])))
+    query = ",".join(fields or ["index"])   # always at least one field
+    logging.info("nvidia-smi query fields: %s", query)
+    return query
+
+
+@instrument.timed("nvidia_smi")
 def _run_nvidia_smi() -> tuple[bytes, str]:
     """Return (raw_output, fmt) where fmt is 'xml' or 'csv'."""
     try:
         return (
-            subprocess.check_output(
-                ["nvidia-smi", f"--query-gpu={NSMI_QUERY}", "--format=xml"],
-                stderr=subprocess.PIPE,
-            ),
+            subprocess.check_output([*_nvsmi(), "-q", "-x"], stderr=subprocess.PIPE),
             "xml",
         )
     except subprocess.CalledProcessError:
         # fallback: CSV without units / header
         out = subprocess.check_output(
-            ["nvidia-smi", f"--query-gpu={NSMI_QUERY}", "--format=csv,noheader,nounits"],
+            [*_nvsmi(), f"--query-gpu={_nsmi_query()}", "--format=csv,noheader,nounits"],
             stderr=subprocess.DEVNULL,
         )
         return out, "csv"
 
 
-def _safe_int(text: str | None, default: int = 0) -> int:
-    try:
-        return int(text.split()[0]) if text else default
-    except (ValueError, AttributeError):
-        return default
-
-
+@instrument.timed("parse_xml", rows="result")
 def _parse_xml(xml_bytes: bytes) -> list[dict]:
-    root = etree.fromstring(xml_bytes)
-    rows, host, ts = [], socket.gethostname(), datetime.now(timezone.utc).isoformat()
-
-    for idx, gpu in enumerate(root.findall(".//gpu")):
-        # older XML may lack minor_number → fall back to loop index
-        gpu_id = _safe_int(gpu.findtext("minor_number"), idx)
-
-        base = {
-            "ts": ts,
-            "hostname": host,
-            "gpu_id": gpu_id,
-            "util_gpu": _safe_int(gpu.findtext("utilization/gpu_util")),
-            "util_mem": _safe_int(gpu.findtext("utilization/memory_util")),
-            "mem_used_mb": _safe_int(gpu.findtext("fb_memory_usage/used")),
-            "temperature": _safe_int(gpu.findtext("temperature/gpu_temp")),
-            "power_w": _safe_int(gpu.findtext("power_readings/power_draw")),
-            "ecc_errors": 0,
-            "pid": None,
-            "process_name": None,
-            "user": None,
-            "run_tag": None,
-        }
-        rows.append(base)  # default snapshot when no process list
-    return rows
+    # full -q -x document, one row per GPU process (see parsers.py)
+    return parsers.parse_nvidia_smi_xml(xml_bytes)
 
+@instrument.timed("parse_csv", rows="result")
 def _parse_csv(text: str) -> list[dict]:
-  rows, host, ts = [], socket.gethostname(), datetime.now(timezone.utc).isoformat()
-  for idx, line in enumerate(text.strip().splitlines()):
-      cols = [int(x) if x.isdigit() else None for x in line.split(", ")]
-      # map cols → util_gpu, util_mem, mem_used_mb, temperature, power_w
-      util_gpu, util_mem, mem_used, temp, power = (cols + [None]*5)[:5]
-      rows.append({
-          "ts": ts, "hostname": host, "gpu_id": idx,
-          "util_gpu": util_gpu, "util_mem": util_mem,
-          "mem_used_mb": mem_used, "temperature": temp,
-          "power_w": power, "ecc_errors": 0,
-          "pid": None, "process_name": None, "user": None, "run_tag": None,
-      })
-  return rows
-
-
-def main(loop: bool = True) -> None:
-    counter = 0
+    # columns follow the discovered --query-gpu field order
+    return smi_stream.csv_rows(text.strip().splitlines(), _nsmi_query().split(","))
+
+
+def _snapshots(loop: bool, stream: bool, clock: scheduler.Scheduler) -> Iterator[list[dict]]:
+    """One list of gpu_log rows per poll cycle, on <clock>'s ticks."""
+    if stream and loop:
+        # one long-lived nvidia-smi child instead of a fork per poll (its own fixed -lms cadence)
+        wanted = [f for f in smi_stream.CSV_COLUMNS if f in _supported_fields()]
+        yield from smi_stream.SmiStream(wanted or list(smi_stream.CSV_COLUMNS),
+                                        interval_ms=int(POLL_INTERVAL * 1000))
+        return
     while True:
         try:
             raw, fmt = _run_nvidia_smi()
             if fmt == "xml":
-                records = _parse_xml(raw)
+                yield _parse_xml(raw)
             else:                       # CSV path
-                records = _parse_csv(raw.decode())
-            db.insert_log(records)
+                yield _parse_csv(raw.decode())
         except Exception as exc:
             logging.error("Collector error: %s", exc)
+        if not loop:
+            return
+        clock.wait()
+
+
+def _toggle_profile(*_: object) -> None:
+    """SIGUSR1: start cProfile on the poll loop, or stop it and log the report."""
+    if instrument.profiling():
+        logging.info("Profile:\n%s", instrument.profile_stop())
+    else:
+        instrument.profile_start("cprofile")
+        logging.info("Profiling the poll loop until the next SIGUSR1")
+
+
+def main(loop: bool = True, stream: bool = STREAM, change_only: bool = deadband.DEADBAND,
+         ship: str = shipper.SHIP_URL, local: bool = shipper.SHIP_LOCAL,
+         metrics_port: int = ring.METRICS_PORT, adaptive: bool = scheduler.ADAPTIVE,
+         detect_events: bool = detect.DETECT) -> None:
+    counter = 0
+    clock = scheduler.Scheduler(POLL_INTERVAL, adaptive=adaptive and not stream)
+    detector = detect.Detector() if detect_events else None
+    band = deadband.Deadband() if change_only else None
+    latest = ring.Ring() if metrics_port else None
+    if latest is not None:
+        ring.serve(latest, metrics_port)
+    out = shipper.Shipper(ship) if ship else None
+    local = local or out is None
+    if hasattr(signal, "SIGUSR1"):          # not on Windows
+        signal.signal(signal.SIGUSR1, _toggle_profile)
+    for records in _snapshots(loop, stream, clock):
+        t0 = time.perf_counter()
+        try:
+            if latest is not None:
+                latest.push(records)             # every sample, before the deadband thins it
+            events = detector.update(records) if detector is not None else []
+            for e in events:
+                logging.warning("Event %s (%s): %s", e["event"], e["severity"], e["detail"])
+                if e["severity"] == "crit":          # keep the full-rate samples around it
+                    clock.trigger(e["detail"], (e["hostname"], e["gpu_id"]))
+            records, burst, started = clock.observe(records)   # base tick / burst / held as pre-trigger
+            if started:
+                logging.warning("Burst capture: %s", started)
+            if band is not None:
+                records = band.filter(records)   # unchanged GPUs → nothing to write
+            records += burst
+            if out is not None:
+                out.put(records)                 # buffered; never blocks the poll loop
+            if local:
+                db.insert_log(records)
+                db.insert_events(events)         # remote nodes: the central /ingest detects its own
+        except Exception as exc:
+            logging.error("Collector error: %s", exc)
+        instrument.observe("cycle", time.perf_counter() - t0, len(records))
 
         # prune periodically
         counter += 1
+        if STATS_EVERY and counter % STATS_EVERY == 0:
+            logging.info("Timings after %d cycles (ms):\n%s", counter, instrument.summary())
         if counter % PRUNE_EVERY_N == 0:
-            db.prune_older_than(RETENTION_DAYS)
-            logging.info("DB pruned to keep last %d days", RETENTION_DAYS)
-
-        if not loop:
-            break
-        time.sleep(POLL_INTERVAL)
+            if local:
+                db.prune_older_than(RETENTION_DAYS)
+                logging.info("DB pruned to keep last %d days", RETENTION_DAYS)
+            if band is not None:
+                logging.info("Deadband wrote %d of %d rows", band.rows_written, band.rows_seen)
+            if out is not None:
+                logging.info("Shipper: %s", out.stats())
+            if clock.adaptive:
+                logging.info("Scheduler: %s", clock.stats())
+            if detector is not None:
+                logging.info("Detector: %d events so far", detector.events)
+    if local:
+        db.flush()
+    if out is not None:
+        out.close()
 
 
 if __name__ == "__main__":
@@ -166,5 +211,20 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="GPU Doctor telemetry poller")
     parser.add_argument("--once", action="store_true", help="take one snapshot and exit")
+    parser.add_argument("--stream", action="store_true", default=STREAM,
+                        help="keep one nvidia-smi -lms child running instead of forking per poll")
+    parser.add_argument("--deadband", action="store_true", default=deadband.DEADBAND,
+                        help="write a GPU's rows only when a metric moves or a heartbeat is due")
+    parser.add_argument("--ship", default=shipper.SHIP_URL, metavar="URL",
+                        help="also POST rows to a central GPU Doctor API (URL/ingest)")
+    parser.add_argument("--no-local", dest="local", action="store_false", default=shipper.SHIP_LOCAL,
+                        help="with --ship: do not write the local DB")
+    parser.add_argument("--metrics-port", type=int, default=ring.METRICS_PORT,
+                        help="serve /metrics (OpenMetrics) and /latest from memory on this port")
+    parser.add_argument("--adaptive", action="store_true", default=scheduler.ADAPTIVE,
+                        help="poll fast near capacity, back off when idle, burst-capture spikes")
+    parser.add_argument("--no-detect", dest="detect", action="store_false", default=detect.DETECT,
+                        help="do not run the streaming anomaly detectors (gpu_event table)")
     args = parser.parse_args()
-    main(loop=not args.once)
+    main(loop=not args.once, stream=args.stream, change_only=args.deadband, ship=args.ship, local=args.local,
+         metrics_port=args.metrics_port, adaptive=args.adaptive, detect_events=args.detect)
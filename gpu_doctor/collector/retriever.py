@@ -2,62 +2,341 @@
 """
 Thin retrieval layer for GPU Doctor.
 
-• search(text, k)        → top-k log sentences by vector similarity
+• search(text, k, **f)   → top-k log sentences by vector similarity,
+                           optionally within host / gpu_id / time / run_tag
+• search_scored(text, k) → same hits as (row id, similarity, sentence)
 • search_by_tag(tag, k)  → last k rows whose run_tag matches <tag>
+• similar_rows(sig, k)   → rows numerically closest to a signature ("oom",
+                           {feature: value} or a row id) – no MiniLM
+• top_spikes(metric, k)  → largest jumps of a metric (features module)
+• events(k, **f)         → newest detector events (gpu_event, see detect.py)
+• history(...)           → 1m / 1h rollup buckets for long windows
+• series(host, gpu, ...)  → regular grid rebuilt from deadband rows
+• context_for(hits, ...) → prompt text: per-GPU summaries + exemplar rows
 
-Automatically chooses FAISS if gpu_logs.faiss exists, otherwise pgvector.
+Automatically chooses FAISS if an index generation has been published
+(see index_store), otherwise pgvector.  New generations are picked up
+without a restart.
+Rows are read through one thread-local connection and resolved with a single
+bulk lookup; hot rows are served from a small id→text LRU.  Query
+embeddings are memoised too (GPU_DOC_QUERY_CACHE), so repeated dashboard /
+on-call questions skip MiniLM entirely.
 """
 
 from __future__ import annotations
-import json, os, sqlite3, pickle, numpy as np
-from pathlib import Path
-from typing import List
+import json, logging, os, sqlite3, threading, time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
+from .. import instrument
+from . import context, deadband, features, index_store, partitions, rollup
 from .embeddings import encode, to_text, _DB
 
+if TYPE_CHECKING:
+    import numpy as np
+
+TEXT_CACHE = int(os.getenv("GPU_DOC_TEXT_CACHE", 4096))   # 0 disables the id→text cache
+QUERY_CACHE = int(os.getenv("GPU_DOC_QUERY_CACHE", 1024)) # query→embedding LRU entries
+
 # ---------- backend autodetect ----------------------------------------
-_REPO_ROOT = Path(__file__).parents[1]
-_FAISS_IDX = _REPO_ROOT / "gpu_logs.faiss"
-_USE_FAISS = _FAISS_IDX.exists()
-
-if _USE_FAISS:
-    import faiss
-    _IDX = faiss.read_index(str(_FAISS_IDX))
-    _IDS = pickle.load(open(_FAISS_IDX.with_suffix(".ids"), "rb"))
-else:
-    import pgvector
-    with sqlite3.connect(_DB) as _conn:
-        pgvector.load(_conn)                # enable extension once
+RELOAD_SEC = float(os.getenv("GPU_DOC_RELOAD_SEC", 2.0))  # manifest poll period
+_FAISS_BACKEND = False                                     # sticks once a manifest appears
 
-# ---------- public API -------------------------------------------------
-def search(query: str, k: int = 5) -> List[str]:
-    """Vector similarity search (FAISS → fast, pgvector → pure SQLite)."""
+
+def _use_faiss() -> bool:
+    """FAISS once a generation is published, otherwise pgvector-sqlite.
+
+    Only the positive answer is cached, so a first build_faiss run after
+    startup is picked up without a restart.
+    """
+    global _FAISS_BACKEND
+    if not _FAISS_BACKEND:
+        _FAISS_BACKEND = index_store.MANIFEST.exists()
+    return _FAISS_BACKEND
+
+
+def warm_up() -> None:
+    """Pay the one-off costs (model, index / extension, DB handle) up front.
+
+    Meant for the API startup event so the first request is not the slow one.
+    """
+    encode("warm-up")
+    if _use_faiss():
+        _generation()
+    else:
+        _vector_conn()
+
+# ---------- hot-reloadable FAISS generation ----------------------------
+_GEN: Optional[index_store.Generation] = None
+_GEN_STAMP: Optional[int] = None
+_GEN_CHECKED = 0.0
+_GEN_LOCK = threading.Lock()
+_RELOADS = 0
+
+
+def _generation() -> Optional[index_store.Generation]:
+    """Current generation; swaps in a newly published one at most every RELOAD_SEC.
+
+    Searches hold their own reference, so a swap never waits for (or breaks)
+    a search that is already running against the previous generation.
+    """
+    global _GEN, _GEN_STAMP, _GEN_CHECKED, _RELOADS
+    now = time.monotonic()
+    if _GEN is not None and now - _GEN_CHECKED < RELOAD_SEC:
+        return _GEN
+    if not _GEN_LOCK.acquire(blocking=_GEN is None):
+        return _GEN                             # another thread is reloading
+    try:
+        _GEN_CHECKED = now
+        stamp = index_store.manifest_stamp()
+        if stamp is not None and stamp != _GEN_STAMP:
+            gen = index_store.open_generation()
+            if gen is not None:
+                _GEN, _GEN_STAMP = gen, stamp
+                _RELOADS += 1
+                logging.info("FAISS generation %d loaded (%d vectors, %.1f ms)",
+                             gen.number, gen.ntotal, gen.load_ms)
+        return _GEN
+    finally:
+        _GEN_LOCK.release()
+
+
+def index_info() -> Dict[str, Any]:
+    """Per-worker view of the loaded index: generation, size, reload cost, memory."""
+    import psutil
+    gen = _generation() if _use_faiss() else None
+    mem = psutil.Process().memory_full_info()
+    return {
+        "backend": "faiss" if _use_faiss() else "pgvector",
+        "generation": gen.number if gen else None,
+        "vectors": gen.ntotal if gen else 0,
+        "reload_ms": round(gen.load_ms, 2) if gen else None,
+        "reloads": _RELOADS,
+        "rss_bytes": mem.rss,
+        "uss_bytes": getattr(mem, "uss", None),  # private pages; mmapped index is shared
+    }
+
+# ---------- read connections + row cache --------------------------------
+_local = threading.local()
+_TEXTS: "OrderedDict[int, str]" = OrderedDict()
+_TEXTS_LOCK = threading.Lock()
+
+
+def _read_conn() -> sqlite3.Connection:
+    """One long-lived read-only connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(_DB, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=ON;")
+        _local.conn = conn
+    return conn
+
+
+def _vector_conn() -> sqlite3.Connection:
+    """Thread-local connection with the pgvector extension loaded (once)."""
+    conn = _read_conn()
+    if not getattr(_local, "pgvector", False):
+        import pgvector
+        pgvector.load(conn)
+        _local.pgvector = True
+    return conn
+
+
+def _texts_by_id(ids: Sequence[int]) -> Dict[int, str]:
+    """Resolve row ids → to_text() with one IN (...) query for cache misses.
+
+    Ids whose rows have been pruned are simply absent from the result.
+    """
+    out: Dict[int, str] = {}
+    with _TEXTS_LOCK:
+        for i in ids:
+            if i in _TEXTS:
+                _TEXTS.move_to_end(i)
+                out[i] = _TEXTS[i]
+    missing = [i for i in ids if i not in out]
+    if not missing:
+        return out
+
+    fresh = {r["id"]: to_text(r) for r in partitions.rows_by_id(_read_conn(), missing)}
+    out.update(fresh)
+    if TEXT_CACHE > 0:
+        with _TEXTS_LOCK:
+            _TEXTS.update(fresh)
+            while len(_TEXTS) > TEXT_CACHE:
+                _TEXTS.popitem(last=False)
+    return out
+
+@lru_cache(maxsize=QUERY_CACHE)
+def _query_vec(query: str) -> "np.ndarray":
     vec = encode(query)
+    vec.setflags(write=False)               # shared between callers
+    return vec
+
 
-    if _USE_FAISS:
-        D, I = _IDX.search(np.expand_dims(vec.astype("float32"), 0), k)
-        with sqlite3.connect(_DB) as c:
-            c.row_factory = sqlite3.Row
-            return [
-                to_text(c.execute("SELECT * FROM gpu_log WHERE id=?", (_IDS[i],)).fetchone())
-                for i in I[0]
-            ]
-
-    # pgvector path
-    with sqlite3.connect(_DB) as c:
-        c.row_factory = sqlite3.Row
-        pgvector.load(c)
-        rows = c.execute(
-            "SELECT *, embedding <-> json(?) AS dist "
-            "FROM gpu_log ORDER BY dist LIMIT ?",
-            (json.dumps(vec.tolist()), k),
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the query-embedding LRU and the id→text cache."""
+    q = _query_vec.cache_info()
+    return {
+        "query_vec": {"hits": q.hits, "misses": q.misses, "size": q.currsize, "maxsize": q.maxsize},
+        "row_text": {"size": len(_TEXTS), "maxsize": TEXT_CACHE},
+    }
+
+# ---------- structured filters ----------------------------------------
+def _utc(ts: Optional[str]) -> Optional[str]:
+    """A since/until bound as naive UTC seconds (ValueError if unparsable).
+
+    Rows keep "Z", "+00:00" or no suffix; the bare prefix compares right
+    against all three, a suffixed bound does not at its own second.
+    """
+    return rollup._bound(ts)
+
+
+def _where(host: Optional[str], gpu_id: Optional[int], since: Optional[str],
+           until: Optional[str], run_tag: Optional[str]) -> Tuple[str, List[Any]]:
+    since, until = _utc(since), _utc(until)
+    clauses, params = [], []
+    for clause, value in (("hostname = ?", host), ("gpu_id = ?", gpu_id), ("ts >= ?", since),
+                          ("ts < ?", until), ("run_tag = ?", run_tag)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+@instrument.timed("retriever.filter", rows="result")
+def candidate_ids(host: Optional[str] = None, gpu_id: Optional[int] = None, since: Optional[str] = None,
+                  until: Optional[str] = None, run_tag: Optional[str] = None) -> Optional["np.ndarray"]:
+    """Ids of the rows matching the filters (None = no filter given).
+
+    Only partitions overlapping [since, until) are read, each through its
+    host / ts / run_tag index.
+    """
+    import numpy as np
+    where, params = _where(host, gpu_id, since, until, run_tag)
+    if not where:
+        return None
+    cur = partitions.scan(_read_conn(), "id", where, params, since=_utc(since), until=_utc(until))
+    return np.fromiter((r[0] for r in cur), dtype="int64")
+
+# ---------- public API -------------------------------------------------
+@instrument.timed("retriever.search", rows="result")
+def search_scored(query: str, k: int = 5, *, host: Optional[str] = None, gpu_id: Optional[int] = None,
+                  since: Optional[str] = None, until: Optional[str] = None,
+                  run_tag: Optional[str] = None) -> List[Tuple[int, float, str]]:
+    """Ranked (row id, similarity, sentence) hits, best first.
+
+    host / gpu_id / since / until / run_tag restrict the search itself (not
+    its top-k afterwards), so a filtered query still gets k matching rows.
+    """
+    vec = _query_vec(" ".join(query.split()))
+
+    if _use_faiss():
+        gen = _generation()
+        if gen is None:
+            return []
+        ids = candidate_ids(host, gpu_id, since, until, run_tag)
+        scores, ids = gen.search(vec, k, ids=ids)
+        hits = [(int(i), float(d)) for i, d in zip(ids, scores)]
+        texts = _texts_by_id([i for i, _ in hits])
+        return [(i, d, texts[i]) for i, d in hits if i in texts]
+
+    # pgvector path – L2 distance between unit vectors → cosine = 1 - d²/2
+    where, params = _where(host, gpu_id, since, until, run_tag)
+    rows = _vector_conn().execute(
+        "SELECT *, embedding <-> json(?) AS dist "
+        f"FROM gpu_log {'WHERE ' + where if where else ''} ORDER BY dist LIMIT ?",
+        (json.dumps(vec.tolist()), *params, k),
+    ).fetchall()
+    return [(r["id"], 1.0 - r["dist"] ** 2 / 2, to_text(r)) for r in rows]
+
+def search(query: str, k: int = 5, **filters: Any) -> List[str]:
+    """Vector similarity search (FAISS → fast, pgvector → pure SQLite).
+
+    filters: host, gpu_id, since, until (ISO-8601 UTC), run_tag.
+    """
+    return [text for _, _, text in search_scored(query, k, **filters)]
+
+def _with_text(hits: List[Tuple[int, float]]) -> List[Tuple[int, float, str]]:
+    texts = _texts_by_id([i for i, _ in hits])
+    return [(i, v, texts[i]) for i, v in hits if i in texts]
+
+@instrument.timed("retriever.similar", rows="result")
+def similar_rows(signature: features.Signature, k: int = 5, **filters: Any) -> List[Tuple[int, float, str]]:
+    """(row id, feature distance, sentence) of the rows closest to <signature>.
+
+    Pure NumPy over the numeric columns, so it works without a text index.
+    """
+    ids = candidate_ids(**filters)
+    return _with_text(features.similar(_read_conn(), signature, k, ids=ids,
+                                       since=filters.get("since"), until=filters.get("until")))
+
+@instrument.timed("retriever.events", rows="result")
+def events(k: int = 20, *, host: Optional[str] = None, gpu_id: Optional[int] = None,
+           since: Optional[str] = None, until: Optional[str] = None, run_tag: Optional[str] = None,
+           severity: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Newest <k> gpu_event rows matching the filters (indexed; no text model, no LLM)."""
+    where, params = _where(host, gpu_id, since, until, run_tag)   # bad bounds raise before the DB check
+    if not _DB.exists():                                   # API may start before the collector
+        return []
+    if severity:
+        where, params = " AND ".join(filter(None, (where, "severity = ?"))), [*params, severity]
+    sql = f"SELECT * FROM gpu_event {'WHERE ' + where if where else ''} ORDER BY ts DESC, id DESC LIMIT ?"
+    try:
+        return [dict(r) for r in _read_conn().execute(sql, (*params, k))]
+    except sqlite3.OperationalError:                       # DB from before gpu_event
+        return []
+
+def top_spikes(metric: str = "mem_frac", k: int = 5, **filters: Any) -> List[Tuple[int, float, str]]:
+    """(row id, jump, sentence) of the <k> largest snapshot-to-snapshot rises of <metric>."""
+    ids = candidate_ids(**filters)
+    return _with_text(features.spikes(_read_conn(), metric, k, ids=ids,
+                                      since=filters.get("since"), until=filters.get("until")))
+
+@instrument.timed("retriever.by_tag", rows="result")
+def search_by_tag_hits(tag: str, k: int = 20) -> List[Tuple[int, str]]:
+    """(row id, sentence) of the latest <k> rows whose run_tag=<tag>."""
+    conn, rows = _read_conn(), []
+    # newest partition first; stop as soon as k rows are found
+    for _, table in reversed(partitions.list_partitions(conn)):
+        rows += conn.execute(
+            f"SELECT * FROM {table} WHERE run_tag=? ORDER BY ts DESC, id DESC LIMIT ?", (tag, k - len(rows))
         ).fetchall()
-        return [to_text(r) for r in rows]
+        if len(rows) >= k:
+            break
+    return [(r["id"], to_text(r)) for r in rows]
 
 def search_by_tag(tag: str, k: int = 20) -> List[str]:
     """Return the latest <k> log sentences that match run_tag=<tag>."""
-    with sqlite3.connect(_DB) as c:
-        rows = c.execute(
-            "SELECT * FROM gpu_log WHERE run_tag=? ORDER BY ts DESC LIMIT ?", (tag, k)
-        ).fetchall()
-    return [to_text(r) for r in rows]
+    return [text for _, text in search_by_tag_hits(tag, k)]
+
+def history(host: str | None = None, gpu_id: int | None = None, run_tag: str | None = None,
+            since: str | None = None, until: str | None = None, tier: str | None = None,
+            limit: int = 10_000) -> List[Dict[str, Any]]:
+    """Rollup buckets (1m / 1h, picked from the window) – never scans raw rows."""
+    rows = rollup.query(_read_conn(), host=host, gpu_id=gpu_id, run_tag=run_tag,
+                        since=since, until=until, tier=tier, limit=limit)
+    return [dict(r) for r in rows]
+
+def series(host: str, gpu_id: int, since: str, until: str, step_sec: float = 30.0) -> List[Dict[str, Any]]:
+    """One GPU's rows on a regular <step_sec> grid, deadband gaps filled in."""
+    # the snapshot in force at <since> may have been written up to 2 heartbeats earlier
+    lookback = datetime.fromtimestamp(
+        partitions.epoch(since) - 2 * deadband.HEARTBEAT_SEC, timezone.utc
+    ).isoformat()
+    rows = sorted(
+        partitions.scan(_read_conn(), partitions.FIELDS,
+                        "hostname = ? AND gpu_id = ? AND ts >= ? AND ts <= ?",
+                        (host, gpu_id, lookback, until), since=lookback, until=until),
+        key=lambda r: r["ts"],
+    )
+    return deadband.reconstruct(rows, step_sec, since, until)
+
+@instrument.timed("retriever.context")
+def context_for(hits: Sequence[Tuple[int, str]], run_tag: Optional[str] = None,
+                **filters: Any) -> context.Context:
+    """Prompt context for <hits>: summaries of their GPUs' series, or the run / window."""
+    conn = _read_conn() if _DB.exists() else None        # API may start before the collector
+    return context.build(conn, hits, run_tag=run_tag, **filters)
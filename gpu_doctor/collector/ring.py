@@ -0,0 +1,220 @@
+# collector/ring.py
+"""
+Latest-state ring buffer + OpenMetrics exporter, served by the poller.
+
+The poller pushes every snapshot into fixed NumPy arrays holding the last
+RING_SAMPLES snapshots of at most RING_GPUS GPUs:
+
+    ts    float64 [gpus, samples]
+    vals  float32 [gpus, samples, len(METRICS)]     (NaN = not reported)
+
+so memory is allocated once and bounded (≈ gpus × samples × 44 bytes;
+64 × 360 ≈ 1 MB) no matter how long the poller runs; GPUs beyond
+RING_GPUS are ignored with a warning.  serve() exposes it on a small
+http.server thread:
+
+    GET /metrics                      OpenMetrics text (newest sample per GPU)
+    GET /latest[?samples=N&host=&gpu_id=]   JSON, newest sample or last N
+
+so dashboards and alerting never query SQLite.  Enable with
+GPU_DOC_METRICS_PORT (or `--metrics-port`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .partitions import epoch
+
+RING_SAMPLES = int(os.getenv("GPU_DOC_RING_SAMPLES", 360))
+RING_GPUS = int(os.getenv("GPU_DOC_RING_GPUS", 64))
+METRICS_PORT = int(os.getenv("GPU_DOC_METRICS_PORT", 0))        # 0 = no exporter
+METRICS_BIND = os.getenv("GPU_DOC_METRICS_BIND", "127.0.0.1")
+
+# ring column → (OpenMetrics name, unit, scale to that unit, help)
+METRICS: Dict[str, Tuple[str, str, float, str]] = {
+    "util_gpu": ("gpu_doctor_gpu_utilization_percent", "percent", 1, "GPU utilisation"),
+    "util_mem": ("gpu_doctor_memory_utilization_percent", "percent", 1, "Memory controller utilisation"),
+    "mem_used_mb": ("gpu_doctor_memory_used_bytes", "bytes", 2**20, "Framebuffer memory used"),
+    "mem_total_mb": ("gpu_doctor_memory_total_bytes", "bytes", 2**20, "Framebuffer memory total"),
+    "temperature": ("gpu_doctor_temperature_celsius", "celsius", 1, "GPU temperature"),
+    "power_w": ("gpu_doctor_power_watts", "watts", 1, "Power draw"),
+    "ecc_errors": ("gpu_doctor_ecc_errors", "", 1, "Volatile ECC errors"),
+    "processes": ("gpu_doctor_processes", "", 1, "Compute processes on the GPU"),
+    "proc_mem_mb": ("gpu_doctor_process_memory_used_bytes", "bytes", 2**20, "Memory used by those processes"),
+}
+_COLS = list(METRICS)
+_GPU_COLS = _COLS[:7]                      # per-GPU values, same on every process row
+
+Key = Tuple[str, int]                      # hostname, gpu_id
+
+
+class Ring:
+    """Last <samples> snapshots of up to <gpus> GPUs in preallocated arrays."""
+
+    def __init__(self, samples: int = RING_SAMPLES, gpus: int = RING_GPUS) -> None:
+        self.samples = samples
+        self.ts = np.full((gpus, samples), np.nan)
+        self.vals = np.full((gpus, samples, len(_COLS)), np.nan, dtype="float32")
+        self.head = np.zeros(gpus, dtype="int64")          # next write position per GPU
+        self.count = np.zeros(gpus, dtype="int64")
+        self.keys: List[Key] = []
+        self._slot: Dict[Key, int] = {}
+        self._lock = threading.Lock()
+        self.dropped_gpus = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.vals.nbytes + self.head.nbytes + self.count.nbytes
+
+    # ---------- writes ----------------------------------------------------
+    def push(self, records: List[Dict[str, Any]]) -> None:
+        """Add one poll cycle of gpu_log rows (one row per GPU process)."""
+        snaps: Dict[Tuple[str, int, str], List[float]] = {}
+        for r in records:
+            snap = snaps.get((r["hostname"], r["gpu_id"], r["ts"]))
+            if snap is None:
+                snap = snaps[(r["hostname"], r["gpu_id"], r["ts"])] = \
+                    [_num(r.get(c)) for c in _GPU_COLS] + [0.0, 0.0]
+            if r.get("pid") is not None:
+                snap[-2] += 1
+                snap[-1] += _num(r.get("proc_mem_mb"), 0.0)
+        with self._lock:
+            for (host, gpu, ts), row in snaps.items():
+                i = self._slot_of((host, int(gpu)))
+                if i is None:
+                    continue
+                pos = self.head[i]
+                self.ts[i, pos] = epoch(ts)
+                self.vals[i, pos] = row
+                self.head[i] = (pos + 1) % self.samples
+                self.count[i] = min(self.count[i] + 1, self.samples)
+
+    def _slot_of(self, key: Key) -> Optional[int]:
+        i = self._slot.get(key)
+        if i is None:
+            if len(self.keys) == len(self.ts):
+                self.dropped_gpus += 1
+                if self.dropped_gpus == 1:
+                    logging.warning("Ring full (%d GPUs); raise GPU_DOC_RING_GPUS", len(self.keys))
+                return None
+            i = self._slot[key] = len(self.keys)
+            self.keys.append(key)
+        return i
+
+    # ---------- reads -----------------------------------------------------
+    def _order(self, i: int, n: int) -> np.ndarray:
+        n = min(n, int(self.count[i]))
+        return (self.head[i] - n + np.arange(n)) % self.samples      # oldest → newest
+
+    def latest(self, samples: int = 1, host: Optional[str] = None,
+               gpu_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest sample per GPU, or its last <samples> as lists (oldest first)."""
+        out = []
+        with self._lock:
+            for i, (h, g) in enumerate(self.keys):
+                if (host is not None and h != host) or (gpu_id is not None and g != gpu_id):
+                    continue
+                idx = self._order(i, samples)
+                if not idx.size:
+                    continue
+                ts, vals = self.ts[i, idx], self.vals[i, idx]
+                if samples == 1:
+                    row = {"hostname": h, "gpu_id": g, "ts": float(ts[0])}
+                    row.update({c: _out(v) for c, v in zip(_COLS, vals[0])})
+                else:
+                    row = {"hostname": h, "gpu_id": g, "ts": ts.tolist()}
+                    row.update({c: [None if v != v else v for v in vals[:, j].tolist()]    # NaN → None
+                                for j, c in enumerate(_COLS)})
+                out.append(row)
+        return out
+
+    def openmetrics(self) -> str:
+        """OpenMetrics exposition of the newest sample per GPU."""
+        newest = self.latest()
+        lines = []
+        for col, (name, unit, scale, help_) in METRICS.items():
+            lines.append(f"# TYPE {name} gauge")
+            if unit:
+                lines.append(f"# UNIT {name} {unit}")
+            lines.append(f"# HELP {name} {help_}.")
+            for row in newest:
+                if row[col] is not None:
+                    lines.append(f'{name}{{host="{_label(row["hostname"])}",gpu="{row["gpu_id"]}"}} '
+                                 f"{_fmt(row[col] * scale)} {row['ts']:.3f}")
+        lines += ["# TYPE gpu_doctor_ring_bytes gauge", "# UNIT gpu_doctor_ring_bytes bytes",
+                  "# HELP gpu_doctor_ring_bytes Memory held by the latest-state ring buffer.",
+                  f"gpu_doctor_ring_bytes {self.nbytes}",
+                  "# TYPE gpu_doctor_ring_gpus gauge",
+                  "# HELP gpu_doctor_ring_gpus GPUs tracked / capacity.",
+                  f'gpu_doctor_ring_gpus{{state="tracked"}} {len(self.keys)}',
+                  f'gpu_doctor_ring_gpus{{state="capacity"}} {len(self.ts)}',
+                  "# EOF"]
+        return "\n".join(lines) + "\n"
+
+
+def _num(v: Any, default: float = math.nan) -> float:
+    try:
+        return default if v is None else float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _out(v: np.floating) -> Optional[float]:
+    return None if np.isnan(v) else float(v)
+
+
+def _fmt(v: float) -> str:
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def _label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ---------- HTTP exporter -------------------------------------------------
+def serve(ring: Ring, port: int = METRICS_PORT, bind: str = METRICS_BIND) -> ThreadingHTTPServer:
+    """Serve /metrics and /latest from <ring> on a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/metrics":
+                    body = ring.openmetrics().encode()
+                    ctype = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+                elif url.path == "/latest":
+                    rows = ring.latest(max(1, int(q.get("samples", 1))), q.get("host"),
+                                       int(q["gpu_id"]) if "gpu_id" in q else None)
+                    body = json.dumps({"ring_bytes": ring.nbytes, "gpus": rows}).encode()
+                    ctype = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+            except ValueError as exc:
+                self.send_error(400, str(exc))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:     # scrapes every few seconds: keep logs quiet
+            pass
+
+    server = ThreadingHTTPServer((bind, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gpu-doc-metrics", daemon=True).start()
+    logging.info("Metrics on http://%s:%d/metrics (ring %d GPUs × %d samples, %.1f MB)",
+                 bind, server.server_port, len(ring.ts), ring.samples, ring.nbytes / 2**20)
+    return server
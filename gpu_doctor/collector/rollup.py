@@ -0,0 +1,187 @@
+# collector/rollup.py
+"""
+1-minute and 1-hour rollups of gpu_log, kept per host × GPU × run_tag.
+
+The writer remembers every (minute, host, gpu, run_tag) bucket its batches
+touched and, at most every GPU_DOC_ROLLUP_SEC seconds and on flush, calls
+refresh() inside a raw-row commit: each dirty minute is recomputed from raw
+rows (so late or replayed rows are folded in), then the enclosing hour from
+its minute rows.  Each tier has its own retention,
+so long-range questions and dashboards keep working after raw rows are
+pruned, and read a fraction of the rows.
+
+Hour p95 is the 95th percentile of the minute p95s – exact min/max/mean,
+approximate p95 (the raw rows it would need are not kept that long).
+"""
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from . import partitions
+
+TIERS = {"1m": 60, "1h": 3600}
+RETENTION_DAYS = {
+    "1m": int(os.getenv("GPU_DOC_KEEP_DAYS_1M", 30)),
+    "1h": int(os.getenv("GPU_DOC_KEEP_DAYS_1H", 365)),
+}
+# rollup prefix → gpu_log column
+METRICS = {"util": "util_gpu", "mem": "mem_used_mb", "temp": "temperature", "power": "power_w"}
+_STATS = ("min", "max", "mean", "p95")
+_COLS = [f"{m}_{s}" for m in METRICS for s in _STATS]
+
+Key = Tuple[str, str, int, str]          # bucket, hostname, gpu_id, run_tag
+
+
+def bucket_start(ts: str, seconds: int) -> str:
+    """UTC start of the bucket containing an ISO-8601 timestamp."""
+    epoch = int(partitions.epoch(ts))
+    start = datetime.fromtimestamp(epoch - epoch % seconds, timezone.utc)
+    return start.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _bound(ts: Optional[str]) -> Optional[str]:
+    """A since / until in the buckets' naive-UTC format (any ISO-8601 offset, "Z")."""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(partitions.epoch(ts), timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _bucket_end(bucket: str, seconds: int) -> str:
+    end = datetime.strptime(bucket, "%Y-%m-%dT%H:%M:%S") + timedelta(seconds=seconds)
+    return end.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _p95(values: Sequence[float]) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return float(ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)])
+
+
+def _upsert(conn: sqlite3.Connection, tier: str, key: Key, n: int, stats: List[Optional[float]]) -> None:
+    cols = ["bucket", "hostname", "gpu_id", "run_tag", "n", *_COLS]
+    conn.execute(
+        f"INSERT OR REPLACE INTO gpu_rollup_{tier} ({', '.join(cols)}) "
+        f"VALUES ({', '.join('?' for _ in cols)})",
+        (*key, n, *stats),
+    )
+
+
+def _minutes(conn: sqlite3.Connection, bucket: str, wanted: Set[Key]) -> None:
+    """Recompute the <wanted> keys of one minute with a single ts-range scan.
+
+    Stored ts are UTC (the writer rewrites other offsets, see
+    partitions.utc_ts), so "Z", "+00:00" and naive forms all compare
+    correctly against the bucket bounds as strings and the ts index is used.
+    """
+    groups: Dict[Key, List[tuple]] = {}
+    end = _bucket_end(bucket, 60)
+    for r in partitions.scan(
+        conn, f"hostname, gpu_id, IFNULL(run_tag, ''), {', '.join(METRICS.values())}",
+        "ts >= ? AND ts < ?", (bucket, end), since=bucket, until=end,
+    ):
+        key = (bucket, r[0], r[1], r[2])
+        if key in wanted:
+            groups.setdefault(key, []).append(r[3:])
+    for key, rows in groups.items():
+        stats: List[Optional[float]] = []
+        for i in range(len(METRICS)):
+            vals = [r[i] for r in rows if r[i] is not None]
+            stats += [min(vals), max(vals), sum(vals) / len(vals), _p95(vals)] if vals else [None] * 4
+        _upsert(conn, "1m", key, len(rows), stats)
+
+
+def _hour(conn: sqlite3.Connection, key: Key) -> None:
+    bucket, host, gpu, tag = key
+    rows = conn.execute(
+        f"SELECT n, {', '.join(_COLS)} FROM gpu_rollup_1m "
+        "WHERE hostname = ? AND gpu_id = ? AND run_tag = ? AND bucket >= ? AND bucket < ?",
+        (host, gpu, tag, bucket, _bucket_end(bucket, 3600)),
+    ).fetchall()
+    if not rows:
+        return
+    stats: List[Optional[float]] = []
+    for i in range(len(METRICS)):
+        c = 1 + 4 * i
+        part = [(r[0], r[c], r[c + 1], r[c + 2], r[c + 3]) for r in rows if r[c] is not None]
+        if not part:
+            stats += [None] * 4
+            continue
+        weight = sum(p[0] for p in part)
+        stats += [min(p[1] for p in part), max(p[2] for p in part),
+                  sum(p[0] * p[3] for p in part) / weight, _p95([p[4] for p in part])]
+    _upsert(conn, "1h", key, sum(r[0] for r in rows), stats)
+
+
+def touched(records: Iterable[Dict[str, Any]]) -> Set[Key]:
+    """Minute buckets that <records> fall into."""
+    return {
+        (bucket_start(r["ts"], 60), r["hostname"], r["gpu_id"], r.get("run_tag") or "")
+        for r in records
+    }
+
+
+def update(conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]) -> int:
+    """Refresh every minute/hour bucket touched by <records>; return buckets updated."""
+    return refresh(conn, touched(records))
+
+
+def refresh(conn: sqlite3.Connection, minutes: Set[Key]) -> int:
+    """Recompute the given minute buckets and their hours; return buckets updated."""
+    by_bucket: Dict[str, Set[Key]] = {}
+    for key in minutes:
+        by_bucket.setdefault(key[0], set()).add(key)
+    for bucket, keys in by_bucket.items():
+        _minutes(conn, bucket, keys)
+    hours = {(b[:13] + ":00:00", h, g, t) for b, h, g, t in minutes}
+    for key in hours:
+        _hour(conn, key)
+    return len(minutes) + len(hours)
+
+
+def prune(conn: sqlite3.Connection) -> None:
+    """Apply each tier's own retention window."""
+    for tier, days in RETENTION_DAYS.items():
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+        conn.execute(f"DELETE FROM gpu_rollup_{tier} WHERE bucket < ?", (cutoff,))
+
+
+def pick_tier(since: Optional[str], until: Optional[str]) -> str:
+    """1h buckets for windows longer than two days (or open-ended), else 1m."""
+    if since is None:
+        return "1h"
+    end = partitions.epoch(until) if until else datetime.now(timezone.utc).timestamp()
+    return "1h" if end - partitions.epoch(since) > 2 * 86400 else "1m"
+
+
+def query(conn: sqlite3.Connection, *, host: Optional[str] = None, gpu_id: Optional[int] = None,
+          run_tag: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+          tier: Optional[str] = None, limit: int = 10_000) -> List[sqlite3.Row]:
+    """Rollup rows for dashboards / long-range questions, oldest bucket first."""
+    tier = tier or pick_tier(since, until)
+    if tier not in TIERS:
+        raise ValueError(f"unknown tier {tier!r}")
+    where, params = [], []
+    for clause, value in (("hostname = ?", host), ("gpu_id = ?", gpu_id), ("run_tag = ?", run_tag),
+                          ("bucket >= ?", _bound(since)), ("bucket < ?", _bound(until))):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    sql = f"SELECT * FROM gpu_rollup_{tier}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " ORDER BY bucket LIMIT ?", (*params, limit)).fetchall()
+
+
+def to_text(row: sqlite3.Row) -> str:
+    """One-line summary of a rollup bucket, same register as embeddings.to_text."""
+    return (
+        f"{row['bucket']} host={row['hostname']} gpu={row['gpu_id']} n={row['n']} "
+        f"util={row['util_mean'] or 0:.0f}%(max {row['util_max'] or 0:.0f}) "
+        f"mem={row['mem_mean'] or 0:.0f}MB(p95 {row['mem_p95'] or 0:.0f}, max {row['mem_max'] or 0:.0f}) "
+        f"temp_max={row['temp_max']} power_max={row['power_max']} tag={row['run_tag'] or 'None'}"
+    )
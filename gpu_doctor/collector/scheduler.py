@@ -0,0 +1,167 @@
+# collector/scheduler.py
+"""
+Poll clock for the poller: fixed cadence on the monotonic clock, optionally
+adaptive, with burst capture around memory spikes.
+
+Ticks are due at start + k·interval, so the time spent collecting and
+writing does not push later polls back; a tick that is already overdue by
+a whole period is dropped (counted in `skipped`) instead of being fired in
+a catch-up burst.
+
+With adaptive=True the period follows the fleet after every sample:
+  • fast (POLL_MIN_SEC) while any GPU is near capacity (NEAR_FRAC) or its
+    memory moves more than CHANGE_FRAC of capacity per base period,
+  • base (POLL_SEC) otherwise,
+  • doubled per idle sample up to POLL_MAX_SEC while every GPU is idle
+    (no processes, 0 % util).
+Only one sample per base period is written as usual.  The extra fast
+samples go to a pre-trigger buffer (the last PRETRIGGER_SEC of them); a
+GPU's share of it reaches the DB only when that GPU fires a burst –
+memory ≥ TRIGGER_FRAC of capacity, the current slope would fill it within
+TTF_SEC, or trigger() – after which its every sample is written for
+BURST_SEC.  The ramp into an OOM is stored at full rate without paying for
+it the rest of the time, or for the GPUs next to it.
+"""
+from __future__ import annotations
+
+import collections
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ADAPTIVE = os.getenv("GPU_DOC_ADAPTIVE", "0") == "1"
+POLL_MIN_SEC = float(os.getenv("GPU_DOC_POLL_MIN_SEC", 1))      # fast rate near capacity
+POLL_MAX_SEC = float(os.getenv("GPU_DOC_POLL_MAX_SEC", 300))    # back-off cap for an idle fleet
+NEAR_FRAC = float(os.getenv("GPU_DOC_NEAR_FRAC", 0.85))         # memory used / total → poll fast
+CHANGE_FRAC = float(os.getenv("GPU_DOC_CHANGE_FRAC", 0.10))     # Δmemory / total per base period → poll fast
+TRIGGER_FRAC = float(os.getenv("GPU_DOC_TRIGGER_FRAC", 0.95))   # memory used / total → burst
+TTF_SEC = float(os.getenv("GPU_DOC_TTF_SEC", 30))               # time-to-full at current slope → burst
+SLOPE_SEC = float(os.getenv("GPU_DOC_SLOPE_SEC", 10))           # slopes span at least this long
+PRETRIGGER_SEC = float(os.getenv("GPU_DOC_PRETRIGGER_SEC", 60)) # fast samples kept for a burst
+BURST_SEC = float(os.getenv("GPU_DOC_BURST_SEC", 60))           # write every sample this long after a trigger
+
+Gpu = Tuple[str, int]                    # hostname, gpu_id
+
+
+class Scheduler:
+    """Drift-free poll ticks; observe() each sample to adapt the rate and pick what to store."""
+
+    def __init__(self, base_sec: float, adaptive: bool = ADAPTIVE, fast_sec: float = POLL_MIN_SEC,
+                 max_sec: float = POLL_MAX_SEC, pretrigger_sec: float = PRETRIGGER_SEC,
+                 burst_sec: float = BURST_SEC, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.base_sec = base_sec
+        self.adaptive = adaptive
+        self.fast_sec = min(fast_sec, base_sec)
+        self.max_sec = max(max_sec, base_sec)
+        self.burst_sec = burst_sec
+        self.pretrigger_sec = pretrigger_sec
+        self.interval = base_sec
+        self._clock, self._sleep = clock, sleep
+        self._next = clock()                           # due time of the tick just taken
+        self._store_due = self._next                   # next sample that is written anyway
+        self._fire: Dict[Optional[Gpu], str] = {}      # pending triggers (None = every GPU)
+        self._burst_until: Dict[Gpu, float] = {}
+        self._covered: Dict[Gpu, float] = {}           # GPU → clock up to which its fast samples are stored
+        self._pre: collections.deque = collections.deque(maxlen=max(1, int(pretrigger_sec / self.fast_sec) + 1))
+        self._last: Dict[Gpu, Tuple[float, float]] = {}   # GPU → (clock, mem_used_mb) slope anchor
+        self.samples = self.stored = self.bursts = self.skipped = 0
+
+    # ---------- clock ----------------------------------------------------
+    def wait(self) -> None:
+        """Sleep until the next tick, start + k·interval (not "now + interval")."""
+        self._next += self.interval
+        now = self._clock()
+        if now - self._next >= self.interval:          # overran whole periods: realign, no catch-up burst
+            self.skipped += int((now - self._next) // self.interval)
+            self._next = now
+        self._sleep(max(0.0, self._next - now))
+
+    # ---------- rate + storage -------------------------------------------
+    def trigger(self, reason: str, gpu: Optional[Gpu] = None) -> None:
+        """Start (or extend) a burst for <gpu>, default every GPU, on the next observe()."""
+        self._fire.setdefault(gpu, reason)
+
+    def _assess(self, records: List[Dict[str, Any]], now: float) -> Tuple[bool, bool]:
+        """(poll fast, fleet idle) for this sample; queues a trigger per GPU at risk."""
+        hot, idle, seen = False, True, set()
+        for r in records:
+            gpu = (r.get("hostname"), r.get("gpu_id"))
+            idle = idle and r.get("pid") is None and not r.get("util_gpu")
+            used, total = r.get("mem_used_mb"), r.get("mem_total_mb")
+            if gpu in seen or used is None or not total:
+                continue
+            seen.add(gpu)
+            # slope against an anchor ≥ SLOPE_SEC old, so one allocation step
+            # seen 1 s apart does not read as a GPU filling in seconds
+            last = self._last.get(gpu)
+            if last is None or now - last[0] >= SLOPE_SEC:
+                self._last[gpu] = (now, used)
+            frac = used / total
+            slope = (used - last[1]) / (now - last[0]) if last and now > last[0] else 0.0   # MB/s
+            hot = hot or frac >= NEAR_FRAC or abs(slope) * self.base_sec >= CHANGE_FRAC * total
+            if frac >= TRIGGER_FRAC:
+                self.trigger(f"{gpu[0]}:{gpu[1]} memory at {frac:.0%}", gpu)
+            elif slope > 0 and (total - used) / slope <= TTF_SEC:
+                self.trigger(f"{gpu[0]}:{gpu[1]} full in {(total - used) / slope:.0f} s", gpu)
+        return hot, idle and bool(records)
+
+    def observe(self, records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Optional[str]]:
+        """Split one sample into (rows, burst rows, reason a burst started) and set the next interval.
+
+        rows: the sample on its base tick (every sample at a fixed rate),
+        else nothing.  burst rows: the
+        rows of GPUs in a burst plus, for a burst starting now, that GPU's
+        buffered pre-trigger samples, oldest first – written as they are,
+        not thinned by the deadband.
+        """
+        now = self._clock()
+        period = self.interval                         # the tick that brought this sample
+        self.samples += 1
+        hot, idle = self._assess(records, now) if self.adaptive else (False, False)
+        fired, self._fire = self._fire, {}
+        if None in fired:
+            reason = fired.pop(None)
+            fired.update({(r.get("hostname"), r.get("gpu_id")): reason for r in records})
+        started = {}
+        for gpu, reason in fired.items():
+            if now >= self._burst_until.get(gpu, float("-inf")):
+                started[gpu] = reason
+                self.bursts += 1
+            self._burst_until[gpu] = now + self.burst_sec
+        for gpu in [g for g, until in self._burst_until.items() if now >= until]:
+            del self._burst_until[gpu]
+        hot_gpus = set(self._burst_until)
+
+        if not self.adaptive:
+            self.interval = self.base_sec
+        elif hot or hot_gpus:
+            self.interval = self.fast_sec
+        elif idle:
+            self.interval = min(self.max_sec, max(self.base_sec, 2 * self.interval))
+        else:
+            self.interval = self.base_sec
+
+        burst: List[Dict[str, Any]] = []
+        if started:
+            for at, old in self._pre:
+                burst += [r for r in old if (g := (r.get("hostname"), r.get("gpu_id"))) in started
+                          and now - at <= self.pretrigger_sec and at > self._covered.get(g, float("-inf"))]
+        burst += [r for r in records if (r.get("hostname"), r.get("gpu_id")) in hot_gpus]
+        for gpu in hot_gpus:
+            self._covered[gpu] = now
+
+        rows: List[Dict[str, Any]] = []
+        # fixed rate: every sample is a base tick.  Adaptive: the tick nearest
+        # the due time (within half a tick – poll jitter) is the stored one
+        if not self.adaptive or now >= self._store_due - period / 2:
+            self._store_due = max(self._store_due + self.base_sec, now + self.interval / 2)
+            rows = [r for r in records if (r.get("hostname"), r.get("gpu_id")) not in hot_gpus]
+        else:
+            self._pre.append((now, records))
+        self.stored += len(rows) + len(burst)
+        return rows, burst, "; ".join(started.values()) or None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"interval_sec": self.interval, "samples": self.samples, "rows_stored": self.stored,
+                "bursts": self.bursts, "skipped_ticks": self.skipped}
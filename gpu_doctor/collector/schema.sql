@@ -1,18 +1,52 @@
-CREATE TABLE gpu_log (
-  id           INTEGER PRIMARY KEY,
-  ts           DATETIME NOT NULL,          -- UTC
-  hostname     TEXT    NOT NULL,
-  gpu_id       INTEGER NOT NULL,
-  pid          INTEGER,
-  process_name TEXT,
-  user         TEXT,
-  util_gpu     INTEGER,   -- %
-  util_mem     INTEGER,   -- %
-  mem_used_mb  INTEGER,
-  ecc_errors   INTEGER,
-  temperature  INTEGER,   -- °C
-  power_w      INTEGER,
-  run_tag      TEXT       -- optional job/run ID
+-- Raw samples live in day partitions gpu_log_YYYYMMDD behind the gpu_log
+-- view; their DDL is partitions.COLUMNS (created on demand by the writer).
+
+-- Rollups (see rollup.py): one row per bucket × host × GPU × run_tag.
+-- bucket = UTC start of the minute / hour; run_tag '' = untagged.
+CREATE TABLE IF NOT EXISTS gpu_rollup_1m (
+  bucket     TEXT    NOT NULL,
+  hostname   TEXT    NOT NULL,
+  gpu_id     INTEGER NOT NULL,
+  run_tag    TEXT    NOT NULL DEFAULT '',
+  n          INTEGER NOT NULL,             -- raw samples in the bucket
+  util_min   REAL, util_max  REAL, util_mean  REAL, util_p95  REAL,
+  mem_min    REAL, mem_max   REAL, mem_mean   REAL, mem_p95   REAL,
+  temp_min   REAL, temp_max  REAL, temp_mean  REAL, temp_p95  REAL,
+  power_min  REAL, power_max REAL, power_mean REAL, power_p95 REAL,
+  PRIMARY KEY (hostname, gpu_id, run_tag, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_1m_bucket ON gpu_rollup_1m(bucket);
+
+CREATE TABLE IF NOT EXISTS gpu_rollup_1h (
+  bucket     TEXT    NOT NULL,
+  hostname   TEXT    NOT NULL,
+  gpu_id     INTEGER NOT NULL,
+  run_tag    TEXT    NOT NULL DEFAULT '',
+  n          INTEGER NOT NULL,
+  util_min   REAL, util_max  REAL, util_mean  REAL, util_p95  REAL,
+  mem_min    REAL, mem_max   REAL, mem_mean   REAL, mem_p95   REAL,
+  temp_min   REAL, temp_max  REAL, temp_mean  REAL, temp_p95  REAL,
+  power_min  REAL, power_max REAL, power_mean REAL, power_p95 REAL,
+  PRIMARY KEY (hostname, gpu_id, run_tag, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_1h_bucket ON gpu_rollup_1h(bucket);
+
+-- Detector events (see detect.py): one row per anomaly the poller's
+-- streaming detectors fired; read by retriever.events() / the API.
+CREATE TABLE IF NOT EXISTS gpu_event (
+  id         INTEGER PRIMARY KEY,
+  ts         TEXT    NOT NULL,             -- sample that fired it
+  hostname   TEXT    NOT NULL,
+  gpu_id     INTEGER NOT NULL,
+  event      TEXT    NOT NULL,             -- mem_zscore, mem_capacity, oom_kill, thermal, power, …
+  severity   TEXT    NOT NULL,             -- warn | crit
+  metric     TEXT,                         -- gpu_log column
+  value      REAL,
+  baseline   REAL,                         -- EWMA mean / limit / previous reading
+  score      REAL,                         -- z-score / seconds to full / excess
+  run_tag    TEXT,
+  detail     TEXT                          -- one-line description
 );
-CREATE INDEX idx_ts_gpu   ON gpu_log(ts, gpu_id);
-CREATE INDEX idx_run_tag  ON gpu_log(run_tag);
+CREATE INDEX IF NOT EXISTS idx_event_ts      ON gpu_event(ts);
+CREATE INDEX IF NOT EXISTS idx_event_host_ts ON gpu_event(hostname, gpu_id, ts);
+CREATE INDEX IF NOT EXISTS idx_event_run_ts  ON gpu_event(run_tag, ts);
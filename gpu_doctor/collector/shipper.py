@@ -0,0 +1,237 @@
+# collector/shipper.py
+"""
+Ship gpu_log rows from a node's poller to a central API (POST /ingest).
+
+Wire format: one gzip-compressed JSON object per batch, columnar —
+``{"n": rows, "cols": {column: [values…]}, "const": {column: value}}`` —
+columns whose value is the same for the whole batch (hostname, often
+user / run_tag) are sent once.  encode() / decode() are shared by both ends.
+
+Shipper buffers rows in memory and a background thread POSTs them every
+SHIP_ROWS rows or SHIP_SEC seconds.  Failed batches (transport errors,
+429, 5xx) go back to the front of the buffer and are retried with
+exponential backoff, honouring the server's Retry-After; a 4xx means the
+batch itself is bad and it is dropped.  The buffer holds at most
+SHIP_BUFFER rows: while the server is unreachable the oldest rows are
+dropped (counted in rows_dropped), so a node never runs out of memory.
+Keep GPU_DOC_SHIP_LOCAL=1 to also write the local DB as a fallback.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .. import instrument
+from .partitions import COLUMNS
+
+SHIP_URL = os.getenv("GPU_DOC_SHIP_URL", "")                  # e.g. http://central:8000
+SHIP_LOCAL = os.getenv("GPU_DOC_SHIP_LOCAL", "1") == "1"      # also write the local DB
+SHIP_ROWS = int(os.getenv("GPU_DOC_SHIP_ROWS", 2048))
+SHIP_SEC = float(os.getenv("GPU_DOC_SHIP_SEC", 2.0))
+SHIP_BUFFER = int(os.getenv("GPU_DOC_SHIP_BUFFER", 200_000))
+SHIP_TIMEOUT = float(os.getenv("GPU_DOC_SHIP_TIMEOUT", 10))
+TOKEN = os.getenv("GPU_DOC_INGEST_TOKEN", "")                 # shared bearer token (both ends)
+MAX_BACKOFF_SEC = 30.0
+MAX_BODY_MB = 64                                              # decompressed size cap per batch
+
+# Columns a node may send; ids are assigned by the central writer
+INGEST_COLUMNS = frozenset(c for c, _ in COLUMNS if c not in ("id", "embedding"))
+
+
+# ---------- wire format ---------------------------------------------------
+@instrument.timed("ship.encode", rows=0)
+def encode(records: List[Dict[str, Any]]) -> bytes:
+    """gzip(JSON) of <records> in columnar form."""
+    names = list(dict.fromkeys(k for r in records for k in r))
+    cols, const = {}, {}
+    for name in names:
+        values = [r.get(name) for r in records]
+        if all(v == values[0] for v in values):
+            const[name] = values[0]
+        else:
+            cols[name] = values
+    body = json.dumps({"n": len(records), "cols": cols, "const": const},
+                      separators=(",", ":"), default=str)
+    return gzip.compress(body.encode(), compresslevel=6, mtime=0)
+
+
+@instrument.timed("ingest.decode")
+def decode(body: bytes, max_bytes: int = MAX_BODY_MB << 20) -> List[Dict[str, Any]]:
+    """Records of one encode() batch; ValueError if it is malformed."""
+    try:
+        d = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)       # gzip framing
+        raw = d.decompress(body, max_bytes)
+        if d.unconsumed_tail:
+            raise ValueError(f"batch larger than {max_bytes >> 20} MB uncompressed")
+        doc = json.loads(raw)
+        n, cols, const = int(doc["n"]), doc.get("cols", {}), doc.get("const", {})
+    except (zlib.error, json.JSONDecodeError, KeyError, TypeError, AttributeError) as exc:
+        raise ValueError(f"bad batch: {exc}") from None
+    unknown = (set(cols) | set(const)) - INGEST_COLUMNS
+    if unknown:
+        raise ValueError(f"unknown column(s) {sorted(unknown)}")
+    if any(not isinstance(v, list) or len(v) != n for v in cols.values()):
+        raise ValueError("column lengths differ from n")
+    if not {"ts", "hostname"} <= set(cols) | set(const):
+        raise ValueError("ts and hostname are required")
+    names = list(cols) + list(const)
+    fixed = tuple(const.values())
+    return [dict(zip(names, (*row, *fixed))) for row in zip(*cols.values())] if cols else \
+        [dict(const) for _ in range(n)]
+
+
+# ---------- client side ---------------------------------------------------
+class Shipper:
+    """Buffer rows and POST them to ``<url>/ingest`` from a background thread."""
+
+    def __init__(
+        self,
+        url: str = SHIP_URL,
+        batch_rows: int = SHIP_ROWS,
+        flush_sec: float = SHIP_SEC,
+        max_rows: int = SHIP_BUFFER,
+        token: str = TOKEN,
+        timeout: float = SHIP_TIMEOUT,
+        client: Any = None,                 # an httpx.Client (tests pass fastapi's TestClient)
+    ) -> None:
+        import httpx
+        self.batch_rows = batch_rows
+        self.flush_sec = flush_sec
+        self.max_rows = max_rows
+        self._client = client or httpx.Client(base_url=url, timeout=timeout)
+        self._owns_client = client is None
+        self._auth = {"Authorization": f"Bearer {token}"} if token else {}
+        self._buf: Deque[Dict[str, Any]] = deque()
+        self._since = 0.0                   # when the oldest buffered row arrived
+        self._cv = threading.Condition()
+        self._sending = 0                   # rows taken off the buffer, not yet acknowledged
+        self._stop = False
+        self._flush = False
+        self.rows_sent = 0
+        self.rows_dropped = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name="gpu-doc-shipper", daemon=True)
+        self._thread.start()
+
+    # -- producer side ---------------------------------------------------
+    def put(self, records: List[Dict[str, Any]]) -> None:
+        """Buffer rows for the next batch; never blocks the poller."""
+        if not records:
+            return
+        with self._cv:
+            if not self._buf:
+                self._since = time.monotonic()
+                self._cv.notify()              # start the SHIP_SEC clock
+            self._buf.extend(records)
+            self._trim()
+            if len(self._buf) >= self.batch_rows:
+                self._cv.notify()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Ship everything buffered so far; False if it is still pending after <timeout>."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            self._flush = True
+            self._cv.notify()
+            try:
+                while self._buf or self._sending:
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and left <= 0:
+                        return False
+                    self._cv.wait(left)
+            finally:
+                self._flush = False
+        return True
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        """Try to ship what is buffered, then stop; rows still unsent are logged and lost."""
+        self.flush(timeout)
+        with self._cv:
+            self._stop = True
+            self._cv.notify()
+        self._thread.join(timeout)
+        if self._buf:
+            logging.warning("Shipper closed with %d unsent rows", len(self._buf))
+        if self._owns_client:
+            self._client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"buffered": len(self._buf), "rows_sent": self.rows_sent, "rows_dropped": self.rows_dropped,
+                "batches_sent": self.batches_sent, "bytes_sent": self.bytes_sent, "failures": self.failures}
+
+    def _trim(self) -> None:
+        over = min(len(self._buf) + self._sending - self.max_rows, len(self._buf))
+        if over > 0:
+            for _ in range(over):
+                self._buf.popleft()
+            self.rows_dropped += over
+            logging.warning("Ship buffer full (%d rows); dropped %d oldest", self.max_rows, over)
+
+    # -- sender thread ---------------------------------------------------
+    def _run(self) -> None:
+        backoff = 0.0
+        while True:
+            with self._cv:
+                while True:
+                    if self._stop and (not self._buf or backoff):
+                        return
+                    due = self._since + self.flush_sec
+                    if self._buf and (len(self._buf) >= self.batch_rows or self._flush or self._stop
+                                      or time.monotonic() >= due):
+                        break
+                    self._cv.wait(max(0.0, due - time.monotonic()) if self._buf else None)
+                batch = [self._buf.popleft() for _ in range(min(self.batch_rows, len(self._buf)))]
+                self._sending = len(batch)
+            wait = self._send(batch)
+            with self._cv:
+                self._sending = 0
+                if wait is not None:                   # retryable: back to the front, in order
+                    self._buf.extendleft(reversed(batch))
+                    self._trim()
+                elif self._buf:
+                    self._since = time.monotonic()
+                self._cv.notify_all()
+            if wait is None:
+                backoff = 0.0
+                continue
+            self.failures += 1
+            backoff = min(MAX_BACKOFF_SEC, max(wait, backoff * 2 or 0.5))
+            with self._cv:
+                self._cv.wait_for(lambda: self._stop, backoff * random.uniform(0.8, 1.2))
+
+    @instrument.timed("ship.post", rows=1)
+    def _send(self, batch: List[Dict[str, Any]]) -> Optional[float]:
+        """POST one batch; None when done with it, else seconds to wait before a retry."""
+        import httpx
+        body = encode(batch)
+        try:
+            resp = self._client.post("/ingest", content=body, headers={
+                "Content-Type": "application/json", "Content-Encoding": "gzip", **self._auth})
+        except httpx.HTTPError as exc:
+            logging.warning("Ship failed (%s); %d rows kept for retry", exc, len(batch))
+            return 0.0
+        if resp.status_code in (408, 429) or resp.status_code >= 500:
+            logging.warning("Ingest busy (%d); %d rows kept for retry", resp.status_code, len(batch))
+            try:
+                return float(resp.headers.get("Retry-After", 0))
+            except ValueError:
+                return 0.0
+        if resp.status_code >= 400:
+            logging.error("Ingest rejected batch (%d %s); dropping %d rows",
+                          resp.status_code, resp.text[:200], len(batch))
+            self.rows_dropped += len(batch)
+            return None
+        self.rows_sent += len(batch)
+        self.batches_sent += 1
+        self.bytes_sent += len(body)
+        return None
@@ -0,0 +1,155 @@
+# collector/smi_stream.py
+"""
+Persistent `nvidia-smi` reader.
+
+Instead of forking nvidia-smi every poll, keep one child running with
+`--query-gpu=… --format=csv,noheader,nounits -lms <N>` and parse its stdout
+line by line.  Iterating a SmiStream yields one list of gpu_log rows per
+sampling cycle; if the child dies it is restarted with exponential backoff.
+
+GPU_DOC_NVSMI overrides the binary (e.g. a fake script for GPU-less tests).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shlex
+import socket
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+NVSMI = os.getenv("GPU_DOC_NVSMI", "nvidia-smi")
+
+# --query-gpu field → gpu_log column
+CSV_COLUMNS: Dict[str, str] = {
+    "index": "gpu_id",
+    "memory.used": "mem_used_mb",
+    "memory.total": "mem_total_mb",
+    "utilization.gpu": "util_gpu",
+    "utilization.memory": "util_mem",
+    "temperature.gpu": "temperature",
+    "power.draw": "power_w",
+}
+
+
+def _num(text: str) -> Optional[int]:
+    """'45' / '17.90' → int; '[N/A]', '[Not Supported]', '' → None."""
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+
+def csv_rows(lines: Sequence[str], fields: Sequence[str],
+             host: Optional[str] = None, ts: Optional[str] = None) -> List[dict]:
+    """Turn `--format=csv,noheader,nounits` lines into gpu_log rows, by field name."""
+    host = host or socket.gethostname()
+    ts = ts or datetime.now(timezone.utc).isoformat()
+    rows = []
+    for idx, line in enumerate(lines):
+        row = {
+            "ts": ts, "hostname": host, "gpu_id": idx,
+            "util_gpu": None, "util_mem": None, "mem_used_mb": None,
+            "mem_total_mb": None, "temperature": None, "power_w": None, "ecc_errors": 0,
+            "pid": None, "process_name": None, "user": None, "run_tag": None,
+            "proc_mem_mb": None,
+        }
+        for field, value in zip(fields, line.split(",")):
+            col = CSV_COLUMNS.get(field)
+            if col:
+                row[col] = _num(value.strip())
+        if row["gpu_id"] is None:
+            row["gpu_id"] = idx
+        rows.append(row)
+    return rows
+
+
+class SmiStream:
+    """Iterate over sampling cycles of one long-running nvidia-smi child."""
+
+    def __init__(
+        self,
+        fields: Sequence[str] = tuple(CSV_COLUMNS),
+        interval_ms: int = 1000,
+        cmd: str = NVSMI,
+        backoff_sec: float = 1.0,
+        max_backoff_sec: float = 60.0,
+    ) -> None:
+        # "index" + "count" lead every line: they tell where a sampling cycle ends
+        self.fields = ["index", "count"] + [f for f in fields if f not in ("index", "count")]
+        self.interval_ms = interval_ms
+        self.cmd = cmd
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.restarts = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._stopped = False
+
+    def argv(self) -> List[str]:
+        return shlex.split(self.cmd) + [
+            f"--query-gpu={','.join(self.fields)}",
+            "--format=csv,noheader,nounits",
+            "-lms", str(self.interval_ms),
+        ]
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._kill()
+
+    def __iter__(self) -> Iterator[List[dict]]:
+        delay = self.backoff_sec
+        while not self._stopped:
+            started = time.monotonic()
+            try:
+                self._proc = subprocess.Popen(
+                    self.argv(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                    text=True, bufsize=1,
+                )
+                yield from self._cycles(self._proc)
+            except OSError as exc:
+                logging.error("Cannot start %s: %s", self.cmd, exc)
+            finally:
+                rc = self._kill()
+            if self._stopped:
+                return
+            if time.monotonic() - started > self.max_backoff_sec:
+                delay = self.backoff_sec        # it ran fine for a while
+            self.restarts += 1
+            logging.warning("nvidia-smi stream exited (rc=%s); restarting in %.1fs", rc, delay)
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff_sec)
+
+    def _cycles(self, proc: subprocess.Popen) -> Iterator[List[dict]]:
+        """Group stdout lines into cycles: a cycle is complete once `count` GPUs
+        have reported (or, if count is unavailable, when the GPU index wraps)."""
+        lines: List[str] = []
+        last_index = -1
+        for line in proc.stdout:                            # type: ignore[union-attr]
+            head = line.split(",", 2)
+            index = _num(head[0])
+            if index is None:
+                continue                                    # banner / error text
+            if lines and index <= last_index:               # wrapped → previous cycle done
+                yield csv_rows(lines, self.fields)
+                lines = []
+            lines.append(line.strip())
+            last_index = index
+            count = _num(head[1]) if len(head) > 1 else None
+            if count and len(lines) >= count:
+                yield csv_rows(lines, self.fields)
+                lines, last_index = [], -1
+
+    def _kill(self) -> Optional[int]:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return None
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        return proc.returncode
@@ -0,0 +1,187 @@
+"""Synthetic `nvidia-smi` output and gpu_log rows for tests and benchmarks (no GPU needed).
+
+One model drives every output format, so XML, CSV and seeded rows agree:
+
+• gpu_states(gpus, procs, cycle, pattern) – per-GPU state at poll <cycle>
+• synthetic_xml(...)  – a `nvidia-smi -q -x` document
+• synthetic_csv(...)  – `--query-gpu=… --format=csv,noheader,nounits` lines
+• records(...)        – one host's poll as gpu_log row dicts
+• seed(conn, rows, …) – fill gpu_log partitions with rows (1M–50M)
+
+Patterns (per GPU; "mixed" cycles through the first three by GPU index):
+  steady – flat load, the legacy fixed snapshot at cycle 0
+  ramp   – memory climbs linearly to ~95 % then the job restarts (leak)
+  oom    – memory climbs past capacity; the processes vanish for a few
+           polls (OOM kill) and come back with new pids
+Every GPU has its own period and phase, so the fleet never moves in lockstep.
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from . import partitions
+
+PATTERNS = ("steady", "ramp", "oom", "mixed")
+TOTAL_MB = 81559                     # H100 80GB HBM3 as reported by nvidia-smi
+RESERVED_MB = 500                    # driver / context overhead on a busy GPU
+DEAD_CYCLES = 3                      # polls an OOM-killed job stays gone
+
+
+def _kind(pattern: str, g: int) -> str:
+    if pattern not in PATTERNS:
+        raise ValueError(f"unknown pattern {pattern!r} (known: {', '.join(PATTERNS)})")
+    return PATTERNS[g % 3] if pattern == "mixed" else pattern
+
+
+def gpu_states(gpus: int, procs: int, cycle: int = 0, pattern: str = "steady") -> List[Dict[str, Any]]:
+    """State of every GPU at poll <cycle>; processes are spread round-robin over GPUs."""
+    out = []
+    for g in range(gpus):
+        kind = _kind(pattern, g)
+        slots = list(range(g, procs, gpus))
+        if kind == "steady":
+            util = (g * 6 + cycle % 5) % 100
+            out.append({"gpu": g, "util": util, "mem_util": g * 3, "used": 1000 + g * 3000, "total": TOTAL_MB,
+                        "temp": 40 + g + cycle % 3, "power": 100 + g * 10 + cycle % 4 * 5,
+                        "procs": [(10000 + p, f"python train_{p}.py", 500 + p) for p in slots]})
+            continue
+        period = 40 + (7 * g) % 30
+        run, phase = divmod(cycle + 11 * g, period)
+        live = period - DEAD_CYCLES if kind == "oom" else period
+        if phase >= live or not slots:                      # killed (or nothing scheduled here)
+            frac, slots = 0.0, []
+        elif kind == "oom":
+            frac = min(0.995, 0.2 + 0.85 * phase / max(live - 1, 1))
+        else:
+            frac = 0.1 + 0.85 * phase / period
+        used = int(RESERVED_MB + frac * (TOTAL_MB - RESERVED_MB)) if slots else 0
+        util = 70 + (g * 6 + cycle) % 30 if slots else 0
+        share = (used - RESERVED_MB) // len(slots) if slots else 0
+        out.append({"gpu": g, "util": util, "mem_util": util // 2, "used": used, "total": TOTAL_MB,
+                    "temp": 35 + util * 9 // 20, "power": 60 + util * 34 // 10,
+                    "procs": [(10000 + p + 1000 * run, f"python train_{p}.py", share) for p in slots]})
+    return out
+
+
+# ---------- nvidia-smi formats ---------------------------------------------
+def synthetic_xml(gpus: int, procs: int, cycle: int = 0, pattern: str = "steady") -> bytes:
+    """A -q -x style document with <procs> processes spread over <gpus> GPUs."""
+    out = ['<?xml version="1.0" ?>', '<!DOCTYPE nvidia_smi_log SYSTEM "nvsmi_device_v12.dtd">',
+           "<nvidia_smi_log>", "<driver_version>550.54.15</driver_version>",
+           f"<attached_gpus>{gpus}</attached_gpus>"]
+    for s in gpu_states(gpus, procs, cycle, pattern):
+        g = s["gpu"]
+        out += [f'<gpu id="00000000:{g:02X}:00.0">', "<product_name>NVIDIA H100 80GB HBM3</product_name>",
+                f"<minor_number>{g}</minor_number>",
+                f"<fb_memory_usage><total>{s['total']} MiB</total><reserved>512 MiB</reserved>"
+                f"<used>{s['used']} MiB</used><free>{s['total'] - s['used']} MiB</free></fb_memory_usage>",
+                f"<utilization><gpu_util>{s['util']} %</gpu_util><memory_util>{s['mem_util']} %</memory_util>"
+                "<encoder_util>0 %</encoder_util><decoder_util>0 %</decoder_util></utilization>",
+                "<ecc_errors><volatile><sram_correctable>0</sram_correctable>"
+                "<dram_uncorrectable>0</dram_uncorrectable></volatile></ecc_errors>",
+                f"<temperature><gpu_temp>{s['temp']} C</gpu_temp></temperature>",
+                f"<gpu_power_readings><power_draw>{s['power']}.25 W</power_draw></gpu_power_readings>",
+                "<clocks><graphics_clock>1980 MHz</graphics_clock><sm_clock>1980 MHz</sm_clock></clocks>",
+                "<processes>"]
+        for pid, name, mem in s["procs"]:
+            out.append(f"<process_info><gpu_instance_id>N/A</gpu_instance_id><pid>{pid}</pid>"
+                       f"<type>C</type><process_name>{name}</process_name>"
+                       f"<used_memory>{mem} MiB</used_memory></process_info>")
+        out += ["</processes>", "</gpu>"]
+    out.append("</nvidia_smi_log>")
+    return "\n".join(out).encode()
+
+
+# --query-gpu field → state key (anything else prints "[N/A]")
+CSV_FIELDS = {"index": "gpu", "memory.used": "used", "memory.total": "total", "utilization.gpu": "util",
+              "utilization.memory": "mem_util", "temperature.gpu": "temp", "power.draw": "power"}
+
+
+def synthetic_csv(gpus: int, fields: Sequence[str], cycle: int = 0, pattern: str = "steady",
+                  procs: int = 0) -> str:
+    """`--format=csv,noheader,nounits` output for the requested fields, one line per GPU."""
+    lines = []
+    for s in gpu_states(gpus, procs or gpus, cycle, pattern):
+        vals = {**s, "power": f"{s['power']}.25", "count": gpus}
+        lines.append(", ".join(str(vals[CSV_FIELDS.get(f, f)]) if CSV_FIELDS.get(f, f) in vals else "[N/A]"
+                               for f in fields))
+    return "\n".join(lines) + "\n"
+
+
+# ---------- DB seeder -------------------------------------------------------
+_SEED_COLS = ("ts", "hostname", "gpu_id", "pid", "process_name", "user", "util_gpu", "util_mem",
+              "mem_used_mb", "mem_total_mb", "ecc_errors", "temperature", "power_w", "run_tag", "proc_mem_mb")
+
+
+def _rows(host: str, h: int, ts: str, states: List[Dict[str, Any]]) -> List[tuple]:
+    out = []
+    for s in states:
+        gpu = (s["util"], s["mem_util"], s["used"], s["total"], 0, s["temp"], s["power"])
+        if not s["procs"]:
+            out.append((ts, host, s["gpu"], None, None, None, *gpu, None, None))
+        for pid, name, mem in s["procs"]:
+            out.append((ts, host, s["gpu"], pid, name, f"user{pid % 7}", *gpu,
+                        f"run-{h}-{pid // 1000 % 1000}", mem))
+    return out
+
+
+def records(gpus: int, procs: int, cycle: int = 0, pattern: str = "steady", host: str = "node00",
+            ts: Optional[str] = None) -> List[Dict[str, Any]]:
+    """One host's poll at <cycle> as gpu_log row dicts, like the parsers return."""
+    ts = ts or datetime.now(timezone.utc).isoformat()
+    return [dict(zip(_SEED_COLS, r)) for r in _rows(host, 0, ts, gpu_states(gpus, procs, cycle, pattern))]
+
+
+def seed(conn: sqlite3.Connection, rows: int, *, hosts: int = 4, gpus: int = 8, procs: int = 16,
+         pattern: str = "mixed", step_sec: float = 30.0, end: Optional[float] = None,
+         chunk: int = 200_000) -> int:
+    """Insert about <rows> rows (whole poll cycles) ending at <end> (default now).
+
+    Writes straight into the day partitions, one transaction per chunk,
+    with fsync off and a large page cache.  Partitions the seeder creates
+    get their indexes built once at the end instead of row by row; rollups
+    are not maintained (seeded data is for raw-row benchmarks).
+    Returns the number of rows written.
+    """
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")                  # 256 MB
+    per_cycle = sum(len(s["procs"]) or 1 for s in gpu_states(gpus, procs, 0, "steady")) * hosts
+    cycles = max(1, rows // per_cycle)
+    end = time.time() if end is None else end
+    start = end - cycles * step_sec
+    sql = f"INSERT INTO {{table}} ({', '.join(_SEED_COLS)}) VALUES ({', '.join('?' * len(_SEED_COLS))})"
+    written, batch, day = 0, [], None
+    have = {name for _, name in partitions.list_partitions(conn)}
+    fresh = set()
+
+    def commit() -> None:
+        nonlocal written
+        if batch:
+            name = partitions.table(day)
+            with conn:
+                partitions.ensure(conn, day)
+                if name not in have and name not in fresh:       # ours: defer its indexes
+                    fresh.add(name)
+                    for suffix in partitions.INDEXES:
+                        conn.execute(f"DROP INDEX IF EXISTS idx_{name}_{suffix}")
+                conn.executemany(sql.format(table=name), batch)
+            written += len(batch)
+            batch.clear()
+
+    for c in range(cycles):
+        t = start + c * step_sec
+        ts = datetime.fromtimestamp(t, timezone.utc).isoformat()
+        if int(t // 86400) != day:
+            commit()
+            day = int(t // 86400)
+        for h in range(hosts):
+            batch += _rows(f"node{h:02d}", h, ts, gpu_states(gpus, procs, c + 17 * h, pattern))
+        if len(batch) >= chunk:
+            commit()
+    commit()
+    with conn:
+        partitions.ensure_indexes(conn)
+    return written
@@ -0,0 +1,256 @@
+# gpu_doctor/instrument.py
+"""
+Per-stage timers, row counters and latency histograms (no external deps).
+
+    @instrument.timed("db.insert", rows=0)           # rows = len(first positional argument)
+    def insert_log(records): ...
+
+    with instrument.span("ask.llm"): ...
+    instrument.snapshot()   → {stage: {count, rows, p50_ms, p95_ms, p99_ms, max_ms, …}}
+
+Histograms use fixed log-spaced buckets (20 per decade, 1 µs – 1000 s), so
+percentiles are within ~6 % and recording is O(log buckets) with no
+allocation.  GPU_DOC_INSTRUMENT=0 (or enable(False) at runtime) turns every
+wrapper into a flag check and a direct call.
+
+profile_start() / profile_stop() toggle a profiler at runtime: "sample"
+(default) snapshots every thread's stack each PROFILE_INTERVAL_MS via
+sys._current_frames, so API threadpool work is included; "cprofile"
+profiles the calling thread only (the poller loop).
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import collections
+import functools
+import io
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+ENABLED = os.getenv("GPU_DOC_INSTRUMENT", "1") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("GPU_DOC_PROFILE_INTERVAL_MS", 5))
+
+_BOUNDS = [10 ** (e / 20) for e in range(-120, 61)]          # seconds, 1 µs … 1000 s
+
+
+class Histogram:
+    """Count / sum / max and log-bucketed latencies of one stage."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(_BOUNDS) + 1)
+            self.count = 0
+            self.rows = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def add(self, seconds: float, rows: int = 0) -> None:
+        i = bisect.bisect_left(_BOUNDS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.rows += rows
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (seconds)."""
+        rank = math.ceil(q / 100 * self.count)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(_BOUNDS[i] if i < len(_BOUNDS) else math.inf, self.max)
+        return 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {"count": self.count, "rows": self.rows,
+                   "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+                   "max_ms": self.max * 1000, "total_s": self.total}
+            out.update({f"p{q}_ms": self.percentile(q) * 1000 for q in (50, 95, 99)})
+        return out
+
+
+_STAGES: Dict[str, Histogram] = {}
+_STAGES_LOCK = threading.Lock()
+
+
+def enable(on: bool = True) -> None:
+    global ENABLED
+    ENABLED = on
+
+
+def stage(name: str) -> Histogram:
+    h = _STAGES.get(name)
+    if h is None:
+        with _STAGES_LOCK:
+            h = _STAGES.setdefault(name, Histogram())
+    return h
+
+
+def observe(name: str, seconds: float, rows: int = 0) -> None:
+    """Record one call of <name> that took <seconds> (and handled <rows>)."""
+    if ENABLED:
+        stage(name).add(seconds, rows)
+
+
+@contextmanager
+def span(name: str, rows: int = 0) -> Iterator[None]:
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage(name).add(time.perf_counter() - t0, rows)
+
+
+Rows = Union[int, str, None]
+
+
+def _count(how: Rows, args: tuple, result: Any) -> int:
+    try:
+        if how == "result":
+            return len(result)
+        if isinstance(how, int):
+            return len(args[how])
+    except (TypeError, IndexError):
+        pass
+    return 0
+
+
+def timed(name: str, rows: Rows = None) -> Callable[[Callable], Callable]:
+    """Decorator: time every call as <name>.
+
+    rows: index of the positional argument whose len() is the row count
+    (1 for methods), "result" for len(return value), None for no count.
+    """
+    def wrap(fn: Callable) -> Callable:
+        hist = stage(name)                  # bound once; reset() clears it in place
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args: Any, **kwargs: Any) -> Any:
+                if not ENABLED:
+                    return await fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                result = await fn(*args, **kwargs)
+                hist.add(time.perf_counter() - t0, _count(rows, args, result))
+                return result
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            hist.add(time.perf_counter() - t0, _count(rows, args, result))
+            return result
+        return run
+    return wrap
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Summary of every stage that has recorded at least one call."""
+    return {name: s for name, h in sorted(_STAGES.items()) if (s := h.summary())["count"]}
+
+
+def reset() -> None:
+    for h in list(_STAGES.values()):
+        h.clear()
+
+
+def summary() -> str:
+    """One line per stage for periodic log output."""
+    return "\n".join(
+        f"  {name:<18} n={s['count']:<7} rows={s['rows']:<9} p50 {s['p50_ms']:8.2f}  "
+        f"p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f}  max {s['max_ms']:8.2f} ms"
+        for name, s in snapshot().items()
+    ) or "  (no samples)"
+
+
+# ---------- runtime profiler ---------------------------------------------
+_PROFILE: Dict[str, Any] = {}
+
+
+def _sampler(stop: threading.Event, counts: "collections.Counter[str]") -> None:
+    own = threading.get_ident()
+    while not stop.wait(PROFILE_INTERVAL_MS / 1000):
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}"
+                if key not in seen:                     # cumulative: once per stack
+                    seen.add(key)
+                    counts[key] += 1
+                if leaf:
+                    counts["self " + key] += 1
+                    leaf = False
+                frame = frame.f_back
+        counts["_samples"] += 1
+
+
+def profiling() -> Optional[str]:
+    return _PROFILE.get("mode")
+
+
+def profile_start(mode: str = "sample") -> None:
+    """Start profiling (no-op if already running); mode "sample" or "cprofile"."""
+    if _PROFILE:
+        return
+    if mode == "cprofile":
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        _PROFILE.update(mode=mode, prof=prof, t0=time.perf_counter())
+    elif mode == "sample":
+        stop, counts = threading.Event(), collections.Counter()
+        thread = threading.Thread(target=_sampler, args=(stop, counts), name="gpu-doc-profiler", daemon=True)
+        thread.start()
+        _PROFILE.update(mode=mode, stop=stop, counts=counts, thread=thread, t0=time.perf_counter())
+    else:
+        raise ValueError(f"unknown profile mode {mode!r} (sample | cprofile)")
+
+
+def profile_stop(top: int = 25) -> str:
+    """Stop profiling and return a text report of the <top> hottest functions."""
+    if not _PROFILE:
+        return "profiler not running"
+    state = dict(_PROFILE)
+    _PROFILE.clear()
+    secs = time.perf_counter() - state["t0"]
+    if state["mode"] == "cprofile":
+        import pstats
+        state["prof"].disable()
+        out = io.StringIO()
+        pstats.Stats(state["prof"], stream=out).sort_stats("cumulative").print_stats(top)
+        return f"cProfile, {secs:.1f} s\n" + out.getvalue()
+    state["stop"].set()
+    state["thread"].join()
+    counts: "collections.Counter[str]" = state["counts"]
+    n = counts.pop("_samples", 0) or 1
+    own = [(k[5:], v) for k, v in counts.items() if k.startswith("self ")]
+    cum = [(k, v) for k, v in counts.items() if not k.startswith("self ")]
+    lines = [f"sampled {n} × all threads every {PROFILE_INTERVAL_MS:g} ms over {secs:.1f} s",
+             f"{'self %':>7} {'total %':>8}  function"]
+    total = dict(cum)
+    for key, v in sorted(own, key=lambda x: -x[1])[:top]:
+        lines.append(f"{100 * v / n:7.1f} {100 * total.get(key, v) / n:8.1f}  {key}")
+    return "\n".join(lines)
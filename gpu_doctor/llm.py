@@ -0,0 +1,278 @@
+# gpu_doctor/llm.py
+"""
+LLM call layer used by the API.
+
+• GPU_DOC_MODEL="<backend>:<model>" picks an OpenAI-compatible endpoint from
+  BACKENDS (openai, vllm, llamacpp, ollama, stub); register() adds more
+• one pooled keep-alive httpx client per backend and event loop
+• every call has a deadline (GPU_DOC_LLM_TIMEOUT) covering its retries
+  (GPU_DOC_LLM_RETRIES, on 429 / 5xx / transport errors) and an optional
+  hedged duplicate request (GPU_DOC_LLM_HEDGE_MS) to cut tail latency
+• a semaphore caps in-flight model calls (GPU_DOC_LLM_CONCURRENCY)
+• identical concurrent prompts are coalesced into a single upstream call
+
+MODEL="dummy" answers offline; GPU_DOC_DUMMY_LATENCY_MS adds an artificial
+delay so concurrency and coalescing can be exercised without a real model.
+For HTTP-level load tests run the bundled stand-in server (llm_stub) and
+use MODEL="stub:<anything>".
+chat_stream() yields tokens as they arrive (the dummy spreads its latency
+over the tokens); streams share the semaphore but are never coalesced or
+hedged, and are retried only before their first token.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from gpu_doctor import instrument
+
+MODEL = os.getenv("GPU_DOC_MODEL", "openai:o3")
+MAX_INFLIGHT = int(os.getenv("GPU_DOC_LLM_CONCURRENCY", 8))
+TIMEOUT_SEC = float(os.getenv("GPU_DOC_LLM_TIMEOUT", 60))          # whole call, retries included
+CONNECT_SEC = float(os.getenv("GPU_DOC_LLM_CONNECT_TIMEOUT", 5))
+RETRIES = int(os.getenv("GPU_DOC_LLM_RETRIES", 2))
+HEDGE_MS = float(os.getenv("GPU_DOC_LLM_HEDGE_MS", 0))             # 0 = no hedged request
+KEEPALIVE_SEC = float(os.getenv("GPU_DOC_LLM_KEEPALIVE", 30))
+MAX_TOKENS = int(os.getenv("GPU_DOC_LLM_MAX_TOKENS", 512))
+DUMMY_LATENCY_MS = float(os.getenv("GPU_DOC_DUMMY_LATENCY_MS", 0))
+
+DUMMY_ANSWER = ('{ "answer": "Dummy model - no LLM call.",'
+                '  "recommended_gpu_mem_mb": null,'
+                '  "recommended_cpu_cores": null,'
+                '  "flagged_anomalies": [] }')
+
+
+# ---------- backends ---------------------------------------------------
+@dataclass(frozen=True)
+class Backend:
+    """An OpenAI-compatible /chat/completions endpoint."""
+
+    url: str                                  # base URL, up to and including /v1
+    key_env: Optional[str] = None             # env var holding the bearer token
+    max_tokens_field: str = "max_tokens"      # OpenAI's o-series wants max_completion_tokens
+
+
+BACKENDS: Dict[str, Backend] = {
+    "openai": Backend(os.getenv("GPU_DOC_OPENAI_URL", "https://api.openai.com/v1"), "OPENAI_API_KEY",
+                      "max_completion_tokens"),
+    "vllm": Backend(os.getenv("GPU_DOC_VLLM_URL", "http://localhost:8000/v1"), "VLLM_API_KEY"),
+    "llamacpp": Backend(os.getenv("GPU_DOC_LLAMACPP_URL", "http://localhost:8080/v1")),
+    "ollama": Backend(os.getenv("GPU_DOC_OLLAMA_URL", "http://localhost:11434/v1")),
+    "stub": Backend(os.getenv("GPU_DOC_STUB_URL", "http://127.0.0.1:8099/v1")),
+}
+ALIASES = {"llama3:local": "ollama:llama3"}
+
+
+def register(name: str, url: str, key_env: Optional[str] = None,
+             max_tokens_field: str = "max_tokens") -> None:
+    """Add (or replace) a backend usable as GPU_DOC_MODEL="<name>:<model>"."""
+    BACKENDS[name] = Backend(url, key_env, max_tokens_field)
+
+
+def resolve(model: Optional[str] = None) -> Tuple[str, str]:
+    """(backend name, model name) of a GPU_DOC_MODEL value."""
+    model = ALIASES.get(model or MODEL, model or MODEL)
+    name, _, model_name = model.partition(":")
+    if name not in BACKENDS:
+        raise ValueError(f"Unsupported MODEL {model!r} (backends: {', '.join(BACKENDS)})")
+    return name, model_name
+
+
+_STATS = {"calls": 0, "coalesced": 0, "inflight": 0, "peak_inflight": 0,
+          "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0}
+_INFLIGHT: Dict[str, "asyncio.Future[str]"] = {}
+_LOOP_STATE: Dict[str, Any] = {}     # semaphore + clients, rebuilt per event loop
+
+
+def _loop_state() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    if _LOOP_STATE.get("loop") is not loop:
+        _LOOP_STATE.clear()
+        _LOOP_STATE.update(loop=loop, sem=asyncio.Semaphore(MAX_INFLIGHT), clients={})
+    return _LOOP_STATE
+
+
+def _client(name: str) -> Any:
+    clients = _loop_state()["clients"]
+    if name not in clients:
+        import httpx               # deferred: unused by "dummy"
+        backend = BACKENDS[name]
+        key = os.getenv(backend.key_env) if backend.key_env else None
+        clients[name] = httpx.AsyncClient(
+            base_url=backend.url,
+            headers={"Authorization": f"Bearer {key}"} if key else {},
+            timeout=httpx.Timeout(TIMEOUT_SEC, connect=CONNECT_SEC),
+            # room for one hedge per in-flight call; idle sockets kept for reuse
+            limits=httpx.Limits(max_connections=2 * MAX_INFLIGHT, max_keepalive_connections=MAX_INFLIGHT,
+                                keepalive_expiry=KEEPALIVE_SEC),
+        )
+    return clients[name]
+
+
+async def close() -> None:
+    """Close this event loop's HTTP clients (API shutdown)."""
+    clients = _LOOP_STATE.get("clients", {}) if _LOOP_STATE.get("loop") is asyncio.get_running_loop() else {}
+    for client in list(clients.values()):
+        await client.aclose()
+    clients.clear()
+
+
+def _body(model: str, name: str, prompt: str, system: str, **extra: Any) -> Dict[str, Any]:
+    return {"model": model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+            BACKENDS[name].max_tokens_field: MAX_TOKENS, **extra}
+
+
+def _retryable(exc: BaseException) -> bool:
+    import httpx
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+async def _backoff(attempt: int) -> None:
+    _STATS["retries"] += 1
+    await asyncio.sleep(min(2.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+# ---------- one completion -------------------------------------------
+async def _post(name: str, body: Dict[str, Any]) -> str:
+    resp = await _client(name).post("/chat/completions", json=body)
+    resp.raise_for_status()
+    return resp.json()["choices"][0]["message"]["content"]
+
+
+async def _hedged(name: str, body: Dict[str, Any]) -> str:
+    """POST once; if no answer within HEDGE_MS, race a duplicate and keep the first success."""
+    first = asyncio.ensure_future(_post(name, body))
+    tasks = [first]
+    try:
+        if HEDGE_MS <= 0:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=HEDGE_MS / 1000)
+        if not done:
+            _STATS["hedges"] += 1
+            tasks.append(asyncio.ensure_future(_post(name, body)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        _STATS["hedge_wins"] += 1
+                    return task.result()
+        raise tasks[-1].exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _retried(name: str, body: Dict[str, Any]) -> str:
+    for attempt in range(RETRIES + 1):
+        try:
+            return await _hedged(name, body)
+        except Exception as exc:
+            if attempt == RETRIES or not _retryable(exc):
+                raise
+            await _backoff(attempt)
+    raise ValueError("GPU_DOC_LLM_RETRIES must be >= 0")
+
+
+@instrument.timed("llm.upstream")
+async def _call(prompt: str, system: str) -> str:
+    if MODEL == "dummy": # quick offline answer
+        if DUMMY_LATENCY_MS:
+            await asyncio.sleep(DUMMY_LATENCY_MS / 1000)
+        return DUMMY_ANSWER
+    name, model = resolve(MODEL)
+    try:
+        return await asyncio.wait_for(_retried(name, _body(model, name, prompt, system)), TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        _STATS["timeouts"] += 1
+        raise
+
+
+async def _limited(prompt: str, system: str) -> str:
+    async with _loop_state()["sem"]:
+        _STATS["calls"] += 1
+        _STATS["inflight"] += 1
+        _STATS["peak_inflight"] = max(_STATS["peak_inflight"], _STATS["inflight"])
+        try:
+            return await _call(prompt, system)
+        finally:
+            _STATS["inflight"] -= 1
+
+
+@instrument.timed("llm.chat")
+async def chat(prompt: str, system: str) -> str:
+    """Raw completion text; joins an identical in-flight call when there is one."""
+    key = hashlib.sha1(f"{MODEL}\0{system}\0{prompt}".encode()).hexdigest()
+    task: Optional[asyncio.Future[str]] = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_limited(prompt, system))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _t: _INFLIGHT.pop(key, None))
+    else:
+        _STATS["coalesced"] += 1
+    # shield: one client disconnecting must not cancel the shared upstream call
+    return await asyncio.shield(task)
+
+
+# ---------- streaming ----------------------------------------------------
+async def _stream(name: str, body: Dict[str, Any]) -> AsyncIterator[str]:
+    """Content deltas of one server-sent-events completion."""
+    async with _client(name).stream("POST", "/chat/completions", json=body) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            choices = json.loads(data).get("choices") or [{}]
+            piece = (choices[0].get("delta") or {}).get("content")
+            if piece:
+                yield piece
+
+
+async def chat_stream(prompt: str, system: str) -> AsyncIterator[str]:
+    """Yield completion text piece by piece as the model produces it."""
+    async with _loop_state()["sem"]:
+        _STATS["calls"] += 1
+        _STATS["inflight"] += 1
+        _STATS["peak_inflight"] = max(_STATS["peak_inflight"], _STATS["inflight"])
+        try:
+            if MODEL == "dummy":
+                tokens = re.findall(r"\S+\s*", DUMMY_ANSWER)
+                for tok in tokens:
+                    if DUMMY_LATENCY_MS:
+                        await asyncio.sleep(DUMMY_LATENCY_MS / 1000 / len(tokens))
+                    yield tok
+                return
+            name, model = resolve(MODEL)
+            body = _body(model, name, prompt, system, stream=True)
+            for attempt in range(RETRIES + 1):
+                started = False
+                try:
+                    async for piece in _stream(name, body):
+                        started = True
+                        yield piece
+                    return
+                except Exception as exc:
+                    # once text reached the caller a retry would repeat it
+                    if started or attempt == RETRIES or not _retryable(exc):
+                        raise
+                    await _backoff(attempt)
+        finally:
+            _STATS["inflight"] -= 1
+
+
+def stats() -> Dict[str, Any]:
+    return {**_STATS, "max_inflight": MAX_INFLIGHT, "model": MODEL,
+            "hedge_ms": HEDGE_MS, "retries_max": RETRIES, "timeout_sec": TIMEOUT_SEC}
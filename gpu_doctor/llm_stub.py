@@ -0,0 +1,101 @@
+# gpu_doctor/llm_stub.py
+"""
+Offline stand-in for an OpenAI-compatible chat completions server, for
+load-testing the API (throughput, tail latency, hedging, retries).
+
+    python -m gpu_doctor.llm_stub --port 8099 --latency-ms 400 --slow-every 20 --slow-ms 4000
+    GPU_DOC_MODEL=stub:any uvicorn gpu_doctor.api:app ...
+
+Every answer takes latency_ms + U(0, jitter_ms); requests 0, N, 2N, … also
+take slow_ms extra (--slow-every N) and requests 0, M, 2M, … fail with 503
+(--fail-every M).  Streams spread the same delay over their tokens.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+
+from gpu_doctor.llm import DUMMY_ANSWER
+
+CONFIG: Dict[str, float] = {
+    "latency_ms": float(os.getenv("GPU_DOC_STUB_LATENCY_MS", 300)),
+    "jitter_ms": float(os.getenv("GPU_DOC_STUB_JITTER_MS", 100)),
+    "slow_every": int(os.getenv("GPU_DOC_STUB_SLOW_EVERY", 0)),
+    "slow_ms": float(os.getenv("GPU_DOC_STUB_SLOW_MS", 3000)),
+    "fail_every": int(os.getenv("GPU_DOC_STUB_FAIL_EVERY", 0)),
+}
+_SEQ = itertools.count()
+
+app = FastAPI(title="GPU Doctor LLM stub")
+
+
+def reset() -> None:
+    """Restart the request counter (slow / fail patterns start over)."""
+    global _SEQ
+    _SEQ = itertools.count()
+
+
+def _delay(n: int) -> float:
+    ms = CONFIG["latency_ms"] + random.uniform(0, CONFIG["jitter_ms"])
+    if CONFIG["slow_every"] and n % CONFIG["slow_every"] == 0:
+        ms += CONFIG["slow_ms"]
+    return ms / 1000
+
+
+@app.post("/v1/chat/completions")
+async def completions(body: Dict[str, Any]):
+    n = next(_SEQ)
+    if CONFIG["fail_every"] and n % CONFIG["fail_every"] == 0:
+        raise HTTPException(503, "stub: injected failure")
+    delay, model = _delay(n), body.get("model", "stub")
+    if body.get("stream"):
+        tokens = re.findall(r"\S+\s*", DUMMY_ANSWER)
+
+        async def events() -> AsyncIterator[str]:
+            for tok in tokens:
+                await asyncio.sleep(delay / len(tokens))
+                chunk = {"id": f"stub-{n}", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    await asyncio.sleep(delay)
+    return {
+        "id": f"stub-{n}", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": DUMMY_ANSWER},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4,
+                  "completion_tokens": len(DUMMY_ANSWER) // 4},
+    }
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+
+def main() -> None:
+    import uvicorn
+    ap = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    for key, value in CONFIG.items():
+        ap.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = ap.parse_args()
+    CONFIG.update({k: getattr(args, k) for k in CONFIG})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,25 @@
-from gpu_doctor.collector.embeddings import build_faiss
+import argparse
+import time
+
+from gpu_doctor.collector import embeddings
 
 if __name__ == "__main__":
-	build_faiss()
-	print("FAISS index created ✅")
+	parser = argparse.ArgumentParser(description="Build / update the FAISS index")
+	parser.add_argument("--full", action="store_true", help="rebuild from scratch instead of appending new rows")
+	parser.add_argument("--pgvector", action="store_true", help="back-fill the pgvector column instead of FAISS")
+	parser.add_argument("--workers", type=int, default=embeddings.WORKERS,
+	                    help="encoder processes (-1 = one per core on CPU-only hosts, 1 = in-process)")
+	parser.add_argument("--batch-size", type=int, default=embeddings.BATCH_SIZE, help="rows per encode batch")
+	parser.add_argument("--throughput", action="store_true", help="report rows/sec to size the backfill window")
+	args = parser.parse_args()
+
+	t0 = time.perf_counter()
+	if args.pgvector:
+		n = embeddings.migrate_pgvector(workers=args.workers, batch_size=args.batch_size)
+		print(f"pgvector column back-filled ✅  ({n} rows)")
+	else:
+		n = embeddings.build_faiss(incremental=not args.full, workers=args.workers, batch_size=args.batch_size)
+		print(f"FAISS index {'rebuilt' if args.full else 'updated'} ✅  ({n} new rows)")
+	if args.throughput:
+		dt = time.perf_counter() - t0
+		print(f"throughput: {n / dt if dt else 0:,.0f} rows/s  ({n} rows in {dt:.2f}s)")
@@ -0,0 +1,66 @@
+"""Prompt size + build time: K raw rows vs. every raw row vs. the per-GPU summary.
+
+    python scripts/bench_context.py --gpus 8 --hours 6 --budget 1200
+
+One host's GPUs polled every 30 s for <hours>; GPU 0 leaks memory and
+jumps once, the rest idle.  The question is scoped to the host + window.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from gpu_doctor.collector import context, db, partitions
+from gpu_doctor.collector.embeddings import to_text
+
+_FILL = """
+INSERT INTO {table} (ts, hostname, gpu_id, pid, util_gpu, util_mem, mem_used_mb, mem_total_mb,
+                     temperature, power_w, run_tag)
+WITH RECURSIVE s(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM s WHERE i + 1 < ?)
+SELECT strftime('%Y-%m-%dT%H:%M:%S+00:00', ? + (i / ?) * 30, 'unixepoch'), 'node01', i % ?,
+       CASE WHEN i % ? = 0 THEN 4242 END, CASE WHEN i % ? = 0 THEN 85 + abs(random()) % 10 ELSE 0 END, 10,
+       CASE WHEN i % ? = 0 THEN 8000 + (i / ?) * 5 + CASE WHEN i / ? > ? THEN 20000 ELSE 0 END ELSE 400 END,
+       81920, 40 + abs(random()) % 3, 80 + abs(random()) % 5, 'run-1'
+FROM s
+"""
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--hours", type=float, default=6)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--budget", type=int, default=context.CONTEXT_TOKENS)
+    args = ap.parse_args()
+
+    ticks = int(args.hours * 120)
+    g = args.gpus
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db._open_conn(Path(tmp) / "bench.db")
+        start = (partitions.today() - 1) * 86400
+        conn.execute(_FILL.format(table=partitions.ensure(conn, start // 86400)),
+                     (ticks * g, start, g, g, g, g, g, g, g, ticks * 2 // 3))
+        conn.commit()
+        since = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(start))
+        rows = conn.execute("SELECT * FROM gpu_log ORDER BY ts DESC").fetchall()
+        hits = [(r["id"], to_text(r)) for r in rows[:args.k]]
+
+        t0 = time.perf_counter()
+        ctx = context.build(conn, hits, host="node01", since=since, budget=args.budget)
+        ms = (time.perf_counter() - t0) * 1000
+        every = "\n".join(to_text(r) for r in rows)
+        raw_k = "\n".join(t for _, t in hits)
+        print(f"{len(rows):,} rows, {g} GPUs, {args.hours:g} h")
+        print(f"{'K=' + str(args.k) + ' raw rows':<16}: ~{context.tokens(raw_k):>8,} tokens  "
+              f"(covers {args.k / g * 30:.0f} s)")
+        print(f"{'all raw rows':<16}: ~{context.tokens(every):>8,} tokens")
+        print(f"{'summary':<16}: ~{ctx.tokens:>8,} tokens  ({ctx.gpus} GPU lines, built in {ms:.1f} ms)")
+        print()
+        print(ctx.text)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
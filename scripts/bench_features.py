@@ -0,0 +1,79 @@
+"""Per-row cost of numeric feature vectors vs. MiniLM text embeddings, and query latency.
+
+    python scripts/bench_features.py --rows 1000000 --minilm 2000
+
+Builds a one-day partition of synthetic rows (200 GPUs polled every 30 s)
+in a temp DB.  The feature build is timed end to end, SQLite fetch
+included.  MiniLM is timed on --minilm rows only, if sentence-transformers
+is installed.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from gpu_doctor.collector import db, features, partitions
+
+_FILL = """
+INSERT INTO {table} (ts, hostname, gpu_id, pid, util_gpu, util_mem, mem_used_mb, mem_total_mb,
+                     proc_mem_mb, temperature, power_w, ecc_errors)
+WITH RECURSIVE s(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM s WHERE i + 1 < ?)
+SELECT strftime('%Y-%m-%dT%H:%M:%S+00:00', ? + (i / 200) * 30, 'unixepoch'), 'node' || (i % 200 / 8),
+       i % 8, 1000 + i % 7, abs(random()) % 101, 40, abs(random()) % 80000, 80000, 20000, 60, 250, 0
+FROM s
+"""
+
+
+def _latency(run, n: int) -> tuple[float, float]:
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        run()
+        lat.append((time.perf_counter() - t0) * 1000)
+    return float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--minilm", type=int, default=2000, help="rows to embed with MiniLM (0 = skip)")
+    ap.add_argument("--queries", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db._open_conn(Path(tmp) / "bench.db")
+        day = partitions.today() - 1
+        conn.execute(_FILL.format(table=partitions.ensure(conn, day)), (args.rows, day * 86400))
+        conn.commit()
+
+        t0 = time.perf_counter()
+        (blk,) = features.blocks(conn)
+        build = time.perf_counter() - t0
+        print(f"features : {args.rows:,} rows in {build:6.2f}s → {build / args.rows * 1e6:6.2f} µs/row"
+              f"  ({(blk.X.nbytes + blk.ids.nbytes) / 2**20:.0f} MB cached)")
+        for label, run in (("similar(oom)", lambda: features.similar(conn, "oom", k=10)),
+                           ("spikes(mem)", lambda: features.spikes(conn, "mem_frac", k=10))):
+            p50, p99 = _latency(run, args.queries)
+            print(f"{label:<13}: p50 {p50:6.1f} ms  p99 {p99:6.1f} ms")
+
+        if args.minilm:
+            try:
+                from gpu_doctor.collector.embeddings import encode_batch, to_text
+                rows = conn.execute("SELECT * FROM gpu_log LIMIT ?", (args.minilm,)).fetchall()
+                texts = [to_text(r) for r in rows]
+                encode_batch(texts[:32])                     # load the model first
+                t0 = time.perf_counter()
+                encode_batch(texts)
+                per = (time.perf_counter() - t0) / len(texts)
+                print(f"MiniLM       : {per * 1e6:9.1f} µs/row ({per / (build / args.rows):,.0f}× features)")
+            except ImportError:
+                print("MiniLM       : sentence-transformers not installed, skipped")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
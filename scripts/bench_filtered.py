@@ -0,0 +1,109 @@
+"""Recall + latency of filtered vector search: post-filtering the unfiltered top-k
+(the old behaviour) vs. pushing host / time / run_tag filters into the search.
+
+    python scripts/bench_filtered.py --rows 200000 --hosts 8 --days 7 --queries 200
+
+Runs on a synthetic multi-host DB with random unit vectors standing in for
+MiniLM embeddings (no model needed).  Ground truth is the exact top-k among
+the rows that match the filter.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+
+def _fill(writer, rows: int, hosts: int, gpus: int, days: int, start: datetime) -> None:
+    ticks = -(-rows // (hosts * gpus))
+    step = days * 86400 / ticks
+    batch = []
+    for tick in range(ticks):
+        ts = (start + timedelta(seconds=tick * step)).isoformat()
+        for h in range(hosts):
+            for g in range(gpus):
+                batch.append({"ts": ts, "hostname": f"gpu{h + 1:02d}", "gpu_id": g,
+                              "util_gpu": (h * 7 + g) % 100, "mem_used_mb": 1000,
+                              "run_tag": f"run-{h}-{int(tick * step // 21600)}"})
+        if len(batch) >= 50_000:
+            writer.put(batch)
+            batch = []
+    writer.put(batch)
+    writer.flush()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--hosts", type=int, default=8)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["GPU_DOC_DB"] = str(Path(tmp) / "bench.db")
+        import faiss
+        from gpu_doctor.collector import db, index_store, retriever
+
+        start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) \
+            - timedelta(days=args.days)
+        writer = db.LogWriter(rollups=False)
+        _fill(writer, args.rows, args.hosts, args.gpus, args.days, start)
+        writer.close()
+
+        conn = retriever._read_conn()
+        ids = np.fromiter((r[0] for r in conn.execute("SELECT id FROM gpu_log ORDER BY id")), dtype="int64")
+        rng = np.random.default_rng(0)
+        vecs = rng.standard_normal((len(ids), args.dim), dtype="float32")
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+        index = faiss.IndexFlatIP(args.dim)
+        index.add(vecs)
+        gen = index_store.Generation(0, index, ids, int(ids[-1]), 0.0)
+        queries = rng.standard_normal((args.queries, args.dim), dtype="float32")
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        day = lambda d: (start + timedelta(days=d)).isoformat()
+        cases = {
+            "host + 1 day": dict(host="gpu01", since=day(args.days - 1), until=day(args.days)),
+            "host": dict(host="gpu02"),
+            "run_tag": dict(run_tag="run-3-4"),
+            "gpu + 6 h": dict(host="gpu04", gpu_id=3, since=day(2), until=(start + timedelta(days=2, hours=6)).isoformat()),
+        }
+        print(f"rows {len(ids):,}  dim {args.dim}  k {args.k}  queries {args.queries}")
+        print(f"{'filter':<14}{'match':>9}  {'post-filter k':>22}  {'post-filter 10×k':>22}  {'pushed down':>22}")
+        for name, f in cases.items():
+            cand = retriever.candidate_ids(**f)
+            pos = gen.positions(cand)
+            truth = [set(ids[pos[np.argsort(-(vecs[pos] @ q))[:args.k]]].tolist()) for q in queries]
+            allowed = set(cand.tolist())
+            cols = []
+            for fetch in (args.k, args.k * 10):
+                t0 = time.perf_counter()
+                got = []
+                for q in queries:
+                    _, hit = gen.search(q, fetch)
+                    got.append([i for i in hit.tolist() if i in allowed][:args.k])
+                ms = (time.perf_counter() - t0) * 1000 / len(queries)
+                cols.append((np.mean([len(set(g) & t) / len(t) for g, t in zip(got, truth)]), ms))
+            t0 = time.perf_counter()
+            got = []
+            for q in queries:
+                _, hit = gen.search(q, args.k, ids=retriever.candidate_ids(**f))
+                got.append(hit.tolist())
+            ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            cols.append((np.mean([len(set(g) & t) / len(t) for g, t in zip(got, truth)]), ms))
+            print(f"{name:<14}{len(cand):>9,}" + "".join(f"  recall {r:5.2f} {m:7.2f} ms" for r, m in cols))
+        conn.close()
+        retriever._local.conn = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Recall@k vs. the flat baseline, build time, memory and p50/p99 latency per index type.
+
+    python scripts/bench_index.py --n 1000000 --specs flat,ivf_flat,ivf_pq,hnsw --nprobe 8,16,64
+
+Vectors are synthetic unit-norm clusters on a low-dimensional manifold
+(the shape MiniLM log embeddings have: many near-duplicate lines around a
+few templates), so no model is needed.  Build uses all cores; queries run
+one at a time on --threads, like an API worker.  Pick the setting per deployment, then export
+GPU_DOC_INDEX / GPU_DOC_NPROBE / GPU_DOC_HNSW_EF accordingly.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from gpu_doctor.collector import index_store
+
+
+def _data(n: int, dim: int, clusters: int, seed: int = 0, latent: int = 24) -> np.ndarray:
+    # clusters in a low-dimensional latent space, lifted to <dim> by a fixed
+    # projection, so neighbours are meaningful rather than ties in noise
+    proj = np.random.default_rng(42).standard_normal((latent, dim), dtype="float32")
+    centers = np.random.default_rng(43).standard_normal((clusters, latent), dtype="float32")
+    rng = np.random.default_rng(seed)
+    z = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, latent), dtype="float32")
+    x = z @ proj + 0.05 * rng.standard_normal((n, dim), dtype="float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _latency(index, queries: np.ndarray, k: int) -> tuple[np.ndarray, float, float]:
+    out, times = [], []
+    params = index_store._search_params(index)
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k, params=params)
+        times.append((time.perf_counter() - t0) * 1000)
+        out.append(ids[0])
+    return np.array(out), float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+
+def main() -> None:
+    import faiss
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--n", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--clusters", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--specs", default="flat,ivf_flat,ivf_pq,hnsw")
+    ap.add_argument("--nprobe", default="16", help="comma list, IVF only")
+    ap.add_argument("--ef", default="64", help="comma list, HNSW only")
+    ap.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads for queries")
+    args = ap.parse_args()
+
+    xb = _data(args.n, args.dim, args.clusters)
+    xq = _data(args.queries, args.dim, args.clusters, seed=1)
+    sample = xb[np.random.default_rng(2).choice(args.n, min(args.n, index_store.TRAIN_ROWS), replace=False)]
+    truth = None
+    build_threads = faiss.omp_get_max_threads()
+    print(f"n {args.n:,}  dim {args.dim}  k {args.k}  queries {args.queries}  threads {args.threads}")
+    print(f"{'index':<22}{'knob':>10}{'build s':>9}{'MB':>9}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for spec in args.specs.split(","):
+        faiss.omp_set_num_threads(build_threads)
+        t0 = time.perf_counter()
+        index = index_store.new_index(args.dim, args.n, spec, train=len(sample))
+        if not index.is_trained:
+            index.train(sample)
+        index.add(xb)
+        build = time.perf_counter() - t0
+        size = faiss.serialize_index(index).nbytes / 2**20
+        faiss.omp_set_num_threads(args.threads)
+
+        knobs = [("", None)]
+        if faiss.try_extract_index_ivf(index) is not None:
+            knobs = [(f"nprobe={v}", ("NPROBE", int(v))) for v in args.nprobe.split(",")]
+        elif isinstance(index, faiss.IndexHNSW):
+            knobs = [(f"ef={v}", ("EF_SEARCH", int(v))) for v in args.ef.split(",")]
+        for label, knob in knobs:
+            if knob:
+                setattr(index_store, *knob)
+            got, p50, p99 = _latency(index, xq, args.k)
+            if truth is None:                        # first spec should be flat
+                truth = got
+            recall = np.mean([len(set(g) & set(t)) / args.k for g, t in zip(got, truth)])
+            name = index_store.factory_string(args.dim, args.n, spec, len(sample))
+            print(f"{name:<22}{label:>10}{build:9.1f}{size:9.0f}{recall:10.3f}{p50:9.2f}{p99:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Sustained rows/sec per node and end-to-end lag of central ingestion.
+
+    python scripts/bench_ingest.py --nodes 4 --rate 2000 --seconds 20
+
+Starts one API server (uvicorn, temp DB) and --nodes stand-in node
+processes.  Each node generates rows stamped with the current time at
+--rate rows/sec (0 = as fast as the shipper drains) and ships them with
+collector.shipper.  Lag = now - newest committed ts of each node, sampled
+from the central DB every 0.25 s; it includes SHIP_SEC batching and the
+writer's FLUSH_SEC group commit, so tune those two for freshness.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _node(i: int, url: str, rate: float, seconds: float, gpus: int, out: "mp.Queue") -> None:
+    from gpu_doctor.collector import shipper
+    node = shipper.Shipper(url, flush_sec=0.5)
+    host, made, t0 = f"node{i:03d}", 0, time.monotonic()
+    while (now := time.monotonic()) - t0 < seconds:
+        if rate:                                   # paced like a poller with many GPUs/processes
+            want = int((now - t0) * rate)
+            if made >= want:
+                time.sleep(0.01)
+                continue
+            n = want - made
+        else:                                      # flat out, but never outrun the buffer
+            if node.stats()["buffered"] > 4 * node.batch_rows:
+                time.sleep(0.001)
+                continue
+            n = node.batch_rows
+        ts = datetime.now(timezone.utc).isoformat()
+        node.put([{"ts": ts, "hostname": host, "gpu_id": (made + j) % gpus, "pid": 1000 + j % 7,
+                   "process_name": "python", "user": "bench", "util_gpu": (made + j) % 100, "util_mem": 40,
+                   "mem_used_mb": 20000 + (made + j) % 4000, "mem_total_mb": 81920, "ecc_errors": 0,
+                   "temperature": 65, "power_w": 300, "run_tag": f"run-{i}"} for j in range(n)])
+        made += n
+    node.close(timeout=30)
+    out.put((host, made, node.stats(), time.monotonic() - t0))
+
+
+def _lag(conn: sqlite3.Connection) -> dict:
+    now = time.time()
+    rows = conn.execute("SELECT hostname, MAX(ts) FROM gpu_log GROUP BY hostname").fetchall()
+    return {h: now - datetime.fromisoformat(ts).timestamp() for h, ts in rows}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--nodes", type=int, default=4)
+    ap.add_argument("--rate", type=float, default=0, help="rows/sec per node (0 = max)")
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--flush-sec", default="0.5", help="server writer GPU_DOC_FLUSH_SEC")
+    ap.add_argument("--queue", type=int, default=64, help="server GPU_DOC_QUEUE_MAX (batches) before 503s")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "central.db"
+        port = _free_port()
+        env = {**os.environ, "GPU_DOC_DB": str(path), "GPU_DOC_WARMUP": "0",
+               "GPU_DOC_FLUSH_SEC": args.flush_sec, "GPU_DOC_FLUSH_ROWS": "8192",
+               "GPU_DOC_QUEUE_MAX": str(args.queue)}
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "gpu_doctor.api:app", "--port", str(port),
+                                   "--log-level", "warning"], env=env)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            import httpx
+            for _ in range(100):
+                try:
+                    httpx.get(f"{url}/ingest", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+
+            out: mp.Queue = mp.Queue()
+            procs = [mp.Process(target=_node, args=(i, url, args.rate, args.seconds, args.gpus, out))
+                     for i in range(args.nodes)]
+            for p in procs:
+                p.start()
+            t0 = time.monotonic()
+            lags, results, stored = [], [], 0
+            while len(results) < len(procs) or stored < sum(r[1] for r in results):
+                time.sleep(0.25)
+                while not out.empty():
+                    results.append(out.get())
+                if time.monotonic() - t0 > args.seconds + 120:
+                    break                                   # writer hopelessly behind
+                if path.exists():
+                    try:
+                        with sqlite3.connect(path, timeout=1) as conn:
+                            if time.monotonic() - t0 < args.seconds:
+                                lags += _lag(conn).values()
+                            stored = conn.execute("SELECT COUNT(*) FROM gpu_log").fetchone()[0]
+                    except sqlite3.Error:
+                        pass            # view being rebuilt for a new partition
+            drained = time.monotonic() - t0
+            for p in procs:
+                p.join()
+            stats = httpx.get(f"{url}/ingest").json()
+        finally:
+            server.terminate()
+            server.wait(10)
+
+    made = sum(r[1] for r in results)
+    print(f"nodes {args.nodes}  rate {args.rate or 'max'}  {args.seconds:.0f} s  server flush {args.flush_sec} s")
+    print(f"{'node':<10}{'rows':>10}{'rows/s':>10}{'sent':>10}{'dropped':>9}{'retries':>9}{'KB/batch':>10}")
+    for host, n, st, dt in sorted(results):
+        kb = st["bytes_sent"] / max(st["batches_sent"], 1) / 1024
+        print(f"{host:<10}{n:>10,}{n / dt:>10,.0f}{st['rows_sent']:>10,}{st['rows_dropped']:>9}"
+              f"{st['failures']:>9}{kb:>10.1f}")
+    print(f"stored {stored:,} of {made:,} rows in {drained:.1f} s = {stored / drained:,.0f} rows/s committed; "
+          f"server batches {stats['batches']}, busy 503s {stats['busy']}; "
+          f"{stats['bytes'] / max(stats['rows'], 1):.1f} wire bytes/row")
+    if lags:
+        print("end-to-end lag s: p50 %.2f  p95 %.2f  max %.2f" % (*np.percentile(lags, [50, 95]), max(lags)))
+
+
+if __name__ == "__main__":
+    main()
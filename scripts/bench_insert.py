@@ -0,0 +1,70 @@
+"""Rows/sec of the old per-call insert path vs. the group-committing LogWriter.
+
+    python scripts/bench_insert.py --cycles 2000 --gpus 8 --procs 4
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from gpu_doctor.collector import db, partitions
+
+
+def _records(cycle: int, gpus: int, procs: int) -> list[dict]:
+    ts = f"2025-10-14T08:{cycle // 60 % 60:02d}:{cycle % 60:02d}+00:00"
+    rows = []
+    for g in range(gpus):
+        for p in range(procs):
+            rows.append({
+                "ts": ts, "hostname": "bench01", "gpu_id": g,
+                "pid": 1000 + p, "process_name": "python", "user": "bench",
+                "util_gpu": (cycle + g) % 100, "util_mem": 50,
+                "mem_used_mb": 1000 + cycle % 4000, "ecc_errors": 0,
+                "temperature": 60, "power_w": 200, "run_tag": f"run-{p}",
+            })
+    return rows
+
+
+def _legacy_insert(records: list[dict]) -> None:
+    """Pre-LogWriter behaviour: connect, check schema, set pragmas, insert, close."""
+    cols = list(records[0].keys())
+    with db.get_conn() as conn:
+        table = partitions.ensure(conn, partitions.day_of(records[0]["ts"]))
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+        conn.executemany(sql, [tuple(r[c] for c in cols) for r in records])
+        conn.commit()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--cycles", type=int, default=2000)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--procs", type=int, default=4)
+    args = ap.parse_args()
+    batches = [_records(c, args.gpus, args.procs) for c in range(args.cycles)]
+    n_rows = sum(len(b) for b in batches)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db._DB_PATH = Path(tmp) / "before.db"
+        t0 = time.perf_counter()
+        for b in batches:
+            _legacy_insert(b)
+        before = n_rows / (time.perf_counter() - t0)
+
+        writer = db.LogWriter(db_path=Path(tmp) / "after.db")
+        t0 = time.perf_counter()
+        for b in batches:
+            writer.put(b)
+        writer.flush()
+        after = n_rows / (time.perf_counter() - t0)
+        writer.close()
+
+    print(f"rows          : {n_rows}")
+    print(f"before (rows/s): {before:,.0f}")
+    print(f"after  (rows/s): {after:,.0f}  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
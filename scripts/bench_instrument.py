@@ -0,0 +1,42 @@
+"""Per-call cost of instrument.timed, enabled vs. disabled vs. bare function.
+
+    python scripts/bench_instrument.py --calls 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from gpu_doctor import instrument
+
+
+def _bare(records: list) -> int:
+    return len(records)
+
+
+def _ns(fn, calls: int, arg: list) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn(arg)
+    return (time.perf_counter() - t0) / calls * 1e9
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--calls", type=int, default=500_000)
+    args = ap.parse_args()
+    wrapped = instrument.timed("bench", rows=0)(_bare)
+    arg = [0] * 32
+    bare = _ns(_bare, args.calls, arg)
+    on = _ns(wrapped, args.calls, arg)
+    instrument.enable(False)
+    off = _ns(wrapped, args.calls, arg)
+    instrument.enable(True)
+    print(f"bare call          {bare:7.0f} ns")
+    print(f"timed, enabled     {on:7.0f} ns  (+{on - bare:.0f} ns per call)")
+    print(f"timed, disabled    {off:7.0f} ns  (+{off - bare:.0f} ns per call)")
+    print(instrument.summary())
+
+
+if __name__ == "__main__":
+    main()
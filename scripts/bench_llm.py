@@ -0,0 +1,90 @@
+"""Throughput + tail latency of the LLM layer against the bundled stub server,
+without and with hedged requests.
+
+    python scripts/bench_llm.py --requests 400 --concurrency 32 --slow-every 20 --hedge-ms 0,600
+
+Starts `python -m gpu_doctor.llm_stub` as a separate process (so server
+time is not shared with the client loop) and sends unique prompts, so
+nothing is coalesced.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from gpu_doctor import llm
+
+
+async def _load(n: int, concurrency: int, tag: str) -> tuple[float, np.ndarray, int]:
+    lat, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await llm.chat(f"{tag} question {i}", "bench")
+                lat.append((time.perf_counter() - t0) * 1000)
+            except Exception:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    await llm.close()
+    return wall, np.array(lat), errors
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--slow-every", type=int, default=20)
+    ap.add_argument("--slow-ms", type=float, default=3000)
+    ap.add_argument("--fail-every", type=int, default=0)
+    ap.add_argument("--hedge-ms", default="0,600", help="comma list; 0 = no hedging")
+    args = ap.parse_args()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "-m", "gpu_doctor.llm_stub", "--port", str(port),
+                               "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                               "--slow-every", str(args.slow_every), "--slow-ms", str(args.slow_ms),
+                               "--fail-every", str(args.fail_every)])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        llm.register("stub", f"http://127.0.0.1:{port}/v1")
+        llm.MODEL, llm.MAX_INFLIGHT = "stub:bench", args.concurrency
+        print(f"{args.requests} requests, concurrency {args.concurrency}, stub {args.latency_ms:g}"
+              f"+U(0,{args.jitter_ms:g}) ms, every {args.slow_every}th +{args.slow_ms:g} ms")
+        print(f"{'hedge':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+              f"{'hedges':>8}{'errors':>8}")
+        for hedge in (float(h) for h in args.hedge_ms.split(",")):
+            llm.HEDGE_MS = hedge
+            hedges = llm.stats()["hedges"]
+            wall, lat, errors = asyncio.run(_load(args.requests, args.concurrency, f"h{hedge}"))
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if lat.size else (0, 0, 0)
+            print(f"{hedge or 'off':>8}{args.requests / wall:9.1f}{p50:9.0f}{p95:9.0f}{p99:9.0f}"
+                  f"{lat.max() if lat.size else 0:9.0f}{llm.stats()['hedges'] - hedges:8}{errors:8}")
+    finally:
+        server.terminate()
+        server.wait(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Parse cost per `nvidia-smi -q -x` snapshot on synthetic XML.
+
+    python scripts/bench_parse.py --gpus 16 --procs 400 --repeat 200
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from gpu_doctor.collector.parsers import parse_nvidia_smi_xml
+from gpu_doctor.collector.synthetic import synthetic_xml
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--procs", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    xml = synthetic_xml(args.gpus, args.procs)
+    rows = parse_nvidia_smi_xml(xml, host="bench")
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        parse_nvidia_smi_xml(xml, host="bench", ts="2025-01-01T00:00:00+00:00")
+    per = (time.perf_counter() - t0) / args.repeat
+
+    print(f"snapshot      : {args.gpus} GPUs, {args.procs} processes, {len(xml) / 1024:.0f} KiB")
+    print(f"rows/snapshot : {len(rows)}")
+    print(f"parse         : {per * 1000:.3f} ms/snapshot  ({len(rows) / per:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Prune time of the old flat gpu_log (DELETE ... WHERE ts < ?) vs. day partitions (DROP TABLE).
+
+    python scripts/bench_prune.py --rows 50000000 --days 8 --keep 7
+
+Both DBs get the same rows spread evenly over <days> UTC days; pruning to
+<keep> days removes the oldest day.  Rows are generated inside SQLite
+(recursive CTE) so building 50M rows stays I/O-bound.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from gpu_doctor.collector import db, partitions
+
+_FLAT = """
+CREATE TABLE gpu_log (
+  id INTEGER PRIMARY KEY, ts DATETIME NOT NULL, hostname TEXT NOT NULL, gpu_id INTEGER NOT NULL,
+  pid INTEGER, process_name TEXT, user TEXT, util_gpu INTEGER, util_mem INTEGER,
+  mem_used_mb INTEGER, mem_total_mb INTEGER, ecc_errors INTEGER, temperature INTEGER,
+  power_w INTEGER, run_tag TEXT, proc_mem_mb INTEGER
+);
+CREATE INDEX idx_ts_gpu  ON gpu_log(ts, gpu_id);
+CREATE INDEX idx_run_tag ON gpu_log(run_tag);
+"""
+
+_FILL = """
+INSERT INTO {table} (ts, hostname, gpu_id, util_gpu, util_mem, mem_used_mb, temperature, power_w, run_tag)
+WITH RECURSIVE s(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM s WHERE i + 1 < ?)
+SELECT strftime('%Y-%m-%dT%H:%M:%S+00:00', ? + i * ?, 'unixepoch'), 'bench01', i % 8,
+       i % 100, 50, 1000 + i % 4000, 60, 200, 'run-' || (i / 100000)
+FROM s
+"""
+
+
+def _build(path: Path, rows: int, days: int, start: int, partitioned: bool) -> float:
+    conn = db._open_conn(path)
+    step = days * 86400 / rows
+    per_day = rows // days
+    t0 = time.perf_counter()
+    if not partitioned:
+        conn.executescript(_FLAT)
+    for d in range(days):
+        lo, hi = d * per_day, rows if d == days - 1 else (d + 1) * per_day
+        table = partitions.ensure(conn, start // 86400 + d) if partitioned else "gpu_log"
+        conn.execute(_FILL.format(table=table), (lo, hi, start, step))
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def _prune(path: Path, start: int, drop_days: int, partitioned: bool) -> tuple[float, int]:
+    conn = db._open_conn(path)
+    cutoff_day = start // 86400 + drop_days
+    t0 = time.perf_counter()
+    if partitioned:
+        partitions.drop_before(conn, cutoff_day)
+    else:
+        cutoff = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(cutoff_day * 86400))
+        conn.execute("DELETE FROM gpu_log WHERE ts < ?", (cutoff,))
+    conn.commit()
+    elapsed = time.perf_counter() - t0
+    wal = path.with_name(path.name + "-wal")
+    wal_bytes = wal.stat().st_size if wal.exists() else 0
+    conn.close()
+    return elapsed, wal_bytes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=50_000_000)
+    ap.add_argument("--days", type=int, default=8)
+    ap.add_argument("--keep", type=int, default=7)
+    ap.add_argument("--dir", help="where to build the DBs (default: a temp dir)")
+    args = ap.parse_args()
+    start = (int(time.time()) // 86400 - args.days) * 86400
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print(f"rows          : {args.rows:,} over {args.days} days, prune to {args.keep}")
+        for label, partitioned in (("flat DELETE", False), ("partition DROP", True)):
+            path = Path(tmp) / f"{label.split()[0]}.db"
+            build = _build(path, args.rows, args.days, start, partitioned)
+            size = path.stat().st_size
+            elapsed, wal = _prune(path, start, args.days - args.keep, partitioned)
+            print(f"{label:<15}: build {build:7.1f}s  db {size / 2**20:8.0f} MB  "
+                  f"prune {elapsed:8.3f}s  wal {wal / 2**20:7.1f} MB")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+""""Current VRAM per GPU" from SQLite vs. the poller's in-memory ring.
+
+    python scripts/bench_ring.py --rows 2000000 --gpus 64 --samples 360
+
+Fills a temp DB with --rows synthetic rows and a Ring with the same
+stream, then times the latest-per-GPU query, ring.latest(), the
+/metrics rendering and one poll cycle's push(), and prints the ring's
+fixed memory footprint.
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from gpu_doctor.collector import db, ring
+
+_LATEST_SQL = ("SELECT hostname, gpu_id, mem_used_mb, MAX(ts) FROM gpu_log "
+               "WHERE ts >= ? GROUP BY hostname, gpu_id")
+
+
+def _cycle(t0: datetime, c: int, gpus: int) -> list[dict]:
+    ts = (t0 + timedelta(seconds=10 * c)).isoformat()
+    return [{"ts": ts, "hostname": f"node{g // 8:02d}", "gpu_id": g % 8, "pid": 1000 + g,
+             "util_gpu": (c + g) % 100, "util_mem": 40, "mem_used_mb": 20000 + (c * 7 + g) % 4000,
+             "mem_total_mb": 81920, "temperature": 65, "power_w": 300, "proc_mem_mb": 19000}
+            for g in range(gpus)]
+
+
+def _ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return float(np.median(times))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--gpus", type=int, default=64)
+    ap.add_argument("--samples", type=int, default=360)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    t0 = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(seconds=10 * args.rows // args.gpus)
+    r = ring.Ring(samples=args.samples, gpus=args.gpus)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ring.db"
+        writer = db.LogWriter(db_path=path, flush_rows=50_000, rollups=False)
+        cycles = args.rows // args.gpus
+        for c in range(cycles):
+            rows = _cycle(t0, c, args.gpus)
+            writer.put(rows)
+            r.push(rows)
+        writer.close(timeout=None)
+
+        since = (t0 + timedelta(seconds=10 * (cycles - args.samples))).isoformat()
+        with sqlite3.connect(path) as conn:
+            sql_ms = _ms(lambda: conn.execute(_LATEST_SQL, (since,)).fetchall(), args.repeat)
+            full_ms = _ms(lambda: conn.execute(_LATEST_SQL, ("",)).fetchall(), max(1, args.repeat // 5))
+
+    last = _cycle(t0, cycles, args.gpus)
+    print(f"rows {args.rows:,}  gpus {args.gpus}  ring samples {args.samples}")
+    print(f"SQLite latest per GPU, ts-bounded   {sql_ms:9.2f} ms")
+    print(f"SQLite latest per GPU, whole table  {full_ms:9.2f} ms")
+    print(f"ring.latest()                       {_ms(r.latest, args.repeat):9.3f} ms")
+    print(f"ring.latest(samples={args.samples})           {_ms(lambda: r.latest(args.samples), args.repeat):9.3f} ms")
+    print(f"ring.openmetrics()                  {_ms(r.openmetrics, args.repeat):9.3f} ms")
+    print(f"ring.push(one cycle)                {_ms(lambda: r.push(last), args.repeat):9.3f} ms")
+    print(f"ring memory                         {r.nbytes / 2**20:9.2f} MB (fixed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Rows stored vs. OOM ramps captured: fixed-rate polling vs. the adaptive scheduler.
+
+    python scripts/bench_scheduler.py --hours 6 --gpus 8 --oom-gpus 1 --cycle-sec 10
+
+Replays a node of collector.synthetic GPUs – --oom-gpus running jobs that
+climb past capacity and get OOM-killed, the rest steady – on a simulated
+clock, so hours run in seconds.  For every OOM kill it counts the samples
+of that GPU each strategy stored in the minute before the kill (ramp
+resolution) and the highest memory reading among them.
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Dict, List, Tuple
+
+from gpu_doctor.collector import scheduler, synthetic
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+    def sleep(self, sec: float) -> None:
+        self.t += sec
+
+
+def _states(args: argparse.Namespace, cycle: int) -> List[Dict]:
+    steady = synthetic.gpu_states(args.gpus, args.procs, cycle, "steady")
+    oom = synthetic.gpu_states(args.gpus, args.procs, cycle, "oom")
+    return [oom[g] if g < args.oom_gpus else steady[g] for g in range(args.gpus)]
+
+
+def _kills(args: argparse.Namespace) -> List[Tuple[int, int]]:
+    """(gpu, cycle) of every OOM kill."""
+    out, before = [], None
+    for c in range(int(args.hours * 3600 // args.cycle_sec)):
+        now = _states(args, c)
+        if before:
+            out += [(g, c) for g in range(args.oom_gpus) if before[g]["procs"] and not now[g]["procs"]]
+        before = now
+    return out
+
+
+def _run(args: argparse.Namespace, base: float, adaptive: bool) -> Tuple[int, List[Tuple[int, float]]]:
+    """(rows stored, per kill: (samples stored in the minute before, highest memory fraction))."""
+    clock = _Clock()
+    s = scheduler.Scheduler(base, adaptive=adaptive, clock=clock, sleep=clock.sleep)
+    stored: List[Tuple[float, dict]] = []
+    while clock.t < args.hours * 3600:
+        states = _states(args, int(clock.t // args.cycle_sec))
+        rows = [dict(zip(synthetic._SEED_COLS, r)) for r in synthetic._rows("node00", 0, str(clock.t), states)]
+        keep, burst, _ = s.observe(rows)
+        stored += [(float(r["ts"]), r) for r in keep + burst]
+        s.wait()
+    out = []
+    for g, c in _kills(args):
+        lo, hi = c * args.cycle_sec - 60, c * args.cycle_sec
+        seen = {t: r["mem_used_mb"] / r["mem_total_mb"] for t, r in stored
+                if r["gpu_id"] == g and lo <= t < hi and r["mem_used_mb"]}
+        out.append((len(seen), max(seen.values(), default=0.0)))
+    return len(stored), out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--hours", type=float, default=6)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--oom-gpus", type=int, default=1)
+    ap.add_argument("--procs", type=int, default=16)
+    ap.add_argument("--cycle-sec", type=float, default=10, help="simulated seconds per synthetic cycle")
+    ap.add_argument("--base", type=float, default=30, help="base poll period (GPU_DOC_POLL_SEC)")
+    args = ap.parse_args()
+
+    kills = _kills(args)
+    print(f"{args.hours:g} h, {args.gpus} GPUs ({args.oom_gpus} OOM-prone), {len(kills)} OOM kills")
+    print(f"{'strategy':<16} {'rows':>9} {'samples/min before kill':>24} {'peak seen':>10}")
+    for label, base, adaptive in ((f"fixed {args.base:g} s", args.base, False),
+                                  (f"fixed {scheduler.POLL_MIN_SEC:g} s", scheduler.POLL_MIN_SEC, False),
+                                  (f"adaptive {args.base:g} s", args.base, True)):
+        rows, kills = _run(args, base, adaptive)
+        n = max(len(kills), 1)
+        print(f"{label:<16} {rows:>9,} {sum(k[0] for k in kills) / n:>24.1f} "
+              f"{sum(k[1] for k in kills) / n:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
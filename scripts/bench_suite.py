@@ -0,0 +1,326 @@
+"""Offline benchmark suite with a JSON baseline and regression thresholds (no GPU needed).
+
+    python scripts/bench_suite.py --profile tiny --out /tmp/bench.json
+    python scripts/bench_suite.py --profile tiny --baseline scripts/bench_baseline.json
+
+Everything runs on collector.synthetic data in a temp dir:
+
+  parse_xml / parse_csv   rows/s through the poller's parsers
+  insert                  rows/s through LogWriter (queue → group commit)
+  seed / prune            seeder rows/s, then drop_before() of the oldest day
+  faiss_*                 index build time and one-at-a-time search p50 / p99
+  detect                  rows/s through the streaming detectors (collector.detect)
+  similar_*               features.similar("oom") p50 / p99 on the seeded DB
+  ask_*                   POST /ask_gpu {"signature": "oom"} p50 / p99
+                          (dummy LLM, answer cache cleared per request)
+  ask_events_*            POST /ask_gpu {"explain": false}: gpu_event only
+
+The result is {"meta": …, "metrics": {name: {value, unit, better}}}.  With
+--baseline every metric is checked against the stored one: a "higher"
+metric regresses when it falls more than its tolerance below the baseline,
+a "lower" one when it rises more than that above.  Exit status 1 on any
+regression.  Baselines are only comparable on the same box and profile.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    #          DB rows     writer rows   vectors     queries  XML procs
+    "tiny":  dict(rows=100_000, insert=50_000, vectors=20_000, queries=200, procs=64, days=3),
+    "small": dict(rows=1_000_000, insert=500_000, vectors=200_000, queries=500, procs=200, days=4),
+    "large": dict(rows=10_000_000, insert=2_000_000, vectors=1_000_000, queries=500, procs=400, days=8),
+}
+HOSTS, GPUS = 4, 8
+DIM = 384
+TOLERANCE = 0.2
+# sub-millisecond figures and tails move more between runs (measured spread
+# of three tiny runs on one shared core: up to ~40 %)
+TOLERANCES = {"parse_csv_rows_s": 0.35, "prune_ms": 0.5, "faiss_search_p50_ms": 0.4,
+              "faiss_search_p99_ms": 0.6, "similar_p50_ms": 0.35, "similar_p99_ms": 0.5,
+              "ask_p50_ms": 0.35, "ask_p99_ms": 0.5, "ask_events_p50_ms": 0.35, "ask_events_p99_ms": 0.5}
+
+
+# ---------- measurements -------------------------------------------------
+def _metric(value: float, unit: str, better: str) -> Dict[str, Any]:
+    return {"value": round(float(value), 4), "unit": unit, "better": better}
+
+
+# Every figure is the best of <rounds>: on a shared box the noise only ever adds time.
+def _latency(fn: Callable[[], Any], n: int, rounds: int = 3) -> tuple[float, float]:
+    """(p50, p99) ms of n calls of fn, best round."""
+    best = (float("inf"), float("inf"))
+    for _ in range(rounds):
+        times = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - t0) * 1000)
+        best = min(best[0], float(np.percentile(times, 50))), min(best[1], float(np.percentile(times, 99)))
+    return best
+
+
+def _rate(fn: Callable[[int], int], min_sec: float = 0.5, rounds: int = 3) -> float:
+    """Rows/s of fn(i) (returns rows handled) over at least min_sec, best round."""
+    best, i = 0.0, 0
+    for _ in range(rounds):
+        rows, t0 = 0, time.perf_counter()
+        while (dt := time.perf_counter() - t0) < min_sec:
+            rows += fn(i)
+            i += 1
+        best = max(best, rows / dt)
+    return best
+
+
+def bench_parse(p: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    from gpu_doctor.collector import parsers, smi_stream, synthetic
+
+    xmls = [synthetic.synthetic_xml(GPUS, p["procs"], c, "mixed") for c in range(16)]
+    fields = list(smi_stream.CSV_COLUMNS)
+    csvs = [synthetic.synthetic_csv(64, fields, c, "mixed").splitlines() for c in range(16)]
+    ts = "2025-01-01T00:00:00+00:00"
+    return {
+        "parse_xml_rows_s": _metric(_rate(lambda i: len(parsers.parse_nvidia_smi_xml(
+            xmls[i % 16], host="bench", ts=ts))), "rows/s", "higher"),
+        "parse_csv_rows_s": _metric(_rate(lambda i: len(smi_stream.csv_rows(
+            csvs[i % 16], fields, host="bench", ts=ts))), "rows/s", "higher"),
+    }
+
+
+def bench_insert(p: Dict[str, Any], tmp: Path) -> Dict[str, Dict[str, Any]]:
+    from datetime import datetime, timezone
+
+    from gpu_doctor.collector import db, synthetic
+
+    cols = synthetic._SEED_COLS
+    t = time.time() - p["insert"] // (HOSTS * p["procs"]) * 30
+    cycles = []
+    while sum(map(len, cycles)) < p["insert"]:
+        ts = datetime.fromtimestamp(t + 30 * len(cycles), timezone.utc).isoformat()
+        rows = [r for h in range(HOSTS)
+                for r in synthetic._rows(f"node{h:02d}", h, ts, synthetic.gpu_states(GPUS, p["procs"], len(cycles)))]
+        cycles.append([dict(zip(cols, r)) for r in rows])
+    n = sum(map(len, cycles))
+    writer = db.LogWriter(db_path=tmp / "insert.db")
+    t0 = time.perf_counter()
+    for rows in cycles:
+        writer.put(rows)
+    writer.close(timeout=None)
+    return {"insert_rows_s": _metric(n / (time.perf_counter() - t0), "rows/s", "higher")}
+
+
+def bench_db(p: Dict[str, Any], path: Path) -> Dict[str, Dict[str, Any]]:
+    """Seed the suite's DB (GPU_DOC_DB), then prune its oldest day."""
+    from gpu_doctor.collector import db, partitions, synthetic
+
+    conn = db._open_conn(path)
+    db._ensure_schema(conn)
+    step = p["days"] * 86400 * HOSTS * p["procs"] / p["rows"]   # spread the rows over <days> days
+    t0 = time.perf_counter()
+    n = synthetic.seed(conn, p["rows"], hosts=HOSTS, gpus=GPUS, procs=p["procs"], step_sec=step)
+    seed_s = time.perf_counter() - t0
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    oldest = partitions.list_partitions(conn)[0][0]
+    t0 = time.perf_counter()
+    with conn:
+        partitions.drop_before(conn, oldest + 1)
+    prune_ms = (time.perf_counter() - t0) * 1000
+    conn.close()
+    return {"seed_rows_s": _metric(n / seed_s, "rows/s", "higher"),
+            "prune_ms": _metric(prune_ms, "ms", "lower")}
+
+
+def bench_detect(p: Dict[str, Any], path: Path) -> Dict[str, Dict[str, Any]]:
+    """Detector rows/s over OOM-prone hosts; the events it fires go to the suite's DB."""
+    from datetime import datetime, timedelta, timezone
+
+    from gpu_doctor.collector import db, detect, synthetic
+
+    t0 = datetime.now(timezone.utc) - timedelta(hours=1)
+    polls = [synthetic.records(GPUS, p["procs"] // 4, c, "oom", f"node{h:02d}",
+                               (t0 + timedelta(seconds=10 * c)).isoformat())
+             for c in range(360) for h in range(HOSTS)]
+    d = detect.Detector()
+    fired = [e for poll in polls for e in d.update(poll)]
+    conn = db._open_conn(path)
+    with conn:
+        conn.executemany(f"INSERT INTO gpu_event ({', '.join(fired[0])}) VALUES ({', '.join('?' * len(fired[0]))})",
+                         [tuple(e.values()) for e in fired])
+    conn.close()
+    d = detect.Detector()
+    return {"detect_rows_s": _metric(_rate(lambda i: d.update(polls[i % len(polls)]) and 0 or
+                                           len(polls[i % len(polls)])), "rows/s", "higher")}
+
+
+def bench_faiss(p: Dict[str, Any], spec: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        from gpu_doctor.collector import index_store
+        index_store._faiss()
+    except ImportError:
+        print("faiss not installed – skipping faiss_*", file=sys.stderr)
+        return {}
+    # clusters on a low-dimensional manifold, like MiniLM log embeddings (see bench_index.py)
+    proj = np.random.default_rng(42).standard_normal((24, DIM), dtype="float32")
+    centers = np.random.default_rng(43).standard_normal((500, 24), dtype="float32")
+
+    def data(n: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        z = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, 24), dtype="float32")
+        x = z @ proj + 0.05 * rng.standard_normal((n, DIM), dtype="float32")
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    xb, xq = data(p["vectors"], 0), data(p["queries"], 1)
+    t0 = time.perf_counter()
+    index = index_store.new_index(DIM, len(xb), spec, train=min(len(xb), index_store.TRAIN_ROWS))
+    if not index.is_trained:
+        index.train(xb[:index_store.TRAIN_ROWS])
+    index.add(xb)
+    build = time.perf_counter() - t0
+    params = index_store._search_params(index)
+    queries = iter(np.tile(xq, (3, 1)))
+    p50, p99 = _latency(lambda: index.search(next(queries).reshape(1, -1), 8, params=params), len(xq))
+    return {"faiss_build_s": _metric(build, "s", "lower"),
+            "faiss_search_p50_ms": _metric(p50, "ms", "lower"),
+            "faiss_search_p99_ms": _metric(p99, "ms", "lower")}
+
+
+def bench_query(p: Dict[str, Any], path: Path) -> Dict[str, Dict[str, Any]]:
+    from fastapi.testclient import TestClient
+
+    from gpu_doctor import api
+    from gpu_doctor.collector import db, features
+
+    conn = db._open_conn(path)
+    features.similar(conn, "oom", k=10)                # build the feature cache first
+    s50, s99 = _latency(lambda: features.similar(conn, "oom", k=10), p["queries"])
+    conn.close()
+
+    client = TestClient(api.app)
+
+    def ask() -> None:
+        api._ANSWERS.clear()
+        client.post("/ask_gpu", json={"signature": "oom"}).raise_for_status()
+
+    ask()
+    a50, a99 = _latency(ask, min(p["queries"], 100))
+    e50, e99 = _latency(lambda: client.post("/ask_gpu", json={"explain": False, "host": "node00"})
+                        .raise_for_status(), min(p["queries"], 100))
+    return {"similar_p50_ms": _metric(s50, "ms", "lower"), "similar_p99_ms": _metric(s99, "ms", "lower"),
+            "ask_p50_ms": _metric(a50, "ms", "lower"), "ask_p99_ms": _metric(a99, "ms", "lower"),
+            "ask_events_p50_ms": _metric(e50, "ms", "lower"), "ask_events_p99_ms": _metric(e99, "ms", "lower")}
+
+
+def _meta(profile: str, spec: str) -> Dict[str, Any]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                         stderr=subprocess.DEVNULL, cwd=Path(__file__).parent).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"profile": profile, **PROFILES[profile], "index": spec, "commit": commit,
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+# ---------- baseline comparison -------------------------------------------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = TOLERANCE,
+            overrides: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """One entry per metric: baseline, current, relative change and ok / regressed / improved / new / missing."""
+    tol = {**TOLERANCES, **(overrides or {})}
+    cur, base = current["metrics"], baseline["metrics"]
+    out = []
+    for name in sorted(set(cur) | set(base)):
+        entry: Dict[str, Any] = {"metric": name, "baseline": base.get(name, {}).get("value"),
+                                 "current": cur.get(name, {}).get("value")}
+        if name not in base or name not in cur:
+            entry["status"] = "new" if name not in base else "missing"
+            out.append(entry)
+            continue
+        b, c = entry["baseline"], entry["current"]
+        change = (c - b) / b if b else 0.0
+        worse = -change if cur[name]["better"] == "higher" else change
+        limit = tol.get(name, tolerance)
+        entry.update(change=change, tolerance=limit,
+                     status="regressed" if worse > limit else "improved" if worse < -limit else "ok")
+        out.append(entry)
+    return out
+
+
+def _report(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}  status"]
+    for r in rows:
+        b = "-" if r["baseline"] is None else f"{r['baseline']:,.3f}"
+        c = "-" if r["current"] is None else f"{r['current']:,.3f}"
+        ch = f"{r['change']:+.0%}" if "change" in r else ""
+        lines.append(f"{r['metric']:<22} {b:>12} {c:>12} {ch:>8}  {r['status']}")
+    return "\n".join(lines)
+
+
+def _overrides(items: List[str]) -> Dict[str, float]:
+    out = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        out[name] = float(value)
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", default="tiny", choices=PROFILES)
+    ap.add_argument("--index", default="ivf_flat", help="index_store spec for faiss_* (flat | ivf_flat | …)")
+    ap.add_argument("--out", type=Path, help="write the result JSON here (default: stdout)")
+    ap.add_argument("--baseline", type=Path, help="compare against this result JSON")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed relative slowdown")
+    ap.add_argument("--tolerance-for", action="append", default=[], metavar="METRIC=FRAC",
+                    help="per-metric tolerance, repeatable")
+    args = ap.parse_args()
+    p = PROFILES[args.profile]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "suite.db"
+        # read at import time by db / retriever / api / llm, so set before importing them
+        os.environ.update(GPU_DOC_DB=str(path), GPU_DOC_WARMUP="0", GPU_DOC_MODEL="dummy",
+                          GPU_DOC_DUMMY_LATENCY_MS="0")
+        metrics: Dict[str, Dict[str, Any]] = {}
+        for label, run in (("parse", lambda: bench_parse(p)),
+                           ("insert", lambda: bench_insert(p, Path(tmp))),
+                           ("seed + prune", lambda: bench_db(p, path)),
+                           ("detect", lambda: bench_detect(p, path)),
+                           ("faiss", lambda: bench_faiss(p, args.index)),
+                           ("similar + ask", lambda: bench_query(p, path))):
+            t0 = time.perf_counter()
+            metrics.update(run())
+            print(f"{label:<14} {time.perf_counter() - t0:6.1f} s", file=sys.stderr)
+
+    result = {"meta": _meta(args.profile, args.index), "metrics": metrics}
+    text = json.dumps(result, indent=2) + "\n"
+    if args.out:
+        args.out.write_text(text)
+    else:
+        sys.stdout.write(text)
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["meta"].get("profile") != args.profile:
+        print(f"baseline is profile {baseline['meta'].get('profile')!r}, not {args.profile!r}", file=sys.stderr)
+        return 2
+    rows = compare(result, baseline, args.tolerance, _overrides(args.tolerance_for))
+    print(_report(rows), file=sys.stderr)
+    return 1 if any(r["status"] == "regressed" for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
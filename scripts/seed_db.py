@@ -0,0 +1,43 @@
+"""Fill a gpu_log DB with synthetic telemetry (1M–50M rows) for benchmarks.
+
+    python scripts/seed_db.py --db /tmp/bench.db --rows 10000000 --hosts 16 --pattern mixed
+
+Rows are whole poll cycles of collector.synthetic (steady / ramp / oom
+patterns, one row per process), spread back in time from now over as many
+UTC day partitions as the row count needs.  Rollups are not built.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from gpu_doctor.collector import db, partitions, synthetic
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--db", type=Path, required=True)
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--hosts", type=int, default=4)
+    ap.add_argument("--gpus", type=int, default=8)
+    ap.add_argument("--procs", type=int, default=16)
+    ap.add_argument("--pattern", default="mixed", choices=synthetic.PATTERNS)
+    ap.add_argument("--step-sec", type=float, default=30.0, help="poll interval between cycles")
+    args = ap.parse_args()
+
+    conn = db._open_conn(args.db)
+    db._ensure_schema(conn)
+    t0 = time.perf_counter()
+    n = synthetic.seed(conn, args.rows, hosts=args.hosts, gpus=args.gpus, procs=args.procs,
+                       pattern=args.pattern, step_sec=args.step_sec)
+    dt = time.perf_counter() - t0
+    days = len(partitions.list_partitions(conn))
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    print(f"{n:,} rows in {days} partitions, {dt:.1f} s ({n / dt:,.0f} rows/s), "
+          f"{args.db.stat().st_size / 2**20:,.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
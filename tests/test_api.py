@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from gpu_doctor import api, llm
+
+_real_retrieve_ctx = api._retrieve_ctx
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(llm, "MODEL", "dummy")
+    monkeypatch.setattr(api, "_retrieve_ctx", lambda q, run_id, **filters: [(1, "row one"), (2, "row two")])
+    api._ANSWERS.clear()
+    return TestClient(api.app)
+
+
+def test_requires_query_or_run(client):
+    assert client.post("/ask_gpu", json={}).status_code == 400
+
+
+def test_answer_cache_keyed_on_question_and_rows(client, monkeypatch):
+    hits0 = api._ANSWERS.hits
+    r1 = client.post("/ask_gpu", json={"query": "Why high VRAM?"})
+    r2 = client.post("/ask_gpu", json={"query": "  why HIGH   vram? "})
+    assert r1.status_code == r2.status_code == 200
+    assert r1.json() == r2.json()
+    assert api._ANSWERS.hits == hits0 + 1
+
+    # new telemetry → different row ids → cache miss
+    monkeypatch.setattr(api, "_retrieve_ctx", lambda q, run_id, **filters: [(3, "row three")])
+    client.post("/ask_gpu", json={"query": "Why high VRAM?"})
+    assert api._ANSWERS.hits == hits0 + 1
+
+
+def test_filters_reach_the_vector_search(client, monkeypatch):
+    seen = {}
+    monkeypatch.setattr(api.retriever, "search_scored",
+                        lambda q, k, **f: seen.update(f) or [(7, 0.9, "row seven")])
+    monkeypatch.setattr(api, "_retrieve_ctx", _real_retrieve_ctx)
+    r = client.post("/ask_gpu", json={"query": "thrashing?", "run_id": "run-42",
+                                      "host": "gpu01", "since": "2025-10-13T00:00:00"})
+    assert r.status_code == 200
+    assert seen == {"host": "gpu01", "since": "2025-10-13T00:00:00", "run_tag": "run-42"}
+
+
+def test_unparsable_bounds_are_a_bad_request(client):
+    for path in ("/ask_gpu", "/ask_gpu/stream"):
+        r = client.post(path, json={"query": "why?", "since": "yesterday"})
+        assert r.status_code == 400 and "yesterday" in r.json()["detail"]
+    assert client.get("/spikes", params={"until": "soon"}).status_code == 400
+
+
+def test_signature_uses_numeric_features_not_the_text_model(client, monkeypatch):
+    seen = {}
+    monkeypatch.setattr(api.retriever, "search_scored", lambda *a, **f: pytest.fail("text search used"))
+    monkeypatch.setattr(api.retriever, "similar_rows",
+                        lambda sig, k, **f: seen.update(sig=sig, **f) or [(9, 0.01, "row nine")])
+    monkeypatch.setattr(api, "_retrieve_ctx", _real_retrieve_ctx)
+    r = client.post("/ask_gpu", json={"signature": "oom", "host": "gpu02"})
+    assert r.status_code == 200
+    assert seen == {"sig": "oom", "host": "gpu02"}
+
+
+def test_prompt_size_and_latency_are_logged(client, caplog):
+    caplog.set_level("INFO")
+    client.post("/ask_gpu", json={"query": "what spiked?"})
+    client.post("/ask_gpu", json={"query": "what spiked?"})
+    msgs = [r.getMessage() for r in caplog.records if r.getMessage().startswith("ask_gpu:")]
+    assert "~4 tokens" in msgs[0] and "llm" in msgs[0] and "total" in msgs[0]
+    assert "answer cache hit" in msgs[1]
+
+
+def test_stats_split_slow_requests_into_retrieval_and_llm(client, monkeypatch):
+    monkeypatch.setattr(llm, "DUMMY_LATENCY_MS", 50)
+    client.get("/stats", params={"reset": True})
+    client.post("/ask_gpu", json={"query": "why slow?"})
+    stats = client.get("/stats").json()
+    assert stats["stages"]["ask_gpu.llm"]["count"] == 1
+    assert stats["stages"]["llm.chat"]["p50_ms"] >= 50
+    assert stats["slowest"][0]["bottleneck"] == "llm"
+
+
+def _burst(queries):
+    async def go():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await asyncio.gather(*(c.post("/ask_gpu", json={"query": q}) for q in queries))
+    return asyncio.run(go())
+
+
+def test_identical_requests_coalesce(client, monkeypatch):
+    monkeypatch.setattr(llm, "DUMMY_LATENCY_MS", 200)
+    calls0, coalesced0 = llm.stats()["calls"], llm.stats()["coalesced"]
+    t0 = time.perf_counter()
+    responses = _burst(["what happened to run-42?"] * 8)
+    assert all(r.status_code == 200 for r in responses)
+    assert llm.stats()["calls"] == calls0 + 1
+    assert llm.stats()["coalesced"] == coalesced0 + 7
+    assert time.perf_counter() - t0 < 1.0          # not 8 × 200 ms
+
+
+def test_llm_concurrency_is_capped(client, monkeypatch):
+    monkeypatch.setattr(llm, "DUMMY_LATENCY_MS", 50)
+    monkeypatch.setattr(llm, "MAX_INFLIGHT", 2)
+    monkeypatch.setitem(llm._STATS, "peak_inflight", 0)
+    responses = _burst([f"question {i}" for i in range(6)])
+    assert all(r.status_code == 200 for r in responses)
+    assert llm.stats()["peak_inflight"] == 2
+
+
+def _events(body):
+    out = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(ln.split(": ", 1) for ln in block.splitlines())
+        out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def test_stream_sends_context_then_tokens_then_done(client):
+    with client.stream("POST", "/ask_gpu/stream", json={"run_id": "run-42"}) as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = _events(r.read().decode())
+    kinds = [k for k, _ in events]
+    assert kinds[0] == "context" and events[0][1]["ids"] == [1, 2]
+    assert kinds[1] == "anomalies"
+    assert kinds[-1] == "done" and kinds.count("token") > 1
+    text = "".join(d["text"] for k, d in events if k == "token")
+    assert json.loads(text)["answer"] == events[-1][1]["answer"]
+
+
+def test_detector_events_answer_without_the_llm(client, monkeypatch):
+    ev = [{"id": 5, "ts": "2025-10-14T08:00:00+00:00", "severity": "crit",
+           "detail": "gpu01 GPU 0: 2 process(es) gone after memory reached 97% (likely OOM)"}]
+    seen = {}
+    monkeypatch.setattr(api.retriever, "events", lambda k, **f: seen.update(f) or ev)
+    monkeypatch.setattr(api.llm, "chat", lambda *a: pytest.fail("LLM called"))
+    r = client.post("/ask_gpu", json={"explain": False, "host": "gpu01", "run_id": "run-42"})
+    assert r.status_code == 200 and seen == {"host": "gpu01", "run_tag": "run-42"}
+    assert r.json()["flagged_anomalies"] == [ev[0]["detail"]] and "1 critical" in r.json()["answer"]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(llm, "MODEL", "dummy")
+    monkeypatch.setattr(api, "_retrieve_ctx", lambda q, run_id, **filters: [(1, "row one")])
+    monkeypatch.setattr(api.retriever, "events", lambda k, **f: ev)
+    r = client.post("/ask_gpu", json={"query": "why did it die?"})
+    assert r.json()["flagged_anomalies"][0] == ev[0]["detail"]       # table first, then the model's
@@ -0,0 +1,65 @@
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from gpu_doctor.collector import context, db
+
+T0 = datetime(2025, 10, 14, 9, 0, tzinfo=timezone.utc)
+
+
+def _db(tmp_path):
+    w = db.LogWriter(db_path=tmp_path / "c.db", flush_sec=60, rollups=False)
+    rows = []
+    for i in range(360):                                     # 3 h every 30 s
+        ts = (T0 + timedelta(seconds=30 * i)).isoformat()
+        mem = 20_000 + 50 * i + (30_000 if i >= 240 else 0)    # leak + a 30 GB jump at 11:00
+        rows.append({"ts": ts, "hostname": "n1", "gpu_id": 0, "pid": 42, "util_gpu": 90,
+                     "mem_used_mb": mem, "mem_total_mb": 81_920, "temperature": 70, "power_w": 300,
+                     "run_tag": "run-7"})
+        for g in range(1, 12):
+            rows.append({"ts": ts, "hostname": "n1", "gpu_id": g, "util_gpu": 0, "mem_used_mb": 500,
+                         "mem_total_mb": 81_920, "temperature": 35, "power_w": 60})
+    w.put(rows)
+    w.flush(5)
+    w.close()
+    conn = sqlite3.connect(tmp_path / "c.db")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_summary_covers_the_whole_run_in_a_fixed_budget(tmp_path):
+    conn = _db(tmp_path)
+    hits = [(r["id"], f"row {r['id']}") for r in conn.execute(
+        "SELECT id FROM gpu_log WHERE run_tag='run-7' ORDER BY ts DESC LIMIT 8")]
+    ctx = context.build(conn, hits, run_tag="run-7")
+    line = ctx.text.splitlines()[1]
+    assert ctx.rows == 360 and ctx.gpus == 1
+    assert line.startswith("n1:0 09:00–11:59 (360 pts)")
+    assert "peak 11:59" in line and "steps 11:00 mem +29.3GB" in line
+    assert float(re.search(r"([+-]\d+) MB/min", line).group(1)) > 100   # leak + jump both push it up
+    assert "runs run-7 pids 42" in line
+    assert ctx.text.splitlines()[-4:] == [h for _, h in hits[:4]]
+
+    # plain question: the hit's GPU over the window around it, busiest GPU first
+    ctx = context.build(conn, hits[:1], budget=120)
+    assert ctx.gpus == 1 and ctx.rows == 121               # last hit − 1 h … its end of series
+    whole_host = context.build(conn, [], host="n1", since=T0.isoformat(), budget=150)
+    assert whole_host.text.splitlines()[1].startswith("n1:0 ")
+    assert whole_host.text.splitlines()[2].endswith("n1:1,2,3,4,5,6,7,8,9,10,11")   # idle GPUs share a line
+    assert whole_host.tokens <= 150
+    conn.close()
+
+
+def test_truncated_series_keeps_the_newest_rows(tmp_path, monkeypatch):
+    conn = _db(tmp_path)
+    monkeypatch.setattr(context, "MAX_ROWS", 100)
+    ctx = context.build(conn, [], run_tag="run-7")
+    assert ctx.rows == 100 and "(truncated)" in ctx.text
+    assert ctx.text.splitlines()[1].startswith("n1:0 11:10–11:59 (100 pts)")
+
+    # an explicit until is kept for a plain question, not replaced by the hit window
+    hits = [(r["id"], "") for r in conn.execute("SELECT id FROM gpu_log WHERE run_tag='run-7' "
+                                                "AND ts = ?", ((T0 + timedelta(hours=2)).isoformat(),))]
+    ctx = context.build(conn, hits, until=(T0 + timedelta(hours=1, minutes=30)).isoformat())
+    assert "–10:29 (60 pts)" in ctx.text.splitlines()[1]      # 10:00 … 10:29:30
+    conn.close()
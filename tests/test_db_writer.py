@@ -0,0 +1,58 @@
+import sqlite3
+
+from gpu_doctor.collector import db
+
+sample = {
+    "ts": "2025-10-14T08:00:00Z", "hostname": "gpu01", "gpu_id": 0,
+    "pid": 1234, "process_name": "python", "user": "mira",
+    "util_gpu": 97, "util_mem": 88, "mem_used_mb": 22000, "ecc_errors": 0,
+    "temperature": 69, "power_w": 240, "run_tag": "run-42",
+}
+
+
+def _count(path):
+    with sqlite3.connect(path) as c:
+        return c.execute("SELECT COUNT(*) FROM gpu_log").fetchone()[0]
+
+
+def test_group_commit(tmp_path):
+    path = tmp_path / "w.db"
+    w = db.LogWriter(db_path=path, flush_rows=1000, flush_sec=60)
+    for _ in range(10):
+        w.put([dict(sample)] * 3)
+    assert w.flush(5)
+    assert _count(path) == 30
+    w.close()
+
+
+def test_spills_while_locked(tmp_path):
+    path = tmp_path / "w.db"
+    w = db.LogWriter(db_path=path, flush_sec=60, busy_sec=0.05)
+    w.put([dict(sample)])
+    w.flush(5)
+
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    w.put([dict(sample)] * 2)
+    w.flush(5)
+    assert w.spill_path.exists() and w.rows_spilled == 2
+    blocker.rollback()
+    blocker.close()
+
+    w.put([dict(sample)])
+    w.flush(5)
+    assert not w.spill_path.exists()
+    assert _count(path) == 4
+    w.close()
+
+
+def test_bad_records_are_skipped_not_the_batch(tmp_path):
+    path = tmp_path / "w.db"
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    no_ts = {k: v for k, v in sample.items() if k != "ts"}
+    no_host = {k: v for k, v in sample.items() if k != "hostname"}
+    w.put([dict(sample), no_ts, {**sample, "ts": "yesterday"}, {**sample, "util_gpu": {"x": 1}},
+           no_host, dict(sample)])
+    assert w.flush(5)
+    assert _count(path) == 2 and w.rows_written == 2 and w.rows_bad == 4
+    w.close()
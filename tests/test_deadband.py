@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+from gpu_doctor.collector.deadband import Deadband, reconstruct
+
+T0 = datetime(2025, 10, 14, 8, 0, tzinfo=timezone.utc)
+
+
+def _snap(sec, util=0, pids=(None,)):
+    ts = (T0 + timedelta(seconds=sec)).isoformat()
+    return [{"ts": ts, "hostname": "h", "gpu_id": 0, "pid": p, "util_gpu": util,
+             "mem_used_mb": 500, "temperature": 40} for p in pids]
+
+
+def test_idle_gpu_writes_only_heartbeats():
+    band = Deadband(heartbeat_sec=300)
+    written = [r for s in range(0, 900, 30) for r in band.filter(_snap(s, util=s % 2))]
+    assert [r["ts"][11:19] for r in written] == ["08:00:00", "08:05:00", "08:10:00"]
+    assert (band.rows_seen, band.rows_written) == (30, 3)
+
+
+def test_metric_or_process_change_is_written_immediately():
+    band = Deadband(heartbeat_sec=300)
+    assert band.filter(_snap(0))
+    assert not band.filter(_snap(30, util=5))         # within the 5 % band
+    assert band.filter(_snap(60, util=6))             # beyond it
+    assert not band.filter(_snap(90, util=3))         # vs last *written* (6)
+    assert len(band.filter(_snap(120, util=3, pids=(1, 2)))) == 2
+
+
+def test_reconstruct_fills_steps_and_stops_after_max_hold():
+    rows = _snap(0, util=10) + _snap(90, util=80)
+    grid = reconstruct(rows, 30, end=(T0 + timedelta(seconds=300)).isoformat(), max_hold=120)
+    assert [r["util_gpu"] for r in grid] == [10, 10, 10, 80, 80, 80, 80, 80]
+    assert grid[1]["ts"] == (T0 + timedelta(seconds=30)).isoformat()
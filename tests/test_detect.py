@@ -0,0 +1,65 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from gpu_doctor.collector import db, detect, retriever
+
+T0 = datetime(2025, 10, 14, 8, 0, tzinfo=timezone.utc)
+
+
+def _row(sec, used=20000, util=50, temp=60, power=300, pid=1234, gpu=0, tag="run-42"):
+    return {"ts": (T0 + timedelta(seconds=sec)).isoformat(), "hostname": "gpu01", "gpu_id": gpu,
+            "pid": pid, "util_gpu": util, "mem_used_mb": used, "mem_total_mb": 80000,
+            "temperature": temp, "power_w": power, "run_tag": tag}
+
+
+def test_zscore_fires_after_warmup_on_a_real_jump_only():
+    d = detect.Detector()
+    for i in range(detect.WARMUP + 10):
+        assert d.update([_row(30 * i, util=48 + 4 * (i % 2))]) == []     # ±2 % noise
+    (e,) = d.update([_row(30 * 40, util=95)])
+    assert e["event"] == "util_zscore" and e["severity"] == "warn" and e["score"] > detect.Z_THRESHOLD
+    assert e["detail"].startswith("gpu01 GPU 0: util 95%")
+
+
+def test_memory_slope_warns_then_escalates_once():
+    d = detect.Detector()
+    fired = []
+    for i in range(19):                                   # +200 MiB/s towards 80 GB
+        fired += [(e["event"], e["severity"]) for e in d.update([_row(10 * i, used=40000 + 2000 * i)])
+                  if e["event"] == "mem_capacity"]
+    assert fired == [("mem_capacity", "warn"), ("mem_capacity", "crit")]   # cooldown holds repeats
+
+
+def test_oom_kill_is_tagged_with_the_killed_run():
+    d = detect.Detector()
+    d.update([_row(0, used=76000), _row(0, used=76000, pid=99)])
+    (e,) = d.update([_row(30, used=500, pid=None, tag=None)])
+    assert e["event"] == "oom_kill" and e["severity"] == "crit" and e["run_tag"] == "run-42"
+    assert "2 process(es) gone" in e["detail"]
+
+
+def test_thermal_cooldown_unless_more_severe():
+    d = detect.Detector()
+    seen = [[e["severity"] for e in d.update([_row(t, temp=c)])]
+            for t, c in ((0, 85), (30, 86), (60, 91), (90, 92), (90 + detect.COOLDOWN_SEC, 85))]
+    assert seen == [["warn"], [], ["crit"], [], ["warn"]]
+
+
+def test_events_land_in_gpu_event_and_filter(tmp_path, monkeypatch):
+    path = tmp_path / "ev.db"
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    d = detect.Detector()
+    rows = [_row(0, temp=85), _row(0, temp=91, gpu=1, tag="run-7")]
+    w.put(rows + d.feed(rows))
+    assert w.flush(5)
+    w.close()
+    monkeypatch.setattr(retriever, "_DB", path)
+    monkeypatch.setattr(retriever, "_local", threading.local())
+
+    assert [e["gpu_id"] for e in retriever.events()] == [1, 0]          # newest first
+    (crit,) = retriever.events(severity="crit")
+    assert crit["run_tag"] == "run-7" and crit["event"] == "thermal"
+    assert [e["gpu_id"] for e in retriever.events(host="gpu01", gpu_id=0)] == [0]
+    assert retriever.events(since=(T0 + timedelta(minutes=1)).isoformat()) == []
+    assert len(retriever.events(since="2025-10-14T09:59:00+02:00")) == 2   # 07:59 UTC
+    assert retriever.events(until="2025-10-14T08:00:00Z") == []
@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from gpu_doctor.collector import db, embeddings, index_store, partitions, retriever
+
+DIM = 8
+
+
+class StubModel:
+    """Deterministic stand-in for MiniLM: one pseudo-random unit vector per text."""
+
+    def __init__(self):
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True):
+        if isinstance(texts, str):                          # a query
+            return self.encode([texts])[0]
+        out = []
+        for lo in range(0, len(texts), batch_size):         # one forward pass per batch
+            self.batches.append(len(texts[lo:lo + batch_size]))
+            out += [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM)
+                    for t in texts[lo:lo + batch_size]]
+        v = np.stack(out)
+        return (v / np.linalg.norm(v, axis=1, keepdims=True)).astype("float32")
+
+    def encode_multi_process(self, texts, pool, batch_size=32):
+        pool["calls"] += 1
+        return self.encode(texts, batch_size) * 3           # unnormalised, like the real pool
+
+    def start_multi_process_pool(self, devices):
+        return {"workers": len(devices), "calls": 0}
+
+    def stop_multi_process_pool(self, pool):
+        pool["stopped"] = True
+
+
+def _row(ts, i):
+    return {"ts": ts, "hostname": "h", "gpu_id": i % 4, "util_gpu": i % 100, "mem_used_mb": 1000 + i,
+            "run_tag": "run-1"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "e.db"
+    with sqlite3.connect(path) as conn:                     # pre-partition table → gpu_log_legacy
+        conn.execute("CREATE TABLE gpu_log (id INTEGER PRIMARY KEY, ts DATETIME NOT NULL, "
+                     "hostname TEXT NOT NULL, gpu_id INTEGER NOT NULL, pid INTEGER, process_name TEXT, "
+                     "user TEXT, util_gpu INTEGER, util_mem INTEGER, mem_used_mb INTEGER, "
+                     "ecc_errors INTEGER, temperature INTEGER, power_w INTEGER, run_tag TEXT)")
+        conn.executemany("INSERT INTO gpu_log (ts, hostname, gpu_id, util_gpu) VALUES (?, 'h', 0, ?)",
+                         [("2025-01-01T00:00:00Z" if i < 5 else "2025-10-14T00:00:00Z", i) for i in range(10)])
+    writer = db.LogWriter(db_path=path, flush_sec=60)
+    monkeypatch.setattr(embeddings, "_DB", path)
+    monkeypatch.setattr(embeddings, "_MODEL", StubModel())
+    monkeypatch.setattr(index_store, "MANIFEST", tmp_path / "e.index.json")
+
+    def put(ts, n, start=0):
+        writer.put([_row(ts, start + i) for i in range(n)])
+        assert writer.flush(5)
+
+    put("2025-10-13T12:00:00+00:00", 20)
+    put("2025-10-14T12:00:00+00:00", 20)
+    yield path, put
+    writer.close()
+
+
+def _indexed():
+    gen = index_store.open_generation()
+    return sorted(int(i) for i in gen.ids)
+
+
+def _ids(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(r[0] for r in conn.execute("SELECT id FROM gpu_log"))
+
+
+def test_incremental_build_appends_only_new_rows(store):
+    path, put = store
+    assert embeddings.build_faiss(incremental=True) == 50   # nothing published yet → full build
+    man = index_store.read_manifest()
+    assert man["generation"] == 1 and man["spec"] == "flat" and man["last_id"] == max(_ids(path))
+    assert _indexed() == _ids(path)
+
+    assert embeddings.build_faiss(incremental=True) == 0
+    assert index_store.read_manifest()["generation"] == 1  # nothing changed → nothing published
+
+    put("2025-10-14T13:00:00+00:00", 5, start=20)
+    assert embeddings.build_faiss(incremental=True) == 5
+    assert index_store.read_manifest()["generation"] == 2 and _indexed() == _ids(path)
+
+
+def test_pruned_partitions_and_trimmed_legacy_rows_leave_the_index(store):
+    path, _ = store
+    embeddings.build_faiss(incremental=True)
+    with sqlite3.connect(path) as conn:
+        dropped = partitions.drop_before(conn, partitions.day_of("2025-10-14T00:00:00"))
+    assert dropped == ["gpu_log_20251013"]                  # + the 5 old legacy rows deleted
+    assert embeddings.build_faiss(incremental=True) == 0
+    assert _indexed() == _ids(path) and len(_ids(path)) == 25
+    assert index_store.read_manifest()["generation"] == 2
+
+    assert embeddings.build_faiss(incremental=False) == 25  # --full: re-encode everything live
+    assert index_store.read_manifest()["generation"] == 3 and _indexed() == _ids(path)
+
+
+def test_outgrown_training_sample_triggers_a_retrain(store, monkeypatch):
+    path, put = store
+    monkeypatch.setattr(embeddings, "MIN_TRAIN_ROWS", 10)
+    monkeypatch.setattr(index_store, "TRAIN_ROWS", 15)
+    monkeypatch.setattr(index_store, "IVF_NLIST", 2)
+    assert embeddings.build_faiss(incremental=True, spec="ivf_flat") == 50
+    man = index_store.read_manifest()
+    assert man["spec"] == "ivf_flat" and man["trained_on"] == 15
+
+    put("2025-10-14T13:00:00+00:00", 5, start=20)           # 55 ≤ 4 × 15: append
+    assert embeddings.build_faiss(incremental=True, spec="ivf_flat") == 5
+    put("2025-10-14T14:00:00+00:00", 30, start=25)          # 85 > 4 × 15: retrain, re-encode all
+    assert embeddings.build_faiss(incremental=True, spec="ivf_flat") == 85
+    assert _indexed() == _ids(path)
+
+
+def test_pruning_an_ivf_index_rebuilds_instead_of_removing(store, monkeypatch):
+    path, _ = store
+    monkeypatch.setattr(embeddings, "MIN_TRAIN_ROWS", 10)
+    monkeypatch.setattr(index_store, "TRAIN_ROWS", 15)
+    monkeypatch.setattr(index_store, "IVF_NLIST", 2)
+    embeddings.build_faiss(incremental=True, spec="ivf_flat")
+    with sqlite3.connect(path) as conn:
+        partitions.drop_before(conn, partitions.day_of("2025-10-14T00:00:00"))
+    assert embeddings.build_faiss(incremental=True, spec="ivf_flat") == 25   # rebuilt, not remove_ids
+    assert _indexed() == _ids(path)
+
+    scores, ids = index_store.open_generation().search(StubModel().encode("probe"), 100)
+    assert len(ids) == 25 and sorted(int(i) for i in ids) == _ids(path)
+
+
+def test_search_ranks_a_real_generation_and_caches_row_texts(store, monkeypatch):
+    path, _ = store
+    embeddings.build_faiss()
+    for name, value in (("_DB", path), ("_local", threading.local()), ("_FAISS_BACKEND", True),
+                        ("_GEN", None), ("_GEN_STAMP", None), ("_TEXTS", OrderedDict())):
+        monkeypatch.setattr(retriever, name, value)
+    retriever._query_vec.cache_clear()
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        target = conn.execute("SELECT * FROM gpu_log_20251013 WHERE gpu_id = 2 LIMIT 1").fetchone()
+
+    hits = retriever.search_scored(embeddings.to_text(target), k=100)     # k > ntotal
+    assert len(hits) == 50 and all(i >= 0 for i, _, _ in hits)           # no -1 padding leaks
+    assert hits[0][0] == target["id"] and abs(hits[0][1] - 1) < 1e-5
+    assert [d for _, d, _ in hits] == sorted((d for _, d, _ in hits), reverse=True)
+    assert all(text == retriever._TEXTS[i] for i, _, text in hits)      # texts follow their ids
+
+    filtered = retriever.search_scored(embeddings.to_text(target), k=5, gpu_id=2)
+    assert len(filtered) == 5 and filtered[0][0] == target["id"]
+    assert all(" gpu=2 " in text for _, _, text in filtered)
+
+    monkeypatch.setattr(retriever.partitions, "rows_by_id", lambda *a: pytest.fail("row cache missed"))
+    assert retriever.search_scored(embeddings.to_text(target), k=100) == hits
+    assert retriever.cache_stats()["query_vec"]["hits"] >= 2
+
+
+def test_backend_switches_to_faiss_once_a_generation_is_published(store, monkeypatch):
+    monkeypatch.setattr(retriever, "_FAISS_BACKEND", False)
+    assert not retriever._use_faiss()                       # no manifest yet: not cached
+    embeddings.build_faiss()
+    assert retriever._use_faiss()
+    index_store.MANIFEST.unlink()
+    assert retriever._use_faiss()                           # the positive answer sticks
+
+
+def test_batches_and_pool_keep_input_order(monkeypatch):
+    stub = StubModel()
+    monkeypatch.setattr(embeddings, "_MODEL", stub)
+    texts = [f"row {i}" for i in range(10)]
+    one_by_one = np.stack([stub.encode(t) for t in texts])
+    stub.batches.clear()
+    assert np.allclose(embeddings.encode_batch(texts, batch_size=4), one_by_one)
+    assert stub.batches == [4, 4, 2]
+
+    with embeddings.encoder_pool(1) as pool:
+        assert pool is None
+    with embeddings.encoder_pool(3) as pool:
+        vecs = embeddings.encode_batch(texts, pool, batch_size=4)
+    assert pool["workers"] == 3 and pool["calls"] == 1 and pool["stopped"]
+    assert np.allclose(vecs, one_by_one)                  # renormalised, same order
+
+
+def test_backfill_pages_visit_every_row_once(store, monkeypatch):
+    path, _ = store
+    stub = embeddings._MODEL
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        conn.execute("UPDATE gpu_log_20251014 SET embedding = '[]' WHERE id IN "
+                     "(SELECT id FROM gpu_log_20251014 ORDER BY id LIMIT 3)")        # already done
+        stub.batches.clear()
+        assert embeddings._backfill(conn, "gpu_log_20251014", None, 64, page=5) == 17
+        assert stub.batches == [5, 5, 5, 2]
+        rows = conn.execute("SELECT * FROM gpu_log_20251014 ORDER BY id").fetchall()
+        assert [r["embedding"] for r in rows[:3]] == ["[]"] * 3
+        for r in rows[3:]:
+            assert np.allclose(json.loads(r["embedding"]), stub.encode(embeddings.to_text(r)))
+        assert embeddings._backfill(conn, "gpu_log_20251014", None, 64, page=5) == 0
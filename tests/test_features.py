@@ -0,0 +1,51 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from gpu_doctor.collector import db, features
+
+T0 = datetime(2025, 10, 13, 23, 58, tzinfo=timezone.utc)
+
+
+def _snap(i, host, mem, pids=(None,)):
+    ts = (T0 + timedelta(seconds=30 * i)).isoformat()
+    return [{"ts": ts, "hostname": host, "gpu_id": 0, "pid": p, "util_gpu": 90, "mem_used_mb": mem,
+             "mem_total_mb": 80_000, "temperature": 60, "power_w": 300} for p in pids]
+
+
+def _conn(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_spikes_and_signatures_span_partitions_and_follow_appends(tmp_path):
+    features.clear()
+    path = tmp_path / "f.db"
+    w = db.LogWriter(db_path=path, flush_sec=60, rollups=False)
+    # 23:58 … 00:03 → two day partitions; h1 jumps 40 → 79 GB right after midnight
+    w.put([r for i in range(10) for r in _snap(i, "h1", 40_000 if i < 5 else 79_000, pids=(1, 2))])
+    w.put([r for i in range(10) for r in _snap(i, "h2", 10_000 + 100 * i)])
+    w.flush(5)
+    conn = _conn(path)
+    rows = {r["id"]: dict(r) for r in conn.execute("SELECT * FROM gpu_log")}
+
+    hits = features.spikes(conn, "mem_frac", k=3)
+    top = rows[hits[0][0]]
+    assert (top["hostname"], top["ts"][11:19], top["pid"]) == ("h1", "00:00:30", 1)
+    assert abs(hits[0][1] - 39_000 / 80_000) < 1e-6      # delta chained across the day boundary
+    assert all(rows[i]["hostname"] == "h2" for i, _ in hits[1:])   # one row per snapshot
+
+    near_full = [rows[i] for i, _ in features.similar(conn, "oom", k=4)]
+    assert all(r["hostname"] == "h1" and r["mem_used_mb"] == 79_000 for r in near_full)
+    h2 = np.array(sorted(i for i, r in rows.items() if r["hostname"] == "h2"))
+    assert all(rows[i]["hostname"] == "h2" for i, _ in features.similar(conn, "oom", k=3, ids=h2))
+    assert features.similar(conn, h2[0], k=1)[0] == (h2[0], 0.0)
+
+    w.put(_snap(10, "h2", 78_000))                       # appended incrementally
+    w.flush(5)
+    hits = features.spikes(conn, "mem_frac", k=1)
+    assert hits[0][1] > 0.8 and features.similar(conn, {"mem_frac": 78_000 / 80_000}, k=1)[0][1] < 1e-9
+    conn.close()
+    w.close()
@@ -0,0 +1,38 @@
+"""Startup guard: importing gpu_doctor must stay cheap and must not pull in
+the embedding model, FAISS or the OpenAI SDK (those load lazily / on warm-up).
+
+Set GPU_DOC_IMPORT_BUDGET_MS to tighten or relax the budget on slow CI boxes.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+MODULES = ["gpu_doctor.api", "gpu_doctor.collector.poller", "gpu_doctor.cli"]
+HEAVY = ["torch", "sentence_transformers", "faiss", "openai"]
+BUDGET_MS = float(os.getenv("GPU_DOC_IMPORT_BUDGET_MS", 2000))
+
+
+def _importtime(module):
+    """{module: (self_us, cumulative_us)} from `python -X importtime`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    out = {}
+    for ln in proc.stderr.splitlines():
+        if not ln.startswith("import time:") or "self [us]" in ln:
+            continue
+        self_us, cum_us, name = ln[len("import time:"):].split("|")
+        out[name.strip()] = (int(self_us), int(cum_us))
+    return out
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_is_lazy_and_fast(module):
+    times = _importtime(module)
+    assert not [m for m in HEAVY if m in times], "heavy dependency imported eagerly"
+    assert times[module][1] / 1000 < BUDGET_MS
+    own_ms = sum(s for name, (s, _) in times.items() if name.startswith("gpu_doctor")) / 1000
+    assert own_ms < 100, f"gpu_doctor modules spend {own_ms:.1f} ms at import"
@@ -0,0 +1,63 @@
+import faiss
+import numpy as np
+
+from gpu_doctor.collector import index_store
+
+
+def _vecs(n, d=8, seed=0):
+    v = np.random.default_rng(seed).random((n, d), dtype="float32")
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_publish_and_mmap_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "MANIFEST", tmp_path / "t.index.json")
+    assert index_store.open_generation() is None
+
+    idx, meta = index_store.load_for_update(8)
+    assert meta == {}
+    idx.add_with_ids(_vecs(10), np.arange(100, 110, dtype="int64"))
+    assert index_store.publish(idx, last_id=109) == 1
+
+    gen = index_store.open_generation()
+    assert gen.ntotal == 10 and isinstance(gen.ids, np.memmap)
+    scores, ids = gen.search(_vecs(10)[3], k=20)      # k > ntotal → no -1 leaks
+    assert ids[0] == 103 and len(ids) == 10
+
+    # next generation: prune the first three rows, append two
+    idx, meta = index_store.load_for_update(8)
+    assert meta["last_id"] == 109
+    idx.remove_ids(faiss.IDSelectorRange(0, 103))
+    idx.add_with_ids(_vecs(2, seed=1), np.array([110, 111], dtype="int64"))
+    assert index_store.publish(idx, last_id=111) == 2
+
+    new = index_store.open_generation()
+    assert new.number == 2 and list(new.ids) == list(range(103, 112))
+    assert gen.search(_vecs(10)[3], k=1)[1][0] == 103  # old handle still usable
+
+
+def test_search_restricted_to_ids_even_out_of_order():
+    vecs = _vecs(6)
+    flat = faiss.IndexFlatIP(8)
+    flat.add(vecs)
+    ids = np.array([10, 11, 12, 5, 13, 14], dtype="int64")   # late row appended at position 3
+    gen = index_store.Generation(1, flat, ids, 14, 0.0)
+    assert list(gen.positions(np.array([5, 13, 99]))) == [3, 4]
+    _, hits = gen.search(vecs[0], k=3, ids=np.array([5, 13, 99]))
+    assert sorted(hits) == [5, 13]                      # row 10 itself is filtered out
+    assert len(gen.search(vecs[0], k=3, ids=np.array([99]))[1]) == 0
+
+
+def test_ivf_and_hnsw_presets_honour_filters():
+    assert index_store.factory_string(384, 10_000, "ivf_pq", train=10_000) == "IVF256,PQ48x8"
+    assert index_store.factory_string(8, 10, "IVF4,Flat") == "IVF4,Flat"   # raw factory strings pass through
+    vecs = _vecs(2000)
+    ids = np.arange(1000, 3000, dtype="int64")
+    for spec in ("ivf_flat", "hnsw"):
+        index = index_store.new_index(8, len(vecs), spec, train=len(vecs))
+        index.train(vecs)
+        index.add(vecs)
+        gen = index_store.Generation(1, index, ids, 2999, 0.0)
+        assert gen.search(vecs[7], k=1)[1][0] == 1007
+        _, hits = gen.search(vecs[7], k=4, ids=np.array([1500, 2500, 2999]))
+        assert sorted(hits) == [1500, 2500, 2999]     # selective filter still fills k
+    assert not index_store.can_remove(index)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+from gpu_doctor import instrument
+
+
+def test_histogram_percentiles_and_rows():
+    instrument.reset()
+
+    @instrument.timed("t.insert", rows=0)
+    def insert(records):
+        return None
+
+    for _ in range(99):
+        instrument.observe("t.fast", 0.001)
+    instrument.observe("t.fast", 0.5)
+    insert([1, 2, 3])
+    insert([4])
+
+    snap = instrument.snapshot()
+    fast = snap["t.fast"]
+    assert fast["count"] == 100
+    assert 0.9 <= fast["p50_ms"] <= 1.13 and 0.9 <= fast["p95_ms"] <= 1.13
+    assert fast["p99_ms"] <= 1.13 and fast["max_ms"] == 500
+    assert snap["t.insert"]["count"] == 2 and snap["t.insert"]["rows"] == 4
+    assert "t.fast" in instrument.summary()
+
+
+def test_disabled_wrappers_record_nothing_and_async_is_timed():
+    instrument.reset()
+
+    @instrument.timed("t.chat", rows="result")
+    async def chat():
+        await asyncio.sleep(0.01)
+        return "abc"
+
+    instrument.enable(False)
+    try:
+        asyncio.run(chat())
+        assert instrument.snapshot() == {}
+    finally:
+        instrument.enable(True)
+    assert asyncio.run(chat()) == "abc"
+    s = instrument.snapshot()["t.chat"]
+    assert s["rows"] == 3 and s["p50_ms"] >= 10
+
+
+def test_sampling_profiler_sees_worker_threads():
+    def busy_worker_loop():
+        end = time.perf_counter() + 0.3
+        while time.perf_counter() < end:
+            sum(range(1000))
+
+    instrument.profile_start("sample")
+    t = threading.Thread(target=busy_worker_loop)
+    t.start()
+    t.join()
+    report = instrument.profile_stop()
+    assert "busy_worker_loop" in report and instrument.profiling() is None
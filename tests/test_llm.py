@@ -0,0 +1,81 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from gpu_doctor import llm, llm_stub
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(llm_stub.app, host="127.0.0.1", port=port, log_level="warning",
+                                          timeout_graceful_shutdown=0.1))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def stub(stub_url, monkeypatch):
+    monkeypatch.setattr(llm, "MODEL", "stub:test")
+    monkeypatch.setitem(llm.BACKENDS, "stub", llm.Backend(stub_url))
+    monkeypatch.setattr(llm, "HEDGE_MS", 0)
+    monkeypatch.setattr(llm_stub, "CONFIG", {"latency_ms": 20, "jitter_ms": 0, "slow_every": 0,
+                                             "slow_ms": 0, "fail_every": 0})
+    llm_stub.reset()
+    return llm_stub.CONFIG
+
+
+def _run(coro_fn, *args):
+    async def go():
+        try:
+            return await coro_fn(*args)
+        finally:
+            await llm.close()
+    return asyncio.run(go())
+
+
+def test_chat_and_stream_over_pooled_http(stub):
+    assert _run(llm.chat, "p1", "sys") == llm.DUMMY_ANSWER
+
+    async def stream():
+        return "".join([t async for t in llm.chat_stream("p2", "sys")])
+    assert _run(stream) == llm.DUMMY_ANSWER
+    with pytest.raises(ValueError):
+        llm.resolve("nosuch:model")
+    assert llm.resolve("llama3:local") == ("ollama", "llama3")
+
+
+def test_hedge_wins_over_a_slow_request(stub, monkeypatch):
+    stub.update(slow_every=2, slow_ms=3000)               # request 0 is slow, request 1 is not
+    monkeypatch.setattr(llm, "HEDGE_MS", 100)
+    before = dict(llm.stats())
+    t0 = time.perf_counter()
+    assert _run(llm.chat, "p3", "sys") == llm.DUMMY_ANSWER
+    assert time.perf_counter() - t0 < 1.5
+    assert llm.stats()["hedges"] == before["hedges"] + 1
+    assert llm.stats()["hedge_wins"] == before["hedge_wins"] + 1
+
+
+def test_5xx_is_retried_and_the_deadline_holds(stub, monkeypatch):
+    stub.update(fail_every=2)                             # request 0 fails, request 1 succeeds
+    retries = llm.stats()["retries"]
+    assert _run(llm.chat, "p4", "sys") == llm.DUMMY_ANSWER
+    assert llm.stats()["retries"] == retries + 1
+
+    stub.update(fail_every=0, slow_every=1, slow_ms=3000)
+    monkeypatch.setattr(llm, "TIMEOUT_SEC", 0.3)
+    t0 = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        _run(llm.chat, "p5", "sys")
+    assert time.perf_counter() - t0 < 1.0
@@ -0,0 +1,46 @@
+import sys
+import types
+from pathlib import Path
+
+from gpu_doctor.collector import parse_xml, parsers, partitions
+from gpu_doctor.collector.synthetic import synthetic_xml
+
+DATA = Path(__file__).with_name("data")
+
+
+def test_sample_snapshot_matches_gpu_log_columns():
+    (row,) = parse_xml((DATA / "sample.xml").read_bytes(), host="h", ts="t")
+    assert row["gpu_id"] == 0 and row["mem_total_mb"] == 4036
+    assert row["temperature"] == 36 and row["power_w"] == 17 and row["pid"] is None
+    assert set(row) <= {col for col, _ in partitions.COLUMNS}
+
+
+def test_one_row_per_process():
+    rows = parse_xml(synthetic_xml(gpus=4, procs=10), host="h", ts="t")
+    assert len(rows) == 10
+    assert sorted(r["pid"] for r in rows) == list(range(10000, 10010))
+    gpu3 = [r for r in rows if r["gpu_id"] == 3]
+    assert len(gpu3) == 2 and gpu3[0]["power_w"] == 130 and gpu3[0]["proc_mem_mb"] == 503
+
+
+def test_reused_pid_is_not_given_the_old_owner(monkeypatch):
+    procs = {4242: (100.0, "alice", "run-1")}
+
+    class Process:
+        def __init__(self, pid):
+            self.started, self.user, self.tag = procs[pid]
+
+        def create_time(self):
+            return self.started
+
+        def username(self):
+            return self.user
+
+        def environ(self):
+            return {"GPU_DOC_RUN_TAG": self.tag}
+
+    monkeypatch.setitem(sys.modules, "psutil", types.SimpleNamespace(Process=Process))
+    monkeypatch.setattr(parsers, "_OWNERS", {})
+    assert parsers._owner(4242) == ("alice", "run-1")
+    procs[4242] = (200.0, "bob", "run-2")                 # same pid, new process
+    assert parsers._owner(4242) == ("bob", "run-2")
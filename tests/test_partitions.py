@@ -0,0 +1,53 @@
+import sqlite3
+
+from gpu_doctor.collector import db, partitions
+
+
+def _row(ts, tag="run-1"):
+    return {"ts": ts, "hostname": "h", "gpu_id": 0, "util_gpu": 50, "mem_used_mb": 1000,
+            "run_tag": tag}
+
+
+def test_rows_land_in_day_partitions_behind_the_view(tmp_path):
+    path = tmp_path / "p.db"
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    w.put([_row("2025-10-13T23:59:59+00:00"), _row("2025-10-14T00:00:01+00:00"),
+           _row("2025-10-14T10:00:00Z")])
+    w.flush(5)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    names = [t for _, t in partitions.list_partitions(conn)]
+    assert "gpu_log_20251013" in names and "gpu_log_20251014" in names
+    ids = [r["id"] for r in conn.execute("SELECT id FROM gpu_log ORDER BY ts")]
+    assert [partitions.table(partitions.day_of_id(i)) for i in ids] == \
+        ["gpu_log_20251013", "gpu_log_20251014", "gpu_log_20251014"]
+    assert ids == sorted(ids) and len(set(ids)) == 3
+    assert [r["ts"] for r in partitions.rows_by_id(conn, ids[1:])] == \
+        ["2025-10-14T00:00:01+00:00", "2025-10-14T10:00:00Z"]
+    assert partitions.covering(conn, "2025-10-14T08:00:00", "2025-10-14T09:00:00") == ["gpu_log_20251014"]
+
+    dropped = partitions.drop_before(conn, partitions.day_of("2025-10-14T00:00:00"))
+    conn.commit()
+    assert dropped == ["gpu_log_20251013"]
+    assert conn.execute("SELECT COUNT(*) FROM gpu_log").fetchone()[0] == 2
+    w.close()
+
+
+def test_flat_table_is_migrated_to_legacy(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        # first-release schema: no mem_total_mb / proc_mem_mb / embedding
+        conn.execute("CREATE TABLE gpu_log (id INTEGER PRIMARY KEY, ts DATETIME NOT NULL, "
+                     "hostname TEXT NOT NULL, gpu_id INTEGER NOT NULL, pid INTEGER, process_name TEXT, "
+                     "user TEXT, util_gpu INTEGER, util_mem INTEGER, mem_used_mb INTEGER, "
+                     "ecc_errors INTEGER, temperature INTEGER, power_w INTEGER, run_tag TEXT)")
+        conn.execute("INSERT INTO gpu_log (ts, hostname, gpu_id) VALUES ('2025-01-01T00:00:00Z', 'h', 0)")
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    w.put([_row("2025-10-14T10:00:00Z")])
+    w.flush(5)
+    conn = sqlite3.connect(path)
+    assert [t for _, t in partitions.list_partitions(conn)][0] == partitions.LEGACY
+    assert conn.execute("SELECT COUNT(*), COUNT(mem_total_mb) FROM gpu_log").fetchone() == (2, 0)
+    partitions.drop_before(conn, partitions.day_of("2025-06-01T00:00:00"))
+    assert partitions.LEGACY not in {t for _, t in partitions.list_partitions(conn)}
+    w.close()
@@ -0,0 +1,52 @@
+import httpx
+
+from gpu_doctor.collector import ring
+
+
+def _cycle(t, gpus=2, procs=(1234,)):
+    ts = f"2025-10-14T08:00:{t:02d}+00:00"
+    rows = []
+    for g in range(gpus):
+        for pid in procs:
+            rows.append({"ts": ts, "hostname": "gpu01", "gpu_id": g, "pid": pid, "util_gpu": t,
+                         "mem_used_mb": 1024 * (t + 1), "mem_total_mb": 81920, "proc_mem_mb": 512,
+                         "temperature": 60, "power_w": None})
+    return rows
+
+
+def test_ring_keeps_last_samples_in_fixed_memory():
+    r = ring.Ring(samples=4, gpus=2)
+    size = r.nbytes
+    for t in range(10):
+        r.push(_cycle(t, procs=(1, 2)))
+    assert r.nbytes == size
+
+    newest = r.latest()
+    assert len(newest) == 2 and newest[0]["util_gpu"] == 9
+    assert newest[0]["processes"] == 2 and newest[0]["proc_mem_mb"] == 1024
+    assert newest[0]["power_w"] is None
+    assert r.latest(samples=10, gpu_id=1)[0]["util_gpu"] == [6, 7, 8, 9]   # oldest first
+
+    r.push([{**_cycle(0)[0], "hostname": "gpu02"}])   # no free slot → ignored
+    assert r.dropped_gpus == 1 and len(r.latest()) == 2
+
+
+def test_exporter_serves_openmetrics_and_json():
+    r = ring.Ring(samples=8, gpus=4)
+    r.push(_cycle(5))
+    server = ring.serve(r, port=0)
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        metrics = httpx.get(f"{base}/metrics")
+        assert metrics.headers["content-type"].startswith("application/openmetrics-text")
+        text = metrics.text
+        assert text.endswith("# EOF\n")
+        assert 'gpu_doctor_memory_used_bytes{host="gpu01",gpu="1"} 6442450944 1760428805.000' in text
+        assert "gpu_doctor_power_watts{" not in text            # not reported → no sample
+
+        latest = httpx.get(f"{base}/latest", params={"gpu_id": 0}).json()
+        assert latest["ring_bytes"] == r.nbytes
+        assert [g["gpu_id"] for g in latest["gpus"]] == [0]
+        assert httpx.get(f"{base}/nope").status_code == 404
+    finally:
+        server.shutdown()
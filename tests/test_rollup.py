@@ -0,0 +1,56 @@
+import sqlite3
+
+from gpu_doctor.collector import db, rollup
+
+
+def _row(ts, util, mem, tag="run-1"):
+    return {"ts": ts, "hostname": "h", "gpu_id": 0, "util_gpu": util, "mem_used_mb": mem,
+            "temperature": 50, "power_w": 100, "run_tag": tag}
+
+
+def test_minute_and_hour_rollups_follow_inserts(tmp_path):
+    path = tmp_path / "r.db"
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    w.put([_row(f"2025-10-14T08:00:{s:02d}+00:00", util=s, mem=1000 + s) for s in range(0, 60, 10)])
+    w.put([_row("2025-10-14T08:01:05+00:00", util=100, mem=5000)])
+    w.flush(5)
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    m = rollup.query(conn, tier="1m", host="h")
+    assert [r["bucket"] for r in m] == ["2025-10-14T08:00:00", "2025-10-14T08:01:00"]
+    assert (m[0]["n"], m[0]["util_min"], m[0]["util_max"], m[0]["util_mean"]) == (6, 0, 50, 25)
+    assert m[0]["mem_p95"] == 1050
+
+    (h,) = rollup.query(conn, tier="1h")
+    assert h["n"] == 7 and h["util_max"] == 100 and h["mem_max"] == 5000
+    assert abs(h["util_mean"] - (25 * 6 + 100) / 7) < 1e-9
+
+    # a late row for an already-written minute is folded in on the next commit
+    w.put([_row("2025-10-14T08:00:59+00:00", util=99, mem=1000)])
+    w.flush(5)
+    m = rollup.query(conn, tier="1m", since="2025-10-14T08:00:00", until="2025-10-14T08:01:00")
+    assert m[0]["n"] == 7 and m[0]["util_max"] == 99
+    w.close()
+
+
+def test_bucket_start_handles_zulu_and_offsets():
+    assert rollup.bucket_start("2025-10-14T08:59:59Z", 3600) == "2025-10-14T08:00:00"
+    assert rollup.bucket_start("2025-10-14T10:30:10+02:00", 60) == "2025-10-14T08:30:00"
+
+
+def test_zulu_and_offset_timestamps_land_in_their_utc_minute(tmp_path):
+    path = tmp_path / "z.db"
+    w = db.LogWriter(db_path=path, flush_sec=60)
+    w.put([_row("2025-10-14T08:00:30Z", util=10, mem=1000), _row("2025-10-14T08:00:59.5Z", util=30, mem=1000),
+           _row("2025-10-14T10:00:45+02:00", util=50, mem=1000), _row("2025-10-14T08:01:00Z", util=90, mem=1000)])
+    w.flush(5)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    m = rollup.query(conn, tier="1m", since="2025-10-14T08:00:00Z", until="2025-10-14T08:02:00Z")
+    assert [(r["bucket"], r["n"], r["util_max"]) for r in m] == \
+        [("2025-10-14T08:00:00", 3, 50), ("2025-10-14T08:01:00", 1, 90)]
+    assert conn.execute("SELECT COUNT(*) FROM gpu_log WHERE ts = '2025-10-14T08:00:45+00:00'").fetchone()[0] == 1
+    w.close()
+    assert rollup.pick_tier("2025-10-01T00:00:00Z", "2025-10-14T00:00:00Z") == "1h"
+    assert rollup.pick_tier("2025-10-13T00:00:00Z", "2025-10-14T00:00:00+02:00") == "1m"
@@ -0,0 +1,87 @@
+from gpu_doctor.collector import scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, sec):
+        self.slept.append(sec)
+        self.t += sec
+
+
+def _sched(clock, **kw):
+    return scheduler.Scheduler(30, clock=clock, sleep=clock.sleep, **kw)
+
+
+def _gpu(used, pid=1234, util=50, total=80000, gpu=0):
+    return [{"hostname": "gpu01", "gpu_id": gpu, "pid": pid, "util_gpu": util,
+             "mem_used_mb": used, "mem_total_mb": total}]
+
+
+def test_ticks_do_not_drift_with_collection_time():
+    clock = FakeClock()
+    s = _sched(clock)
+    start = clock.t
+    for work in (0.4, 2.5, 0.1):
+        clock.t += work                      # nvidia-smi + parse + write
+        s.observe(_gpu(1000))
+        s.wait()
+    assert clock.t == start + 3 * 30
+    clock.t += 95                            # stalled past three ticks
+    s.wait()
+    assert s.skipped == 2 and clock.slept[-1] == 0   # two dropped, the third taken now
+    s.wait()
+    assert clock.t == start + 185 + 30
+
+
+def test_adaptive_rate_follows_the_fleet():
+    clock = FakeClock()
+    s = _sched(clock, adaptive=True, fast_sec=1, max_sec=120)
+    s.observe(_gpu(1000))
+    assert s.interval == 30
+    for expected in (60, 120, 120):          # idle: back off, capped
+        clock.t += s.interval
+        s.observe(_gpu(0, pid=None, util=0))
+        assert s.interval == expected
+    clock.t += s.interval
+    s.observe(_gpu(0.9 * 80000))             # near capacity
+    assert s.interval == 1
+
+
+def test_fast_samples_reach_the_db_only_around_a_burst():
+    clock = FakeClock()
+    s = _sched(clock, adaptive=True, fast_sec=1, pretrigger_sec=5, burst_sec=3)
+    rows, burst, started = s.observe(_gpu(70000) + _gpu(100, gpu=1))     # base tick → stored
+    assert len(rows) == 2 and burst == [] and started is None and s.interval == 1
+    for i in range(8):                                   # near capacity: polled fast, not stored
+        clock.t += 1
+        assert s.observe(_gpu(70000 + i) + _gpu(100, gpu=1)) == ([], [], None)
+    clock.t += 1
+    rows, burst, started = s.observe(_gpu(77000) + _gpu(100, gpu=1))     # ≥ 95 % → burst on GPU 0 only
+    assert "gpu01:0 memory at 96%" == started and rows == []
+    assert [r["mem_used_mb"] for r in burst] == [70003, 70004, 70005, 70006, 70007, 77000]
+    clock.t += 1
+    rows, burst, started = s.observe(_gpu(77000) + _gpu(100, gpu=1))     # still over: same burst
+    assert [r["gpu_id"] for r in burst] == [0] and started is None and s.bursts == 1
+    for _ in range(2):                                   # burst over; once memory settles, back to base
+        clock.t += 30
+        s.observe(_gpu(60000) + _gpu(100, gpu=1))
+    assert s.interval == 30
+
+
+def test_early_or_jittered_samples_are_not_dropped():
+    for adaptive in (False, True):
+        clock = FakeClock()
+        s = scheduler.Scheduler(10, adaptive=adaptive, fast_sec=1, clock=clock, sleep=clock.sleep)
+        start = clock.t
+        stored = []
+        for at in (0.05, 10.02, 19.98, 30.01, 39.99, 50.2, 59.6):
+            clock.t = start + at
+            rows, burst, _ = s.observe(_gpu(1000))
+            stored.append(len(rows) + len(burst))
+        assert stored == [1] * 7, adaptive
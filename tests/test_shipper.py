@@ -0,0 +1,85 @@
+import queue
+import sqlite3
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from gpu_doctor import api
+from gpu_doctor.collector import db, detect, shipper
+
+
+def _rows(n, host="gpu01"):
+    return [{"ts": f"2025-10-14T08:00:{i % 60:02d}+00:00", "hostname": host, "gpu_id": i % 4,
+             "pid": None, "util_gpu": i % 100, "mem_used_mb": 1000 + i, "run_tag": "run-42"}
+            for i in range(n)]
+
+
+def test_columnar_round_trip_sends_constant_columns_once():
+    rows = _rows(500)
+    body = shipper.encode(rows)
+    assert shipper.decode(body) == rows
+    assert len(body) < len(str(rows)) / 10
+
+    with pytest.raises(ValueError):
+        shipper.decode(shipper.encode([{**rows[0], "id": 1}]))        # ids are the server's
+    with pytest.raises(ValueError):
+        shipper.decode(b"not gzip")
+
+
+@pytest.fixture
+def central(tmp_path, monkeypatch):
+    writer = db.LogWriter(db_path=tmp_path / "central.db", flush_sec=60)
+    monkeypatch.setattr(db, "_WRITER", writer)
+    yield TestClient(api.app), tmp_path / "central.db"
+    writer.close()
+
+
+def test_nodes_ship_into_one_writer(central):
+    client, path = central
+    nodes = [shipper.Shipper(batch_rows=100, flush_sec=60, client=client) for _ in range(2)]
+    for i, node in enumerate(nodes):
+        node.put(_rows(250, host=f"node{i}"))
+        assert node.flush(10)
+        assert node.stats()["rows_sent"] == 250 and node.stats()["batches_sent"] == 3
+    db.flush(10)
+    with sqlite3.connect(path) as c:
+        counts = dict(c.execute("SELECT hostname, COUNT(*) FROM gpu_log GROUP BY hostname"))
+    assert counts == {"node0": 250, "node1": 250}
+    assert client.post("/ingest", content=b"junk").status_code == 400
+
+
+def test_failed_batches_are_retried_and_buffer_is_bounded():
+    calls = []
+
+    def flaky(request):
+        calls.append(len(shipper.decode(request.content)))
+        return httpx.Response(503 if len(calls) == 1 else 200, headers={"Retry-After": "0"})
+
+    client = httpx.Client(transport=httpx.MockTransport(flaky), base_url="http://central")
+    node = shipper.Shipper(batch_rows=50, flush_sec=60, max_rows=80, client=client)
+    node.put(_rows(100))                       # 20 oldest dropped: buffer holds 80
+    assert node.flush(10)
+    assert node.rows_dropped == 20 and node.rows_sent == 80 and node.failures == 1
+    assert calls == [50, 50, 30]               # the refused batch was resent first
+    node.close()
+
+
+def test_events_of_a_refused_batch_are_detected_on_the_retry(central, monkeypatch):
+    client, path = central
+    monkeypatch.setattr(api, "_DETECTOR", detect.Detector())
+    writer, put, refused = db.get_writer(), db.get_writer().put, []
+
+    def busy_once(records, timeout=None):
+        if not refused:
+            refused.append(len(records))
+            raise queue.Full
+        put(records, timeout)
+
+    monkeypatch.setattr(writer, "put", busy_once)
+    body = shipper.encode([{**_rows(1)[0], "temperature": 91}])
+    assert client.post("/ingest", content=body, headers={"content-encoding": "gzip"}).status_code == 503
+    assert client.post("/ingest", content=body, headers={"content-encoding": "gzip"}).status_code == 200
+    db.flush(10)
+    with sqlite3.connect(path) as c:
+        assert c.execute("SELECT event, severity FROM gpu_event").fetchall() == [("thermal", "crit")]
@@ -0,0 +1,32 @@
+import sys
+from itertools import islice
+
+from gpu_doctor.collector import smi_stream, synthetic
+
+FAKE = f"{sys.executable} -m gpu_doctor.collector.fake_smi"      # what GPU_DOC_NVSMI points at
+
+
+def test_stream_yields_cycles_and_restarts(monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_GPUS", "3")
+    monkeypatch.setenv("FAKE_SMI_PATTERN", "ramp")
+    monkeypatch.setenv("FAKE_SMI_STEP_SEC", "1e12")     # every child starts at cycle 0
+    monkeypatch.setenv("FAKE_SMI_CYCLES", "2")          # child exits every 2 cycles
+    stream = smi_stream.SmiStream(interval_ms=10, cmd=FAKE, backoff_sec=0.01)
+    snaps = list(islice(stream, 5))
+    stream.stop()
+
+    assert [len(s) for s in snaps] == [3] * 5
+    assert [r["gpu_id"] for r in snaps[0]] == [0, 1, 2]
+    fields = list(smi_stream.CSV_COLUMNS)
+    for snap, cycle in zip(snaps, (0, 1, 0, 1, 0)):
+        want = smi_stream.csv_rows(synthetic.synthetic_csv(3, fields, cycle, "ramp", 16).splitlines(),
+                                   fields, host="h")
+        assert [(r["mem_used_mb"], r["util_gpu"], r["power_w"]) for r in snap] == \
+            [(r["mem_used_mb"], r["util_gpu"], r["power_w"]) for r in want]
+    assert snaps[1][0]["mem_used_mb"] != snaps[0][0]["mem_used_mb"]
+    assert stream.restarts >= 2
+
+
+def test_csv_rows_by_field_name():
+    rows = smi_stream.csv_rows(["1, 512, [N/A]"], ["index", "memory.used", "power.draw"], host="h")
+    assert rows[0]["gpu_id"] == 1 and rows[0]["mem_used_mb"] == 512 and rows[0]["power_w"] is None
@@ -0,0 +1,65 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+from gpu_doctor.collector import db, partitions, smi_stream, synthetic
+from gpu_doctor.collector.parsers import parse_nvidia_smi_xml
+
+
+def test_oom_pattern_kills_and_restarts_processes():
+    pids, empty = [], 0
+    for c in range(120):
+        (gpu,) = synthetic.gpu_states(1, 2, c, "oom")
+        assert gpu["used"] <= gpu["total"]
+        empty += not gpu["procs"]
+        pids.append(tuple(p for p, _, _ in gpu["procs"]))
+    assert empty >= synthetic.DEAD_CYCLES
+    assert len({p for p in pids if p}) >= 2                  # new pids after each kill
+
+
+def test_fake_smi_xml_and_csv_parse():
+    env = {"FAKE_SMI_GPUS": "4", "FAKE_SMI_PROCS": "6", "FAKE_SMI_PATTERN": "steady", "PATH": ""}
+    cmd = [sys.executable, "-m", "gpu_doctor.collector.fake_smi"]
+    xml = subprocess.check_output([*cmd, "-q", "-x"], env=env)
+    rows = parse_nvidia_smi_xml(xml, host="h", ts="t")
+    assert len(rows) == 6 and {r["gpu_id"] for r in rows} == {0, 1, 2, 3}
+
+    fields = list(smi_stream.CSV_COLUMNS)
+    out = subprocess.check_output([*cmd, f"--query-gpu={','.join(fields)}", "--format=csv,noheader,nounits"],
+                                  env=env, text=True)
+    rows = smi_stream.csv_rows(out.splitlines(), fields, host="h", ts="t")
+    assert [r["gpu_id"] for r in rows] == [0, 1, 2, 3]
+    assert all(r["mem_total_mb"] == synthetic.TOTAL_MB for r in rows)
+
+
+def test_seed_fills_day_partitions_with_indexes(tmp_path):
+    conn = db._open_conn(tmp_path / "seed.db")
+    db._ensure_schema(conn)
+    end = 20_000 * 86400 + 3600
+    n = synthetic.seed(conn, 5000, hosts=2, gpus=4, procs=8, step_sec=120, end=end)
+    assert n == conn.execute("SELECT COUNT(*) FROM gpu_log").fetchone()[0] >= 4900
+    days = [d for d, _ in partitions.list_partitions(conn) if d <= 20_000]   # (+ today's, from the schema)
+    assert days[-1] == 20_000 and len(days) >= 2
+    have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert all(f"idx_{partitions.table(d)}_{s}" in have for d in days for s in partitions.INDEXES)
+
+
+def test_bench_suite_flags_regressions_beyond_tolerance():
+    path = Path(__file__).parents[1] / "scripts" / "bench_suite.py"
+    spec = importlib.util.spec_from_file_location("bench_suite", path)
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+
+    def result(**values):
+        better = {"rows_s": "higher", "ms": "lower"}
+        return {"meta": {}, "metrics": {k: {"value": v, "unit": "", "better": better[k.split("_", 1)[1]]}
+                                        for k, v in values.items()}}
+
+    base = result(a_rows_s=1000, b_ms=10, c_ms=10)
+    rows = {r["metric"]: r for r in suite.compare(result(a_rows_s=850, b_ms=13, d_ms=1), base, 0.2)}
+    assert rows["a_rows_s"]["status"] == "ok"
+    assert rows["b_ms"]["status"] == "regressed"
+    assert rows["c_ms"]["status"] == "missing" and rows["d_ms"]["status"] == "new"
+    rows = {r["metric"]: r for r in suite.compare(result(a_rows_s=700, b_ms=5), base, 0.2, {"a_rows_s": 0.5})}
+    assert rows["a_rows_s"]["status"] == "ok" and rows["b_ms"]["status"] == "improved"